@@ -0,0 +1,210 @@
+"""Admission control for code execution.
+
+Two layers keep one client from taking every sandbox:
+
+- ``RateLimiter``: a token bucket per client. A client is the bearer token
+  the frontend sends (hashed, never stored as is) or, without one, the
+  client address. An empty bucket turns the request away with 429 and the
+  seconds until a token is back.
+- ``FairScheduler``: hands out the sandbox slots. While slots are free a
+  run starts at once; once they are all taken, waiting runs are queued per
+  client and each freed slot goes to the next client in round-robin order,
+  so a client with ten queued runs waits its turn behind one with one.
+  When a client's queue, or the queue as a whole, is full, the run is shed
+  with ``SchedulerFull`` (429 with Retry-After).
+
+The client a sandbox run is charged to is held in a ContextVar, set once per
+request (or per queued job) and seen by every run it starts.
+"""
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import metrics
+
+ANONYMOUS = "anonymous"
+
+SHED = metrics.REGISTRY.counter(
+    "admission_shed_total", "Code-execution requests turned away, by reason (rate_limit, queue_full)", ("reason",)
+)
+QUEUE_DEPTH = metrics.REGISTRY.gauge("sandbox_queue_depth", "Sandbox runs waiting for a slot")
+QUEUE_CLIENTS = metrics.REGISTRY.gauge("sandbox_queue_clients", "Clients with sandbox runs waiting for a slot")
+
+
+def client_key(authorization: Optional[str], address: Optional[str]) -> str:
+    """The key a request is limited and scheduled under."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return "token:" + hashlib.sha256(token.strip().encode("utf-8")).hexdigest()[:16]
+    return f"ip:{address or 'unknown'}"
+
+
+class RateLimiter:
+    """``rate`` tokens per second per client, up to ``burst`` saved up.
+
+    At most ``max_clients`` buckets are kept; the least recently seen is
+    dropped first, which only ever hands its client a full bucket again.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max(1, max_clients)
+        self._lock = threading.Lock()
+        # key -> (tokens, time they were counted)
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens from ``key``'s bucket. Returns 0 if they were
+        there, else the seconds until they will be (nothing is taken)."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, counted = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) * self.rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SchedulerFull(Exception):
+    """No room to queue another run; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FairScheduler:
+    """``slots`` concurrent runs, shared round-robin between clients.
+
+    Lives on the event loop, like the asyncio.Semaphore it replaces.
+    """
+
+    def __init__(self, slots: int, max_queued: int = 256, max_queued_per_client: int = 16):
+        self.slots = max(1, slots)
+        self.max_queued = max(1, max_queued)
+        self.max_queued_per_client = max(1, max_queued_per_client)
+        self._free = self.slots
+        # client -> its waiting runs, in the order clients get the next slot
+        self._waiting: "OrderedDict[str, deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        # Moving average of how long a run holds its slot, for Retry-After
+        self._hold = 1.0
+
+    def check(self, client: str) -> None:
+        """Raise SchedulerFull if a run for ``client`` could not be queued now."""
+        if self._free > 0 and not self._waiting:
+            return
+        if self._queued >= self.max_queued:
+            self._shed(f"{self._queued} sandbox runs are already waiting", self._queued)
+        mine = len(self._waiting.get(client, ()))
+        if mine >= self.max_queued_per_client:
+            # Round-robin: each of this client's runs waits about one turn
+            # of every client with runs queued
+            self._shed(f"{mine} of your runs are already waiting", mine * len(self._waiting))
+
+    def _shed(self, message: str, runs_ahead: int) -> None:
+        SHED.inc(reason="queue_full")
+        raise SchedulerFull(message, max(1.0, math.ceil(runs_ahead * self._hold / self.slots)))
+
+    async def acquire(self, client: str) -> None:
+        self.check(client)
+        if self._free > 0 and not self._waiting:
+            self._free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(waiter)
+        self._queued += 1
+        self._update_gauges()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                self._forget(client, waiter)
+            raise
+
+    def _forget(self, client: str, waiter: asyncio.Future) -> None:
+        runs = self._waiting.get(client)
+        if runs is not None and waiter in runs:
+            runs.remove(waiter)
+            self._queued -= 1
+            if not runs:
+                del self._waiting[client]
+            self._update_gauges()
+
+    def release(self) -> None:
+        """Give the freed slot to the next client in turn, or free it."""
+        while self._waiting:
+            client, runs = self._waiting.popitem(last=False)
+            waiter = runs.popleft()
+            self._queued -= 1
+            if runs:
+                # Back of the line for its next run
+                self._waiting[client] = runs
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self._free += 1
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        QUEUE_DEPTH.set(self._queued)
+        QUEUE_CLIENTS.set(len(self._waiting))
+
+    @asynccontextmanager
+    async def slot(self, client: str) -> AsyncIterator[None]:
+        await self.acquire(client)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._hold = 0.9 * self._hold + 0.1 * (time.perf_counter() - started)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "free": self._free,
+            "queued": self._queued,
+            "clients_waiting": len(self._waiting),
+        }
+
+
+# The client the current request's sandbox runs are charged to
+_client: ContextVar[str] = ContextVar("admission_client", default=ANONYMOUS)
+
+
+def current_client() -> str:
+    return _client.get()
+
+
+def set_client(client: str) -> None:
+    """Charge the rest of the current request's runs to ``client``."""
+    _client.set(client)
+
+
+@contextmanager
+def acting_as(client: Optional[str]) -> Iterator[None]:
+    token = _client.set(client or ANONYMOUS)
+    try:
+        yield
+    finally:
+        _client.reset(token)
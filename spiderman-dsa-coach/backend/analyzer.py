@@ -0,0 +1,237 @@
+"""Single-pass structure detection for /analyze.
+
+Comments and strings are blanked out first, then a handful of precompiled
+patterns pick out the keyword vocabulary, loop headers and empty literals.
+Each of those runs inside the regex engine, and every pattern is written so
+it can't backtrack, which keeps analysis linear in the size of the input.
+The only Python-level walk is over brackets from the first loop header on,
+and it stops as soon as a nested loop turns up.
+
+:func:`scan` returns a :class:`CodeFeatures` summary. Summaries of adjacent
+chunks of code can be combined with :meth:`CodeFeatures.merge`, which gives
+the same result as scanning the concatenated source as long as the split
+falls between top-level statements.
+
+Linear is not enough to stay under a millisecond: in CPython a 100 KB file
+takes a few milliseconds just to strip of comments and strings. So only the
+first :data:`MAX_SCAN_CHARS` characters are scanned, which covers any
+solution to an interview-sized problem; structures used only past that
+point of a larger paste are not reported.
+"""
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+# Longest prefix of the code that is scanned; bench_analyzer.py checks that
+# a scan this long stays under a millisecond on pathological input
+MAX_SCAN_CHARS = 10_000
+
+_KEYWORDS = (
+    "array", "push", "pop", "shift", "unshift",
+    "map", "object", "dict", "hash",
+    "stack", "queue", "enqueue", "dequeue",
+    "tree", "node", "left", "right",
+    "graph", "adjacency",
+    "recursion", "recursive",
+    "sort", "quicksort", "mergesort", "heapsort",
+)
+
+_SKIP = re.compile(
+    r"//[^\n]*"
+    r"|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/"
+    r"|/\*.*"  # unterminated block comment runs to the end
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+    r"|`[^`\\]*(?:\\.[^`\\]*)*`?",
+    re.DOTALL,
+)
+# Patterns start with a literal so the regex engine can skip ahead quickly;
+# the word boundary in front is checked by _starts_word instead.
+_WORD_PATTERNS = {word: re.compile(word + r"\b") for word in _KEYWORDS}
+_LOOP = re.compile(r"(?:for|while)\s*\(")
+_EMPTY_ARRAY = re.compile(r"\[\s*\]")
+_EMPTY_OBJECT = re.compile(r"=\s*\{\s*\}")
+_NESTING = re.compile(r"(?P<loop>for|while)\s*\(|[{}();]")
+
+# Keyword sequences that must appear in order, e.g. push ... pop for a stack.
+_SEQUENCES: Dict[str, Tuple[str, ...]] = {
+    "stack": ("push", "pop"),
+    "tree": ("node", "left", "right"),
+}
+
+_ARRAY_WORDS = frozenset(("array", "push", "pop", "shift", "unshift"))
+_HASHMAP_WORDS = frozenset(("map", "object", "dict", "hash"))
+_QUEUE_WORDS = frozenset(("queue", "enqueue", "dequeue"))
+_GRAPH_WORDS = frozenset(("graph", "adjacency"))
+_RECURSION_WORDS = frozenset(("recursion", "recursive"))
+_SORTING_WORDS = frozenset(("sort", "quicksort", "mergesort", "heapsort"))
+
+
+def _identity(steps: Tuple[str, ...]) -> Tuple[int, ...]:
+    return tuple(range(len(steps) + 1))
+
+
+class CodeFeatures:
+    """What one scan found in a chunk of code.
+
+    ``sequences`` maps each ordered keyword pattern to a transition table:
+    entry ``i`` is how far into the pattern the scan ends up if it had
+    already matched ``i`` steps before this chunk began. That is what makes
+    summaries composable.
+    """
+
+    __slots__ = ("words", "sequences", "loop", "nested_loop", "empty_array", "empty_object")
+
+    def __init__(self, words: FrozenSet[str] = frozenset(), sequences: Dict[str, Tuple[int, ...]] = None,
+                 loop: bool = False, nested_loop: bool = False, empty_array: bool = False,
+                 empty_object: bool = False):
+        self.words = words
+        self.sequences = sequences or {name: _identity(steps) for name, steps in _SEQUENCES.items()}
+        self.loop = loop
+        self.nested_loop = nested_loop
+        self.empty_array = empty_array
+        self.empty_object = empty_object
+
+    def merge(self, later: "CodeFeatures") -> "CodeFeatures":
+        """Features of this chunk followed by ``later``."""
+        return CodeFeatures(
+            words=self.words | later.words,
+            sequences={
+                name: tuple(later.sequences[name][state] for state in table)
+                for name, table in self.sequences.items()
+            },
+            loop=self.loop or later.loop,
+            nested_loop=self.nested_loop or later.nested_loop,
+            empty_array=self.empty_array or later.empty_array,
+            empty_object=self.empty_object or later.empty_object,
+        )
+
+    def _matched(self, name: str) -> bool:
+        return self.sequences[name][0] == len(_SEQUENCES[name])
+
+    def structures(self) -> List[str]:
+        """Structure flags in the order /analyze has always reported them."""
+        words = self.words
+        structures = []
+        if words & _ARRAY_WORDS or self.empty_array:
+            structures.append("array")
+        if words & _HASHMAP_WORDS or self.empty_object:
+            structures.append("hashmap")
+        if "stack" in words or self._matched("stack"):
+            structures.append("stack")
+        if words & _QUEUE_WORDS:
+            structures.append("queue")
+        if "tree" in words or self._matched("tree"):
+            structures.append("tree")
+        if words & _GRAPH_WORDS:
+            structures.append("graph")
+        if words & _RECURSION_WORDS:
+            structures.append("recursion")
+        if self.loop:
+            structures.append("loop")
+        if self.nested_loop:
+            structures.append("nested_loop")
+        if words & _SORTING_WORDS:
+            structures.append("sorting")
+        return structures
+
+
+def _starts_word(code: str, index: int) -> bool:
+    if index == 0:
+        return True
+    previous = code[index - 1]
+    return not (previous.isalnum() or previous in "_$")
+
+
+def _find_word(code: str, word: str, pos: int = 0):
+    """First whole-word occurrence of ``word`` at or after ``pos``."""
+    pattern = _WORD_PATTERNS[word]
+    match = pattern.search(code, pos)
+    while match is not None and not _starts_word(code, match.start()):
+        match = pattern.search(code, match.start() + 1)
+    return match
+
+
+def _find_loop(code: str):
+    for match in _LOOP.finditer(code):
+        if _starts_word(code, match.start()):
+            return match
+    return None
+
+
+def _sequence_table(code: str, steps: Tuple[str, ...]) -> Tuple[int, ...]:
+    table = []
+    for entry in range(len(steps) + 1):
+        state, pos = entry, 0
+        while state < len(steps):
+            match = _find_word(code, steps[state], pos)
+            if match is None:
+                break
+            state, pos = state + 1, match.end()
+        table.append(state)
+    return tuple(table)
+
+
+def _has_nested_loop(code: str, start: int) -> bool:
+    """Walk brackets from the first loop header on, looking for a loop header
+    inside another loop's header, body, or braceless single-statement body."""
+    braces: List[bool] = []  # open "{" inside the current loop body, True for loop bodies
+    open_loop_bodies = 0
+    paren_depth = 0
+    header_depth = -1  # paren depth of the loop header being read, if any
+    after_header = False  # a loop header just closed; its body comes next
+
+    for match in _NESTING.finditer(code, start):
+        if match.lastgroup == "loop":
+            if not _starts_word(code, match.start()):
+                continue
+            if open_loop_bodies or after_header or header_depth >= 0:
+                return True
+            paren_depth += 1
+            header_depth = paren_depth
+            continue
+
+        token = match.group()
+        body_opens = after_header and token == "{"
+        after_header = False
+        if token == "(":
+            paren_depth += 1
+        elif token == ")":
+            if paren_depth == header_depth:
+                header_depth = -1
+                after_header = True
+            paren_depth = max(0, paren_depth - 1)
+        elif token == "{":
+            braces.append(body_opens)
+            open_loop_bodies += body_opens
+        elif token == "}" and braces:
+            open_loop_bodies -= braces.pop()
+    return False
+
+
+def scan(code: str) -> CodeFeatures:
+    """Scan the first MAX_SCAN_CHARS characters of ``code`` and summarize the
+    structures they use."""
+    code = _SKIP.sub(" ", code[:MAX_SCAN_CHARS].lower())
+
+    # A plain substring test rules out most keywords before any regex runs
+    words = frozenset(
+        word for word in _KEYWORDS
+        if word in code and _find_word(code, word) is not None
+    )
+    first_loop = _find_loop(code)
+    return CodeFeatures(
+        words=words,
+        sequences={name: _sequence_table(code, steps) for name, steps in _SEQUENCES.items()},
+        loop=first_loop is not None,
+        nested_loop=first_loop is not None and _has_nested_loop(code, first_loop.start()),
+        empty_array=_EMPTY_ARRAY.search(code) is not None,
+        empty_object=any(
+            match.start() == 0 or code[match.start() - 1] not in "=!<>"
+            for match in _EMPTY_OBJECT.finditer(code)
+        ),
+    )
+
+
+def detect_structures(code: str) -> List[str]:
+    """Structure flags for ``code``, e.g. ``["array", "loop", "nested_loop"]``."""
+    return scan(code).structures()
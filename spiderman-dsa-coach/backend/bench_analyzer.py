@@ -0,0 +1,87 @@
+"""Micro-benchmarks for /analyze on pathological inputs.
+
+Prints the best time per call of the structure detector and the complexity
+estimator for each input, next to the regex scans the detector replaced, so
+both the absolute cost and its growth with input size are visible. Exits
+with an error if the structure detector takes longer than BOUND_MS on any
+input; inputs longer than analyzer.MAX_SCAN_CHARS are only scanned that far,
+which is what keeps it there. The complexity estimator is shown for
+reference and is bounded by complexity.MAX_SOURCE_CHARS instead.
+
+Usage: python bench_analyzer.py [repeats]
+"""
+import re
+import sys
+import timeit
+
+import complexity
+from analyzer import detect_structures
+
+BOUND_MS = 1.0
+
+TWO_SUM = """
+function twoSum(nums, target) {
+    for (let i = 0; i < nums.length; i++) {
+        for (let j = i + 1; j < nums.length; j++) {
+            if (nums[i] + nums[j] === target) return [i, j];
+        }
+    }
+}
+"""
+
+
+def legacy_detect(code):
+    """The original per-flag regex scans, kept here for comparison."""
+    code_lower = code.lower()
+    patterns = [
+        r'\barray\b|\b\[\]|\bpush\b|\bpop\b|\bshift\b|\bunshift\b',
+        r'\bmap\b|\bobject\b|\bdict\b|\bhash\b|\b{}\b',
+        r'\bstack\b|\bpush\b.*\bpop\b',
+        r'\bqueue\b|\benqueue\b|\bdequeue\b',
+        r'\btree\b|\bnode\b.*\bleft\b.*\bright\b',
+        r'\bgraph\b|\badjacency\b',
+        r'\brecursion\b|\brecursive\b',
+        r'\bfor\s*\(.*\)|\bwhile\s*\(.*\)',
+        r'\bsort\b|\bquicksort\b|\bmergesort\b|\bheapsort\b',
+    ]
+    found = [bool(re.search(p, code_lower)) for p in patterns]
+    found.append(bool(re.search(r'for\s*\([^)]*\)\s*{[^}]*for\s*\([^)]*\)', code_lower, re.DOTALL)))
+    return found
+
+
+INPUTS = {
+    "two-sum (300 B)": TWO_SUM,
+    "100 KB of solutions": (TWO_SUM * (100_000 // len(TWO_SUM)))[:100_000],
+    "deep braces (20k)": "{" * 20_000 + "}" * 20_000,
+    "for( without ) (5k)": "for (" * 5_000,
+    "for(){ no closing } (2k)": "for(){" * 2_000,
+    "push with no pop (5k)": "push " * 5_000,
+    "unterminated comment": "/*" + "x" * 100_000,
+    "unterminated string": '"' + "a\\" * 50_000,
+}
+
+
+def estimate(code):
+    try:
+        return complexity.analyze(code)
+    except (ValueError, RecursionError):
+        return None  # /analyze falls back to the structure flags
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'input':<26} {'analyzer':>12} {'complexity':>12} {'legacy regexes':>16}")
+    slow = []
+    for label, code in INPUTS.items():
+        ours = min(timeit.repeat(lambda: detect_structures(code), number=1, repeat=repeats))
+        bound = min(timeit.repeat(lambda: estimate(code), number=1, repeat=repeats))
+        legacy = min(timeit.repeat(lambda: legacy_detect(code), number=1, repeat=repeats))
+        print(f"{label:<26} {ours * 1000:9.3f} ms {bound * 1000:9.3f} ms {legacy * 1000:13.3f} ms")
+        if ours * 1000 > BOUND_MS:
+            slow.append(label)
+    if slow:
+        sys.exit(f"Structure detection took over {BOUND_MS} ms on: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
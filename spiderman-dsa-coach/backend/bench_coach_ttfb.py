@@ -0,0 +1,101 @@
+"""Time-to-first-byte of /coach against /coach/stream.
+
+With no arguments the app is served locally by uvicorn (in a background
+thread) against a fake Gemini client that produces a reply in several chunks. Pass a base URL (e.g.
+http://localhost:8000) to measure a running backend with the real API.
+
+Usage: python bench_coach_ttfb.py [base_url] [requests]
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+
+CHUNK_DELAY_SECONDS = 0.25
+CHUNKS = ["That nested loop ", "looks stickier ", "than my web! ", "What happens with ", "10,000 villains?"]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _fake_app():
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    import main
+
+    class Chunk:
+        def __init__(self, text):
+            self.text = text
+
+    class Models:
+        async def generate_content(self, **kwargs):
+            await asyncio.sleep(CHUNK_DELAY_SECONDS * len(CHUNKS))
+            return Chunk("".join(CHUNKS))
+
+        async def generate_content_stream(self, **kwargs):
+            async def chunks():
+                for text in CHUNKS:
+                    await asyncio.sleep(CHUNK_DELAY_SECONDS)
+                    yield Chunk(text)
+            return chunks()
+
+    class Client:
+        class aio:
+            models = Models()
+
+    main.client = Client()
+    return main.app
+
+
+def _serve_locally(app) -> str:
+    """Serve ``app`` with uvicorn on a free port; returns its base URL."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def measure(client, path, body):
+    """Seconds until the first body byte arrives, and until the response ends."""
+    started = time.perf_counter()
+    first = None
+    async with client.stream("POST", path, json=body) as response:
+        async for _ in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def run(base_url, requests):
+    if not base_url:
+        base_url = _serve_locally(_fake_app())
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for path in ("/coach", "/coach/stream"):
+            ttfb, total = [], []
+            for i in range(requests):
+                # Vary the code so the coaching cache never answers
+                body = {"code": f"// {path}\nfor (let i = 0; i < {i}; i++) {{ for (;;) {{}} }}",
+                        "analysis": {"structures": ["nested_loop"], "complexity_hint": "O(n²)"}}
+                first, done = await measure(client, path, body)
+                ttfb.append(first * 1000)
+                total.append(done * 1000)
+            print(f"{path:<14} TTFB p50 {percentile(ttfb, 0.5):7.1f} ms  p95 {percentile(ttfb, 0.95):7.1f} ms"
+                  f"   total p50 {percentile(total, 0.5):7.1f} ms")
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1].startswith("http") else None
+    count = int(sys.argv[-1]) if len(sys.argv) > 1 and sys.argv[-1].isdigit() else 10
+    asyncio.run(run(url, count))
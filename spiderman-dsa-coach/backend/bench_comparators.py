@@ -0,0 +1,63 @@
+"""Micro-benchmarks for output comparison on multi-megabyte results.
+
+For each case prints the best time of the comparator next to the old
+strip-and-compare check it replaced, plus what the backend pays when the
+sandbox only sends a digest (the output itself never crosses the pipe).
+
+Usage: python bench_comparators.py [repeats]
+"""
+import json
+import random
+import sys
+import timeit
+
+from comparators import Comparator, EXACT, Expected, canonical, digest
+
+
+def legacy_match(actual, expected):
+    """The original check from _case_result, kept here for comparison."""
+    actual_clean = actual.strip().replace(' ', '').replace('\n', '')
+    expected_clean = expected.strip().replace(' ', '').replace('\n', '')
+    return actual_clean == expected_clean
+
+
+rng = random.Random(0)
+NUMBERS = [rng.randint(-10 ** 9, 10 ** 9) for _ in range(500_000)]
+COMPACT = canonical(NUMBERS)
+# An equal but distinct string, as a sandbox reply would produce
+OUTPUT = COMPACT[:-1] + COMPACT[-1:]
+WRONG = canonical(NUMBERS[:-1] + [0])
+SPACED = json.dumps(NUMBERS)
+SHUFFLED = canonical(rng.sample(NUMBERS, len(NUMBERS)))
+FLOATS = [rng.random() * 1000 for _ in range(200_000)]
+FLOATS_OFF = canonical([x + 1e-9 for x in FLOATS])
+
+# (label, comparator, output, expected text, output digest, known expected digest)
+CASES = [
+    ("identical (%.1f MB)" % (len(COMPACT) / 1e6), EXACT, OUTPUT, COMPACT, None, None),
+    ("compact, known digest", EXACT, OUTPUT, "[]", None, digest(COMPACT)),
+    ("wrong answer", EXACT, WRONG, COMPACT, None, digest(COMPACT)),
+    ("spacing differs", EXACT, SPACED, COMPACT, None, None),
+    ("spacing, known digest", EXACT, SPACED, COMPACT, None, digest(COMPACT)),
+    ("sandbox sent digest", EXACT, COMPACT[:65536], COMPACT, digest(COMPACT), digest(COMPACT)),
+    ("unordered", Comparator("unordered"), SHUFFLED, COMPACT, None, None),
+    ("float tolerance", Comparator("float", tolerance=1e-6), FLOATS_OFF, canonical(FLOATS), None, None),
+]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'case':<24} {'comparator':>12} {'legacy strip':>14} {'match':>6}")
+    for label, comparator, output, expected, output_digest, known in CASES:
+        # A fresh Expected per call: nothing parsed carries over between runs
+        ours = min(timeit.repeat(
+            lambda: comparator.matches(output, Expected(expected, known), output_digest),
+            number=1, repeat=repeats,
+        ))
+        legacy = min(timeit.repeat(lambda: legacy_match(output, expected), number=1, repeat=repeats))
+        matched = comparator.matches(output, Expected(expected, known), output_digest)
+        print(f"{label:<24} {ours * 1000:9.2f} ms {legacy * 1000:11.2f} ms {str(matched):>6}")
+
+
+if __name__ == "__main__":
+    main()
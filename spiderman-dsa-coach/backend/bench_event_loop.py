@@ -0,0 +1,87 @@
+"""Check that /analyze stays responsive while /run-code and /coach are busy.
+
+Runs the app in-process with a fake Gemini client that takes a while to
+answer, fires a burst of slow /run-code and /coach requests, and measures
+/analyze latency before and during the burst.
+
+Usage: python bench_event_loop.py [concurrent_requests]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import httpx
+
+import main
+
+GEMINI_LATENCY_SECONDS = 1.0
+
+SLOW_CODE = """
+function twoSum(nums, target) {
+    const end = Date.now() + 200;
+    while (Date.now() < end) {}
+    return [0, 1];
+}
+"""
+
+
+class _FakeResponse:
+    text = "Nice web-slinging, hero! What happens when the input grows?"
+
+
+class _FakeAsyncModels:
+    async def generate_content(self, **kwargs):
+        await asyncio.sleep(GEMINI_LATENCY_SECONDS)
+        return _FakeResponse()
+
+
+class _FakeClient:
+    class aio:
+        models = _FakeAsyncModels()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def probe_analyze(client, samples):
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        await client.post("/analyze", json={"code": "for (let i = 0; i < n; i++) {}", "problem_id": "two-sum"})
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+async def run(concurrency):
+    main.client = _FakeClient()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        idle = await probe_analyze(client, 20)
+
+        burst = [
+            client.post("/run-code", json={"code": SLOW_CODE, "language": "javascript",
+                                           "problem_id": "two-sum", "test_cases": []})
+            for _ in range(concurrency)
+        ] + [
+            client.post("/coach", json={"code": SLOW_CODE, "analysis": {"structures": ["loop"]}})
+            for _ in range(concurrency)
+        ]
+        burst_task = asyncio.gather(*burst)
+        await asyncio.sleep(0.05)
+        loaded = await probe_analyze(client, 20)
+        await burst_task
+
+    main.node_pool.shutdown()
+    print(f"{concurrency} /run-code + {concurrency} /coach in flight")
+    print(f"/analyze idle    p50 {percentile(idle, 0.5):6.2f} ms   p95 {percentile(idle, 0.95):6.2f} ms")
+    print(f"/analyze loaded  p50 {percentile(loaded, 0.5):6.2f} ms   p95 {percentile(loaded, 0.95):6.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
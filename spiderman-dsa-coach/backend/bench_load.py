@@ -0,0 +1,449 @@
+"""Offline load test of the backend endpoints.
+
+Starts the app in a child process with a stand-in for the Gemini client
+(configurable latency, jitter and failure rate) and drives each scenario
+with a fixed number of concurrent clients until it has sent its requests.
+Throughput, latency percentiles and status counts are printed as JSON,
+along with the per-stage timings and coaching sources the server reported
+in /metrics over the scenario, so runs can be saved and compared.
+
+The ``tts`` scenario points the backend's /tts at a fake ElevenLabs
+upstream served from this process, which streams its audio in chunks, so
+time to first byte and total latency can be told apart. The audio cache
+lives in a temporary directory for the run.
+
+Usage:
+  python bench_load.py [--scenarios analyze,coach,run-code] [--requests 200]
+                       [--concurrency 16] [--gemini-latency 0.3]
+                       [--gemini-failure-rate 0.05] [--unique 1.0]
+                       [--output run.json] [--compare baseline.json]
+  python bench_load.py --url http://localhost:8000   (a running backend)
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+JS_SOLUTION = """
+function twoSum(nums, target) {
+    const seen = new Map(), salt = %d;
+    for (let i = 0; i < nums.length; i++) {
+        if (seen.has(target - nums[i])) return [seen.get(target - nums[i]), i];
+        seen.set(nums[i], i);
+    }
+}
+"""
+
+PY_SOLUTION = """
+def twoSum(nums, target):
+    seen, salt = {}, %d
+    for i, x in enumerate(nums):
+        if target - x in seen:
+            return [seen[target - x], i]
+        seen[x] = i
+"""
+
+ANALYZE_CODE = """
+function solve(nums, k) {
+    const counts = new Map(), salt = %d;
+    for (let i = 0; i < nums.length; i++) {
+        for (let j = i + 1; j < nums.length; j++) {
+            if (nums[i] + nums[j] === k) counts.set(i, j);
+        }
+    }
+    return counts;
+}
+"""
+
+COACH_ANALYSIS = {"structures": ["nested_loop", "hashmap"], "complexity_hint": "O(n²)"}
+
+
+# Scenario name -> (path, body for the n-th request variant).
+# The salt changes the normalized code (and the start of the coaching
+# prompt), so a new variant misses every cache.
+SCENARIOS = {
+    "analyze": ("/analyze", lambda n: {"code": ANALYZE_CODE % n, "problem_id": "two-sum"}),
+    "coach": ("/coach", lambda n: {"code": ANALYZE_CODE % n, "analysis": COACH_ANALYSIS}),
+    "coach-stream": ("/coach/stream", lambda n: {"code": ANALYZE_CODE % n, "analysis": COACH_ANALYSIS}),
+    "run-code": ("/run-code", lambda n: {"code": JS_SOLUTION % n, "language": "javascript",
+                                          "problem_id": "two-sum", "test_cases": []}),
+    "run-code-python": ("/run-code", lambda n: {"code": PY_SOLUTION % n, "language": "python",
+                                                 "problem_id": "two-sum", "test_cases": []}),
+    "tts": ("/tts", lambda n: {"text": f"Nice web-slinging, hero number {n}! What happens at scale?"}),
+}
+DEFAULT_SCENARIOS = "analyze,coach,run-code"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- Stand-ins for the upstream APIs ---------------------------------------
+
+class FakeGenai:
+    """Duck-types ``genai.Client`` for the calls main.py makes."""
+
+    REPLY = ["That nested loop ", "looks stickier ", "than my web! ", "What happens with ", "10,000 villains?"]
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.aio = self
+        self.models = self
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def _maybe_fail(self) -> None:
+        if self.rng.random() < self.failure_rate:
+            raise RuntimeError("Fake Gemini failure")
+
+    async def generate_content(self, **kwargs):
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return _Chunk("".join(self.REPLY))
+
+    async def generate_content_stream(self, **kwargs):
+        delay = self._delay() / len(self.REPLY)
+        self._maybe_fail()
+
+        async def chunks():
+            for text in self.REPLY:
+                await asyncio.sleep(delay)
+                yield _Chunk(text)
+        return chunks()
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_tts_app(latency: float, failure_rate: float, seed: int = 0):
+    """ASGI app answering ElevenLabs text-to-speech calls with fake MP3 bytes
+    (about 1 kB per character, like 128 kbit/s speech). The first chunk
+    comes after a fifth of ``latency`` and the rest trickle in over the
+    remainder, the way synthesis streams."""
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    rng = random.Random(seed)
+    chunks = 8
+
+    async def speak(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency / 5)
+        if rng.random() < failure_rate:
+            return JSONResponse({"detail": "Fake ElevenLabs failure"}, status_code=500)
+        size = 1000 * len(body.get("text", ""))
+
+        async def audio():
+            yield b"ID3" + os.urandom(size // chunks)
+            for _ in range(chunks - 1):
+                await asyncio.sleep(latency * 4 / 5 / (chunks - 1))
+                yield os.urandom(size // chunks)
+
+        return StreamingResponse(audio(), media_type="audio/mpeg")
+
+    return Starlette(routes=[Route("/v1/text-to-speech/{voice_id}/stream", speak, methods=["POST"])])
+
+
+def _serve_in_thread(app) -> str:
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def serve(args) -> None:
+    """Child process: the real app, with the fake Gemini client swapped in."""
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+
+    import main
+
+    main.client = FakeGenai(args.gemini_latency, args.gemini_jitter, args.gemini_failure_rate, args.seed)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Processes under test --------------------------------------------------
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up in {timeout:.0f}s")
+
+
+def start_backend(args) -> "tuple[str, subprocess.Popen]":
+    port = _free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--gemini-latency", str(args.gemini_latency), "--gemini-jitter", str(args.gemini_jitter),
+               "--gemini-failure-rate", str(args.gemini_failure_rate), "--seed", str(args.seed)]
+    # No sampling overhead or stray profiles from the benchmark itself, and
+    # no per-client rate limit cutting a scenario short
+    env = {**os.environ, "REQUEST_PROFILE_SAMPLE_RATE": "0", "RUN_RATE_PER_MINUTE": "0"}
+    if "tts" in args.scenarios:
+        upstream = _serve_in_thread(fake_tts_app(args.tts_latency, args.tts_failure_rate, args.seed))
+        env.update(ELEVENLABS_API_URL=upstream, ELEVENLABS_API_KEY="offline-benchmark",
+                   TTS_CACHE_DIR=tempfile.mkdtemp(prefix="bench-tts-"))
+    log = open(args.server_log, "ab")
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    url = f"http://127.0.0.1:{port}"
+    _wait_until_up(url + "/", process)
+    return url, process
+
+
+# --- Load generation -------------------------------------------------------
+
+_SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+
+async def scrape(client: httpx.AsyncClient) -> dict:
+    """Stage sums/counts and coaching sources from /metrics ({} if not served)."""
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return {}
+    if response.status_code != 200:
+        return {}
+    samples = {}
+    for line in response.text.splitlines():
+        match = _SAMPLE.match(line)
+        if match and match.group(1) in ("stage_duration_seconds_sum", "stage_duration_seconds_count",
+                                        "coaching_replies_total"):
+            samples[(match.group(1), match.group(2))] = float(match.group(3))
+    return samples
+
+
+def _server_side(before: dict, after: dict) -> dict:
+    """What the server reported between two scrapes."""
+    delta = {key: value - before.get(key, 0.0) for key, value in after.items()}
+    stages, coaching = {}, {}
+    for (name, labels), value in delta.items():
+        if name == "stage_duration_seconds_count" and value:
+            stage = labels.split('"')[1]
+            total = delta.get(("stage_duration_seconds_sum", labels), 0.0)
+            stages[stage] = {"count": int(value), "mean_ms": round(total / value * 1000, 3)}
+        elif name == "coaching_replies_total" and value:
+            coaching[labels] = int(value)
+    return {"stages": stages, "coaching_replies": coaching}
+
+
+async def drive(client: httpx.AsyncClient, path: str, body, requests: int, concurrency: int,
+                unique: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    # Variant 0 is sent by every request that isn't unique, so it hits
+    # caches; the others are also distinct from other scenarios' variants
+    base = (seed + 1) * 1_000_000
+    variants = [base + i if rng.random() < unique else 0 for i in range(requests)]
+    latencies, first_bytes, statuses, errors = [], [], {}, 0
+    pending = iter(variants)
+
+    async def worker(n: int):
+        nonlocal errors
+        # Each concurrent client is a separate student to the fair-share scheduler
+        headers = {"Authorization": f"Bearer bench-client-{n}"}
+        for variant in pending:
+            started = time.perf_counter()
+            try:
+                first_byte = None
+                async with client.stream("POST", path, json=body(variant), headers=headers) as response:
+                    async for _ in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter()
+                if first_byte is not None:
+                    first_bytes.append((first_byte - started) * 1000)
+                status = str(response.status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not status.startswith("2"):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "status_counts": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "min": round(min(latencies), 2),
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "max": round(max(latencies), 2),
+        },
+        # Until the first body chunk; below the full latency for streamed replies
+        "first_byte_ms": {
+            "p50": round(percentile(first_bytes, 0.50), 2),
+            "p95": round(percentile(first_bytes, 0.95), 2),
+        } if first_bytes else None,
+    }
+
+
+async def run_scenarios(args, url: str) -> dict:
+    results = {}
+    for index, name in enumerate(args.scenarios):
+        path, body = SCENARIOS[name]
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            # Warm-up requests reuse variant 0, which the measured run may hit too
+            for _ in range(args.warmup):
+                await client.post(path, json=body(0))
+            before = await scrape(client)
+            result = await drive(client, path, body, args.requests, args.concurrency, args.unique,
+                                 args.seed + index)
+            after = await scrape(client)
+            if after:
+                result["server"] = _server_side(before, after)
+            results[name] = result
+        print(f"{name:<16} {result['throughput_rps']:8.1f} req/s  p50 {result['latency_ms']['p50']:8.1f} ms"
+              f"  p95 {result['latency_ms']['p95']:8.1f} ms  p99 {result['latency_ms']['p99']:8.1f} ms"
+              f"  errors {result['errors']}", file=sys.stderr)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """Print the relative change of each scenario against a saved run."""
+    print(f"\n{'scenario':<16} {'throughput':>11} {'p50':>9} {'p95':>9} {'p99':>9}  (vs {baseline['meta'].get('commit')})",
+          file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if "latency_ms" not in result or not old or "latency_ms" not in old:
+            continue
+
+        def change(new_value, old_value):
+            return f"{(new_value - old_value) / old_value * 100:+8.1f}%" if old_value else "      n/a"
+
+        print(f"{name:<16} {change(result['throughput_rps'], old['throughput_rps']):>11}"
+              + "".join(f" {change(result['latency_ms'][p], old['latency_ms'][p]):>9}" for p in ("p50", "p95", "p99")),
+              file=sys.stderr)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Offline load test of the backend endpoints")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS,
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients sending at once")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per scenario")
+    parser.add_argument("--unique", type=float, default=1.0,
+                        help="fraction of requests with a body not seen before (the rest can hit caches)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="seconds per fake Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2, help="relative spread of the latency")
+    parser.add_argument("--gemini-failure-rate", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds per fake ElevenLabs call")
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0)
+    parser.add_argument("--url", help="load a running backend instead (its real upstreams are used)")
+    parser.add_argument("--server-log", default=os.devnull, help="where the backend's own output goes")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="a saved report to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args)
+        return
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    processes = []
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            url, process = start_backend(args)
+            processes.append(process)
+
+        scenarios = asyncio.run(run_scenarios(args, url))
+    finally:
+        for process in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("serve", "port", "output", "compare", "server_log")}
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fake_upstreams": not args.url,
+            "config": config,
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            compare(report, json.load(handle))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare cold `node` spawns against the warm worker pool, per case and batched,
+and the default one submission per worker against workers kept for many.
+
+Usage: python bench_node_pool.py [submissions] [pool_size]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from node_pool import NodeWorkerPool
+
+CODE = """
+function twoSum(nums, target) {
+    const seen = new Map();
+    for (let i = 0; i < nums.length; i++) {
+        if (seen.has(target - nums[i])) return [seen.get(target - nums[i]), i];
+        seen.set(nums[i], i);
+    }
+}
+"""
+INPUTS = ["[2, 7, 11, 15], 9", "[3, 2, 4], 6", "[3, 3], 6"]
+CANDIDATES = ["twosum", "twoSum", "TwoSum", "two_sum", "two-sum"]
+
+
+def cold_spawn(code: str, test_input: str) -> str:
+    """The old execution path: one temp file and one node process per case."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
+        f.write(f"{code}\nconsole.log(JSON.stringify(twoSum(...[{test_input}])));\n")
+        temp_file = f.name
+    try:
+        result = subprocess.run(['node', temp_file], capture_output=True, text=True, timeout=5)
+        return result.stdout.strip()
+    finally:
+        os.unlink(temp_file)
+
+
+def bench(label: str, submit, submissions: int, concurrency: int) -> None:
+    latencies = []
+
+    def one(_):
+        started = time.perf_counter()
+        submit()
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(submissions)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    print(f"{label:<12} {submissions / elapsed:8.1f} submissions/s   p50 {p50:7.1f} ms   p95 {p95:7.1f} ms")
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    pool_size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    pool = NodeWorkerPool(size=pool_size)
+    reused = NodeWorkerPool(size=pool_size, max_runs_per_worker=submissions)
+    pool.start()
+    reused.start()
+    try:
+        print(f"{submissions} submissions x {len(INPUTS)} cases, concurrency {pool_size}")
+        bench("cold spawn", lambda: [cold_spawn(CODE, i) for i in INPUTS], submissions, pool_size)
+        bench("warm pool", lambda: [pool.run(CODE, CANDIDATES, [i]) for i in INPUTS], submissions, pool_size)
+        bench("batched", lambda: pool.run(CODE, CANDIDATES, INPUTS), submissions, pool_size)
+        bench("reused", lambda: reused.run(CODE, CANDIDATES, INPUTS), submissions, pool_size)
+    finally:
+        pool.shutdown()
+        reused.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Compare cold `python` spawns against the forking zygote, next to the warm
+Node pool running the same solution in JavaScript.
+
+Usage: python bench_python_runner.py [submissions] [concurrency]
+"""
+import json
+import subprocess
+import sys
+
+from bench_node_pool import CANDIDATES, CODE as JS_CODE, INPUTS, bench
+from node_pool import NodeWorkerPool
+from python_runner import PythonRunner
+
+CODE = """
+def two_sum(nums, target):
+    seen = {}
+    for i, x in enumerate(nums):
+        if target - x in seen:
+            return [seen[target - x], i]
+        seen[x] = i
+"""
+
+
+def cold_spawn(code: str, inputs) -> list:
+    """One fresh interpreter per submission, as a naive runner would do it."""
+    script = code + "\nimport json, sys\nfor line in sys.argv[1:]:\n    print(json.dumps(two_sum(*json.loads('[' + line + ']'))))\n"
+    result = subprocess.run([sys.executable, "-c", script, *inputs], capture_output=True, text=True, timeout=5)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    runner = PythonRunner()
+    runner.start()
+    pool = NodeWorkerPool(size=concurrency)
+    pool.start()
+    try:
+        print(f"{submissions} submissions x {len(INPUTS)} cases, concurrency {concurrency}")
+        bench("cold python", lambda: cold_spawn(CODE, INPUTS), submissions, concurrency)
+        bench("zygote fork", lambda: runner.run(CODE, CANDIDATES, INPUTS), submissions, concurrency)
+        bench("node pool", lambda: pool.run(JS_CODE, CANDIDATES, INPUTS), submissions, concurrency)
+    finally:
+        runner.shutdown()
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Circuit breaker with a latency-adaptive timeout, for upstream API calls.
+
+Each call is cut off after a timeout derived from recent latencies (a
+multiple of their p95, within fixed bounds), so a slow upstream costs a
+bounded wait rather than the SDK's own timeout. After ``failure_threshold``
+consecutive failures or timeouts the circuit opens and calls fail at once
+with ``CircuitOpen`` for ``reset_timeout`` seconds; then a single probe
+call is let through (half-open) and its outcome closes or re-opens the
+circuit.
+
+Latency here is the time until the upstream starts answering: the whole
+call for ``call``, the first chunk for ``stream``. Everything runs on the
+event loop, so there is no locking.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import metrics
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+CIRCUIT_STATE = metrics.REGISTRY.gauge(
+    "circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("circuit",)
+)
+CIRCUIT_CALLS = metrics.REGISTRY.counter(
+    "circuit_calls_total", "Calls through a circuit breaker by outcome (success, failure, timeout, rejected, cancelled)",
+    ("circuit", "outcome")
+)
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """The circuit is open; the call was not attempted."""
+
+
+async def _within(awaitable: Awaitable[Any], timeout: float) -> Any:
+    # asyncio.wait_for before 3.12 can swallow a cancellation that lands as
+    # the awaitable finishes, so a superseded stream would keep going
+    if hasattr(asyncio, "timeout"):
+        async with asyncio.timeout(timeout):
+            return await awaitable
+    return await asyncio.wait_for(awaitable, timeout)
+
+
+class CircuitBreaker:
+    """Breaker for one upstream, named ``name`` in /metrics.
+
+    The timeout is ``timeout_factor`` times the p95 of the last ``window``
+    successful latencies, clamped to ``[min_timeout, max_timeout]``; until
+    ``min_samples`` latencies are known it is ``max_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 min_timeout: float = 2.0, max_timeout: float = 15.0, timeout_factor: float = 1.5,
+                 window: int = 200, min_samples: int = 20):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max(min_timeout, max_timeout)
+        self.timeout_factor = timeout_factor
+        self.min_samples = min_samples
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._latencies: "deque[float]" = deque(maxlen=window)
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], circuit=self.name)
+
+    def p95(self) -> Optional[float]:
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def timeout(self) -> float:
+        """Seconds the next call may take before it counts as failed."""
+        p95 = self.p95()
+        if p95 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+    def _acquire(self) -> None:
+        """Let a call through or raise CircuitOpen."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+            CIRCUIT_CALLS.inc(circuit=self.name, outcome="rejected")
+            raise CircuitOpen(f"{self.name} circuit is open")
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def _release(self, latency: Optional[float] = None, failed: bool = False, timed_out: bool = False) -> None:
+        """Record how a call that got through went. A cancelled call (the
+        caller gave up on it) counts as neither success nor failure."""
+        probe, self._probing = self._probing, False
+        if timed_out or failed:
+            CIRCUIT_CALLS.inc(circuit=self.name, outcome="timeout" if timed_out else "failure")
+            self.consecutive_failures += 1
+            if probe or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("%s circuit opened after %d failed calls", self.name, self.consecutive_failures)
+                self._set_state(OPEN)
+                self.opened_at = time.monotonic()
+        elif latency is not None:
+            CIRCUIT_CALLS.inc(circuit=self.name, outcome="success")
+            self._latencies.append(latency)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info("%s circuit closed again", self.name)
+                self._set_state(CLOSED)
+        else:
+            CIRCUIT_CALLS.inc(circuit=self.name, outcome="cancelled")
+
+    async def call(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``factory()`` under the adaptive timeout.
+
+        Raises CircuitOpen without calling it while the circuit is open,
+        asyncio.TimeoutError when it takes too long, or whatever it raised.
+        """
+        self._acquire()
+        started = time.monotonic()
+        try:
+            result = await _within(factory(), self.timeout())
+        except asyncio.TimeoutError:
+            self._release(timed_out=True)
+            raise
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception:
+            self._release(failed=True)
+            raise
+        self._release(time.monotonic() - started)
+        return result
+
+    async def stream(self, factory: Callable[[], Awaitable[AsyncIterator[Any]]]) -> AsyncIterator[Any]:
+        """Iterate the stream ``factory()`` returns, failing the call if the
+        first chunk, or any gap between chunks, takes longer than the timeout."""
+        self._acquire()
+        started = time.monotonic()
+        timeout = self.timeout()
+        first_chunk_at = None
+        outcome: Dict[str, Any] = {}
+        try:
+            chunks = (await _within(factory(), timeout)).__aiter__()
+            while True:
+                try:
+                    chunk = await _within(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+                yield chunk
+            outcome["latency"] = (first_chunk_at or time.monotonic()) - started
+        except asyncio.TimeoutError:
+            outcome["timed_out"] = True
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away; that says nothing about the upstream
+            raise
+        except Exception:
+            outcome["failed"] = True
+            raise
+        finally:
+            self._release(**outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "timeout": self.timeout(),
+            "p95": self.p95(),
+            "samples": len(self._latencies),
+            "retry_in": retry_in,
+        }
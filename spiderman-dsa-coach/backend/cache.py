@@ -0,0 +1,267 @@
+"""Caching helpers: an LRU+TTL cache with an optional sqlite tier, and
+single-flight coalescing of identical concurrent async calls."""
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Strings are kept verbatim, comments dropped, and whitespace collapsed so that
+# re-indenting or commenting code maps to the same cache key. Line breaks are
+# kept (as a single newline) because they can matter in JavaScript (ASI), and
+# Python keeps its leading indentation.
+#
+# Two programs must never normalize alike, so code the tokenizer can't be sure
+# about is kept as it is: an unterminated quote (``other``), a JavaScript ``/``
+# outside a comment (which may start a regex literal, where quotes and ``//``
+# mean something else) and a template literal with ``${...}`` in it (which can
+# hold code, strings and other templates the tokenizer doesn't follow).
+_JS_TOKEN = re.compile(
+    r'(?P<string>"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)'
+    r'|(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<newline>\n)'
+    r'|(?P<space>[ \t\r\f\v]+)'
+    r'|(?P<code>[^"\'`/\s]+)'
+    r'|(?P<other>.)',
+    re.DOTALL,
+)
+_PY_TOKEN = re.compile(
+    r'(?P<string>"""(?:\\.|[^\\])*?"""|\'\'\'(?:\\.|[^\\])*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')'
+    r'|(?P<comment>#[^\n]*)'
+    r'|(?P<newline>\n)'
+    r'|(?P<space>[ \t\r\f\v]+)'
+    r'|(?P<code>[^"\'#\s]+)'
+    r'|(?P<other>.)',
+    re.DOTALL,
+)
+
+# Prefix of code kept as it is, so it can't collide with normalized code
+_VERBATIM = "\0verbatim\0"
+
+
+def normalize_code(code: str, language: str) -> str:
+    """Drop comments and insignificant whitespace from ``code``, or return
+    it unchanged (marked as such) where that might change its meaning."""
+    python = language.lower() == "python"
+    pattern = _PY_TOKEN if python else _JS_TOKEN
+    out = []
+    pending = ""  # whitespace owed before the next real token
+    indent = ""  # leading indentation of the current line (Python only)
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        if kind == "other" or (kind == "string" and match.group().startswith("`") and "${" in match.group()):
+            return _VERBATIM + code
+        if kind == "newline":
+            pending = "\n" if out else ""
+            indent = ""
+        elif kind == "space" and python and indent == "":
+            indent = match.group()
+        elif kind in ("space", "comment"):
+            if out and not pending:
+                pending = " "
+        else:
+            out.append(pending + indent if python and indent is not None and pending != " " else pending)
+            out.append(match.group())
+            pending = ""
+            indent = None
+    return "".join(out)
+
+
+def content_key(*parts: str) -> str:
+    """Stable digest of the given key parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LRUTTLCache:
+    """Thread-safe string cache bounded by entry count, total bytes and age.
+
+    When ``db_path`` is set, entries are also written to a sqlite table so they
+    survive restarts; memory misses fall through to it. The table keeps at
+    most ``max_disk_entries`` rows, dropping expired and then the oldest ones
+    as entries are written. On the event loop use ``aget`` and ``aset``, which
+    run the sqlite work in a thread.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: float = 600.0, db_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Held for sqlite work only, so memory lookups never wait on the disk
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+            self._prune()
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._lookup(key)
+        if value is None and self._db is not None:
+            value = self._load(key)
+        if value is None:
+            self._miss()
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """``get`` with the sqlite lookup run off the event loop."""
+        value = self._lookup(key)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._load, key)
+        if value is None:
+            self._miss()
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._db is not None:
+            self._save(key, value, expires_at)
+
+    async def aset(self, key: str, value: str) -> None:
+        """``set`` with the sqlite write run off the event loop."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._save, key, value, expires_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+            }
+
+    def _lookup(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+            return None
+
+    def _load(self, key: str) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._store(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+        return row[0]
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _save(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._prune()
+            self._db.commit()
+
+    def _prune(self) -> None:
+        # Every row has the same TTL, so the soonest to expire are the oldest
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM cache WHERE expires_at <= "
+            "(SELECT expires_at FROM cache ORDER BY expires_at DESC LIMIT 1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller for a key starts ``factory()``; everyone arriving while it
+    is in flight awaits the same result (or exception). The shared call is
+    shielded, so one caller going away doesn't cancel it for the others; it
+    is cancelled once every caller has gone away.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._waiting: Dict[str, int] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiting[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
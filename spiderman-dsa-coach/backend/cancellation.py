@@ -0,0 +1,86 @@
+"""Cancelling sandbox runs nobody is waiting for any more.
+
+``run_in_sandbox`` gives every blocking sandbox call a ``Cancellation``,
+held in a ContextVar the sandbox thread sees. When the coroutine awaiting
+the call is cancelled (the client disconnected, a newer request for the same
+session arrived, a /ws/session update superseded it), the cancellation fires
+and whatever the runner registered with ``on_cancel`` stops the run: the
+Node pool kills the worker process mid-op, the Python runner has the zygote
+kill the forked child.
+
+What a killed run would still have cost can't be known, so the CPU time
+saved is estimated as the rest of its time budget.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+import metrics
+
+RUNS_CANCELLED = metrics.REGISTRY.counter(
+    "sandbox_runs_cancelled_total", "Sandbox runs stopped because their result was no longer wanted", ("runtime",)
+)
+CPU_SECONDS_SAVED = metrics.REGISTRY.counter(
+    "sandbox_cpu_seconds_saved_total",
+    "Upper bound on sandbox CPU seconds saved by cancelled runs (the rest of each one's time budget)",
+    ("runtime",)
+)
+
+
+class Cancellation:
+    """Fired at most once; callbacks run in the thread that fires it."""
+
+    __slots__ = ("cancelled", "_callbacks", "_lock")
+
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Call ``callback`` if the cancellation fires inside the block
+        (at once if it already has)."""
+        with self._lock:
+            fired = self.cancelled
+            if not fired:
+                self._callbacks.append(callback)
+        if fired:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+def record_cancelled_run(runtime: str, budget_left: float) -> None:
+    RUNS_CANCELLED.inc(runtime=runtime)
+    CPU_SECONDS_SAVED.inc(max(0.0, budget_left), runtime=runtime)
+
+
+_current: ContextVar[Optional[Cancellation]] = ContextVar("sandbox_cancellation", default=None)
+
+
+def current() -> Optional[Cancellation]:
+    return _current.get()
+
+
+@contextmanager
+def cancellation_as_current(cancellation: Optional[Cancellation]) -> Iterator[Optional[Cancellation]]:
+    token = _current.set(cancellation)
+    try:
+        yield cancellation
+    finally:
+        _current.reset(token)
@@ -0,0 +1,251 @@
+"""Pass/fail decisions for sandbox outputs.
+
+Outputs are JSON (the sandboxes serialize whatever the function returned)
+and are compared by a per-problem rule from the catalog's ``compare`` field:
+
+- ``exact``: equal as JSON values, so spacing and ``2`` vs ``2.0`` don't
+  matter. Compared by the SHA-256 of the canonical form, which is all the
+  sandbox sends for outputs too large to ship whole.
+- ``unordered``: a list whose order doesn't matter; ``depth`` says how many
+  nesting levels to ignore order at (2 for e.g. a list of unordered triplets).
+- ``float``: numbers within ``tolerance`` (absolute or relative).
+- ``checker``: a function from CHECKERS that sees the parsed input, for
+  problems with several right answers.
+
+Each side is parsed at most once; a byte-identical output skips parsing.
+Output that isn't JSON falls back to the old whitespace-insensitive text
+comparison.
+"""
+import hashlib
+import json
+import math
+import re
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+
+_NOT_JSON = object()
+_UNSET = object()
+
+# A JSON string (left alone), or a float json.dumps writes differently from
+# JSON.stringify: integral (2.0) or with an exponent (2.5e-07). In between,
+# both write the same shortest digits the same way. Numbers only match from
+# their first digit, so one that needs no change costs a single try.
+_FLOAT_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|(?<![\d.])-?\d+(?:\.0(?!\d)|(?:\.\d+)?e[-+]\d+)')
+
+
+def _parse_float(text: str):
+    # 2.0 and 2 are the same answer; JSON.stringify never writes the former
+    value = float(text)
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+def parse(text: str) -> Any:
+    """The JSON value of ``text``, or _NOT_JSON."""
+    try:
+        return json.loads(text, parse_float=_parse_float)
+    except (ValueError, RecursionError):
+        return _NOT_JSON
+
+
+def canonical(value: Any) -> str:
+    """Compact JSON, as JSON.stringify writes it, numbers included: both
+    sandboxes send outputs in this form and digests are taken over it."""
+    text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    if "." in text or "e-" in text or "e+" in text:
+        text = _FLOAT_TOKEN.sub(_js_float, text)
+    return text
+
+
+def _js_float(match) -> str:
+    token = match.group()
+    if token[0] == '"':
+        return token
+    if token.endswith(".0"):
+        # json.dumps only writes these below 1e16
+        return "0" if token == "-0.0" else token[:-2]
+    return js_number(float(token))
+
+
+def js_number(value: float) -> str:
+    """``value`` as JavaScript's Number#toString writes it: ``2`` for 2.0,
+    ``2.5e-7`` and ``0.00001`` where Python writes ``2.5e-07`` and ``1e-05``.
+    Both pick the shortest digits that round-trip; only the layout differs."""
+    if value == 0:
+        return "0"
+    _, digits, exponent = Decimal(repr(abs(value))).normalize().as_tuple()
+    digits = "".join(map(str, digits))
+    sign = "-" if value < 0 else ""
+    k = len(digits)
+    # value = 0.digits * 10 ** n
+    n = exponent + k
+    if k <= n <= 21:
+        return sign + digits + "0" * (n - k)
+    if 0 < n <= 21:
+        return sign + digits[:n] + "." + digits[n:]
+    if -6 < n <= 0:
+        return sign + "0." + "0" * -n + digits
+    mantissa = digits if k == 1 else digits[0] + "." + digits[1:]
+    return f"{sign}{mantissa}e{'+' if n > 0 else '-'}{abs(n - 1)}"
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _squash(text: str) -> str:
+    return text.strip().replace(" ", "").replace("\n", "")
+
+
+class Expected:
+    """An expected output, with its parsed value and digest worked out on
+    first use. ``known_digest`` (e.g. stored next to a hidden case) saves
+    parsing a large expected output at all."""
+
+    __slots__ = ("text", "_value", "_digest")
+
+    def __init__(self, text: str, known_digest: Optional[str] = None):
+        self.text = text
+        self._value = _UNSET
+        self._digest = known_digest
+
+    @property
+    def value(self) -> Any:
+        if self._value is _UNSET:
+            self._value = parse(self.text)
+        return self._value
+
+    @property
+    def digest(self) -> Optional[str]:
+        if self._digest is None and self.value is not _NOT_JSON:
+            self._digest = digest(canonical(self.value))
+        return self._digest
+
+
+class Comparator:
+    """One problem's comparison rule."""
+
+    __slots__ = ("mode", "tolerance", "depth", "checker")
+
+    def __init__(self, mode: str = "exact", tolerance: float = 1e-6, depth: int = 1, checker: Optional[str] = None):
+        if mode not in _MODES:
+            raise ValueError(f"unknown compare mode {mode!r}")
+        if mode == "checker" and checker not in CHECKERS:
+            raise ValueError(f"unknown checker {checker!r}")
+        self.mode = mode
+        self.tolerance = tolerance
+        self.depth = depth
+        self.checker = checker
+
+    @classmethod
+    def from_spec(cls, spec: Optional[Dict[str, Any]]) -> "Comparator":
+        """Build from a catalog ``compare`` object (None means exact)."""
+        if not spec:
+            return EXACT
+        return cls(
+            mode=spec.get("mode", "exact"),
+            tolerance=float(spec.get("tolerance", 1e-6)),
+            depth=int(spec.get("depth", 1)),
+            checker=spec.get("checker"),
+        )
+
+    @property
+    def spec(self) -> str:
+        """Canonical form of the rule, so cached verdicts follow changes to it."""
+        return canonical([self.mode, self.tolerance, self.depth, self.checker])
+
+    @property
+    def needs_value(self) -> bool:
+        """Whether the full output is needed (a digest alone won't do)."""
+        return self.mode != "exact"
+
+    def matches(self, output: str, expected: Expected, output_digest: Optional[str] = None,
+                test_input: Optional[str] = None) -> bool:
+        """Whether ``output`` is a right answer.
+
+        ``output_digest`` is set when the sandbox only sent a truncated
+        output; then only an exact comparison is possible.
+        """
+        if output_digest is not None:
+            return self.mode == "exact" and output_digest == expected.digest
+        if self.mode == "exact":
+            # Sandbox output is usually canonical already, so hashing it as
+            # is settles most cases without parsing
+            if output == expected.text or (expected.digest is not None and digest(output) == expected.digest):
+                return True
+
+        actual = parse(output)
+        if actual is _NOT_JSON:
+            return _squash(output) == _squash(expected.text)
+        return _MODES[self.mode](self, actual, expected, test_input)
+
+    def _exact(self, actual: Any, expected: Expected, test_input: Optional[str]) -> bool:
+        return expected.digest is not None and digest(canonical(actual)) == expected.digest
+
+    def _unordered(self, actual: Any, expected: Expected, test_input: Optional[str]) -> bool:
+        return expected.value is not _NOT_JSON and \
+            _unordered_key(actual, self.depth) == _unordered_key(expected.value, self.depth)
+
+    def _float(self, actual: Any, expected: Expected, test_input: Optional[str]) -> bool:
+        return expected.value is not _NOT_JSON and _close(actual, expected.value, self.tolerance)
+
+    def _checker(self, actual: Any, expected: Expected, test_input: Optional[str]) -> bool:
+        args = parse("[" + (test_input or "") + "]")
+        if args is _NOT_JSON:
+            return False
+        return CHECKERS[self.checker](args, actual, expected.value)
+
+
+def _unordered_key(value: Any, depth: int) -> str:
+    """Canonical form with the order of lists ``depth`` levels deep sorted away."""
+    return canonical(_sorted_lists(value, depth))
+
+
+def _sorted_lists(value: Any, depth: int) -> Any:
+    if depth <= 0 or not isinstance(value, list):
+        return value
+    items = [_sorted_lists(element, depth - 1) for element in value]
+    try:
+        # Same-typed elements (the usual case) sort natively
+        return sorted(items)
+    except TypeError:
+        return sorted(items, key=canonical)
+
+
+def _close(a: Any, b: Any, tolerance: float) -> bool:
+    if type(a) is float or type(b) is float:
+        return type(a) in (int, float) and type(b) in (int, float) and \
+            math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance)
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_close(x, y, tolerance) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_close(a[key], b[key], tolerance) for key in a)
+    return a == b
+
+
+def _two_sum_pair(args: list, actual: Any, expected: Any) -> bool:
+    """Any two distinct indices whose values add up to the target, in either order."""
+    if len(args) != 2 or not isinstance(actual, list) or len(actual) != 2:
+        return False
+    nums, target = args
+    if not isinstance(nums, list):
+        return False
+    i, j = actual
+    valid = all(isinstance(k, int) and not isinstance(k, bool) and 0 <= k < len(nums) for k in (i, j))
+    return valid and i != j and nums[i] + nums[j] == target
+
+
+# Custom checkers: (parsed arguments, parsed output, parsed expected) -> passed
+CHECKERS: Dict[str, Callable[[list, Any, Any], bool]] = {
+    "two-sum-pair": _two_sum_pair,
+}
+
+_MODES = {
+    "exact": Comparator._exact,
+    "unordered": Comparator._unordered,
+    "float": Comparator._float,
+    "checker": Comparator._checker,
+}
+
+EXACT = Comparator()
@@ -0,0 +1,713 @@
+"""Structural time-complexity estimation for /analyze.
+
+Code is reduced to one :class:`FunctionSummary` per function: a tree of loop
+nodes, each carrying its growth factor (``n`` for a plain loop, ``log n`` for
+one that halves or doubles its counter, ``n log n`` for a sort), plus the
+call sites found at each level. Summaries only depend on the function's own
+source, so they are fingerprinted and reused when the same function shows up
+again; the call graph is resolved afresh on every estimate, which is cheap.
+
+JavaScript is handled by a small tokenizer and bracket matcher, Python by the
+standard ``ast`` module. Both produce the same summaries.
+"""
+import ast
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# A cost is (polynomial degree, power of log n); EXPONENTIAL sorts above all.
+Cost = Tuple[int, int]
+CONSTANT: Cost = (0, 0)
+LINEAR: Cost = (1, 0)
+LOGARITHMIC: Cost = (0, 1)
+LINEARITHMIC: Cost = (1, 1)
+EXPONENTIAL: Cost = (1000, 0)
+
+MODULE = "<module>"
+
+# Bigger inputs, or loops nested deeper than this, are not analyzed
+# structurally; callers fall back to cheaper heuristics (ValueError).
+MAX_SOURCE_CHARS = 50_000
+MAX_LOOP_DEPTH = 32
+
+_SUPERSCRIPTS = str.maketrans("0123456789", "⁰¹²³⁴⁵⁶⁷⁸⁹")
+
+
+def _add(a: Cost, b: Cost) -> Cost:
+    if EXPONENTIAL in (a, b):
+        return EXPONENTIAL
+    return (a[0] + b[0], a[1] + b[1])
+
+
+def format_bound(cost: Cost) -> str:
+    """Render a cost as big-O, e.g. (2, 1) -> "O(n² log n)"."""
+    if cost >= EXPONENTIAL:
+        return "O(2ⁿ)"
+    degree, logs = cost
+    parts = []
+    if degree == 1:
+        parts.append("n")
+    elif degree > 1:
+        parts.append("n" + str(degree).translate(_SUPERSCRIPTS))
+    if logs == 1:
+        parts.append("log n")
+    elif logs > 1:
+        parts.append("log" + str(logs).translate(_SUPERSCRIPTS) + " n")
+    return "O(" + (" ".join(parts) or "1") + ")"
+
+
+class LoopNode:
+    """A loop (or the function body itself) and what runs inside it."""
+
+    __slots__ = ("factor", "children", "calls")
+
+    def __init__(self, factor: Cost = CONSTANT):
+        self.factor = factor
+        self.children: List["LoopNode"] = []
+        self.calls: List[Tuple[str, bool]] = []  # (callee, called on a halved input)
+
+
+class FunctionSummary:
+    """Everything the estimator needs to know about one function."""
+
+    __slots__ = ("name", "fingerprint", "body", "memoized", "penalty")
+
+    def __init__(self, name: str, fingerprint: str, body: LoopNode, memoized: bool = False,
+                 penalty: float = 0.0):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.body = body
+        self.memoized = memoized
+        # How much guesswork went into the summary (log-loop detection etc.)
+        self.penalty = penalty
+
+
+class ComplexityEstimate:
+    """Estimated bound for a whole program, with the per-function summaries
+    it was built from so the next estimate can reuse unchanged ones."""
+
+    __slots__ = ("bound", "cost", "confidence", "functions", "recursive")
+
+    def __init__(self, bound: str, cost: Cost, confidence: float, functions: Dict[str, FunctionSummary],
+                 recursive: List[str] = None):
+        self.bound = bound
+        self.cost = cost
+        self.confidence = confidence
+        self.functions = functions
+        # Names of functions that call themselves
+        self.recursive = recursive or []
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Call-graph resolution (language independent)
+# ---------------------------------------------------------------------------
+
+def _work(node: LoopNode, skip: str, resolve) -> Cost:
+    """Cost of ``node`` ignoring calls to ``skip`` (the function itself)."""
+    inner = CONSTANT
+    for child in node.children:
+        inner = max(inner, _work(child, skip, resolve))
+    for callee, _ in node.calls:
+        if callee != skip:
+            inner = max(inner, resolve(callee))
+    return _add(node.factor, inner)
+
+
+def _self_calls(node: LoopNode, name: str, loop_depth: int = 0) -> Tuple[int, bool, bool]:
+    """(call sites, all on halved input, any inside a loop) for calls to ``name``."""
+    count = sum(1 for callee, _ in node.calls if callee == name)
+    halving = all(halved for callee, halved in node.calls if callee == name)
+    in_loop = count > 0 and loop_depth > 0
+    for child in node.children:
+        c, h, l = _self_calls(child, name, loop_depth + 1)
+        count += c
+        halving = halving and h
+        in_loop = in_loop or l
+    return count, halving, in_loop
+
+
+def _recursive_cost(summary: FunctionSummary, work: Cost) -> Cost:
+    calls, halving, in_loop = _self_calls(summary.body, summary.name)
+    if calls == 0:
+        return work
+    if summary.memoized:
+        # Each distinct argument is solved once
+        return _add(LINEAR, work)
+    if calls == 1 and not in_loop:
+        # T(n) = T(n/2) + f(n)  or  T(n) = T(n-1) + f(n)
+        if halving:
+            return LOGARITHMIC if work == CONSTANT else work
+        return _add(LINEAR, work)
+    if halving:
+        # Divide and conquer, T(n) = 2T(n/2) + f(n)
+        if work[0] < 1:
+            return LINEAR
+        if work[0] == 1:
+            return (1, work[1] + 1)
+        return work
+    return EXPONENTIAL
+
+
+def estimate(summaries: Dict[str, FunctionSummary]) -> ComplexityEstimate:
+    """Resolve calls between summaries and bound the whole program."""
+    costs: Dict[str, Cost] = {}
+    active = set()
+
+    def resolve(name: str) -> Cost:
+        if name in costs:
+            return costs[name]
+        summary = summaries.get(name)
+        if summary is None or name in active:
+            # Unknown callee (library code) or mutual recursion: count it as
+            # constant here; direct recursion is handled below.
+            return CONSTANT
+        active.add(name)
+        cost = _recursive_cost(summary, _work(summary.body, name, resolve))
+        active.discard(name)
+        costs[name] = cost
+        return cost
+
+    overall = CONSTANT
+    confidence = 0.9
+    for name in summaries:
+        cost = resolve(name)
+        if cost > overall:
+            overall = cost
+            confidence = 0.9 - summaries[name].penalty
+        elif cost == overall:
+            confidence = min(confidence, 0.9 - summaries[name].penalty)
+    recursive = [name for name, summary in summaries.items() if _self_calls(summary.body, name)[0]]
+    return ComplexityEstimate(format_bound(overall), overall, round(max(0.3, confidence), 2), summaries, recursive)
+
+
+# ---------------------------------------------------------------------------
+# JavaScript
+# ---------------------------------------------------------------------------
+
+_JS_TOKEN = re.compile(
+    r"(?P<skip>\s+|//[^\n]*|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*.*)"
+    r'|(?P<str>"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+    r"|`[^`\\]*(?:\\.[^`\\]*)*`?)"
+    r"|(?P<id>[A-Za-z_$][\w$]*)"
+    r"|(?P<num>\d[\w.]*|\.\d\w*)"
+    r"|(?P<op>>>>=|>>>|>>=|<<=|\*\*=|===|!==|\.\.\.|=>|[-+*/%&|^]=|>>|<<|\+\+|--|&&|\|\||\?\?|[<>=!]=|.)",
+    re.DOTALL,
+)
+
+_JS_KEYWORDS = frozenset((
+    "if", "else", "for", "while", "do", "switch", "case", "return", "function", "catch", "try",
+    "finally", "new", "typeof", "instanceof", "in", "of", "let", "const", "var", "class",
+    "constructor", "throw", "break", "continue", "yield", "await", "async", "static", "delete",
+    "void", "super", "this", "import", "export", "default",
+))
+# Keywords that can only start a new statement after a complete expression
+_JS_STATEMENT_STARTS = frozenset((
+    "const", "let", "var", "function", "class", "if", "for", "while", "do", "return",
+    "switch", "try", "throw", "export", "import",
+))
+
+# Array/string methods that walk their receiver
+_JS_LINEAR_METHODS = frozenset((
+    "indexOf", "lastIndexOf", "includes", "slice", "splice", "shift", "unshift", "concat",
+    "reverse", "join", "split", "filter", "map", "reduce", "reduceRight", "forEach", "some",
+    "every", "find", "findIndex", "findLast", "findLastIndex", "fill", "flat", "flatMap",
+    "from", "keys", "values", "entries", "substring", "substr", "repeat", "replace",
+    "replaceAll", "toString", "startsWith", "endsWith", "trim", "padStart", "padEnd",
+))
+_JS_SORT_METHODS = frozenset(("sort", "toSorted"))
+
+_HALVING_OPS = frozenset(("*=", "/=", ">>=", "<<=", ">>>="))
+_SCALING_OPS = frozenset(("*", "/", ">>", "<<", ">>>"))
+_MEMO_NAMES = re.compile(r"memo|cache|^dp$|^dp[A-Z_]|table|seen", re.IGNORECASE)
+
+
+class _JsSource:
+    """Token list plus matching-bracket table for one piece of JavaScript."""
+
+    def __init__(self, code: str):
+        self.tokens: List[Tuple[str, str]] = [
+            (m.lastgroup, m.group()) for m in _JS_TOKEN.finditer(code) if m.lastgroup != "skip"
+        ]
+        self.match: Dict[int, int] = {}
+        stack: List[int] = []
+        pairs = {")": "(", "]": "[", "}": "{"}
+        for i, (kind, text) in enumerate(self.tokens):
+            if kind != "op":
+                continue
+            if text in "([{":
+                stack.append(i)
+            elif text in pairs:
+                # Unbalanced closers are ignored; unclosed openers run to the end
+                while stack and self.tokens[stack[-1]][1] != pairs[text]:
+                    stack.pop()
+                if stack:
+                    self.match[stack.pop()] = i
+        self.end = len(self.tokens)
+
+    def text(self, i: int) -> str:
+        return self.tokens[i][1] if 0 <= i < self.end else ""
+
+    def kind(self, i: int) -> str:
+        return self.tokens[i][0] if 0 <= i < self.end else ""
+
+    def close(self, i: int) -> int:
+        """Index of the bracket matching the one at ``i`` (or the end)."""
+        return self.match.get(i, self.end)
+
+    def statement_end(self, i: int, limit: int) -> int:
+        """End of a braceless statement starting at ``i``."""
+        while i < limit:
+            text = self.text(i)
+            if text in ("(", "[", "{"):
+                i = self.close(i) + 1
+                continue
+            if text in (";", "}", ")", "]"):
+                return i + 1 if text == ";" else i
+            i += 1
+        return limit
+
+    def expression_end(self, i: int, limit: int) -> int:
+        """End of an expression-bodied arrow function starting at ``i``."""
+        while i < limit:
+            text = self.text(i)
+            if text in ("(", "[", "{"):
+                i = self.close(i) + 1
+                continue
+            if text in (";", ",", ")", "]", "}"):
+                return i
+            if text in _JS_STATEMENT_STARTS and self.kind(i) == "id" and \
+                    (self.kind(i - 1) != "op" or self.text(i - 1) in (")", "]", "}")):
+                return i  # no semicolon; the next statement begins here
+            i += 1
+        return limit
+
+
+def _js_functions(src: _JsSource) -> List[Tuple[str, int, int, int]]:
+    """Named function definitions as (name, params_start, body_start, body_end).
+
+    ``body_start``/``body_end`` bound the body tokens, braces excluded.
+    Anonymous functions (callbacks) are left in place so their loops count
+    toward the enclosing function.
+    """
+    found = []
+    i = 0
+    while i < src.end:
+        kind, text = src.tokens[i]
+        name = None
+        params = -1
+        if text == "function" and kind == "id":
+            j = i + 1
+            if src.text(j) == "*":
+                j += 1
+            if src.kind(j) == "id":
+                name, params = src.text(j), j + 1
+            elif src.text(j) == "(" and src.text(i - 1) in ("=", ":") and src.kind(i - 2) == "id":
+                name, params = src.text(i - 2), j
+        elif kind == "id" and src.text(i + 1) == "=" and src.text(i - 1) != ".":
+            j = i + 2
+            if src.text(j) == "async":
+                j += 1
+            if src.text(j) == "(" and src.text(src.close(j) + 1) == "=>":
+                name, params = text, j
+            elif src.kind(j) == "id" and src.text(j + 1) == "=>":
+                name, params = text, j
+        elif (kind == "id" and text not in _JS_KEYWORDS and src.text(i + 1) == "("
+              and src.text(src.close(i + 1) + 1) == "{"
+              and src.text(i - 1) in ("{", "}", ";", "static", "async", "")):
+            name, params = text, i + 1  # class method
+
+        if name is None:
+            i += 1
+            continue
+
+        if src.text(params) == "(":
+            after = src.close(params) + 1
+        else:
+            after = params + 1  # single bare arrow parameter
+        if src.text(after) == "=>":
+            after += 1
+        if src.text(after) == "{":
+            found.append((name, params, after + 1, src.close(after)))
+            i = after + 1
+        else:
+            end = src.expression_end(after, src.end)
+            found.append((name, params, after, end))
+            i = end
+    return found
+
+
+def _js_condition_vars(src: _JsSource, start: int, end: int) -> set:
+    return {src.text(i) for i in range(start, end) if src.kind(i) == "id"}
+
+
+def _js_scales(src: _JsSource, start: int, end: int) -> bool:
+    """Whether tokens in [start, end) multiply or divide something."""
+    for i in range(start, end):
+        text = src.text(i)
+        if text in _SCALING_OPS and src.kind(i + 1) == "num":
+            return True
+        if text == "Math" and src.text(i + 2) in ("floor", "trunc", "ceil") and \
+                any(src.text(k) in _SCALING_OPS for k in range(i, min(end, src.close(i + 3) + 1))):
+            return True
+    return False
+
+
+def _js_loop_factor(src: _JsSource, keyword: int, header: Tuple[int, int], body: Tuple[int, int]) -> Cost:
+    """Growth factor of a loop: log n if it scales a variable from its own
+    condition, n otherwise."""
+    h_start, h_end = header
+    parts = [h_start]
+    depth = 0
+    for i in range(h_start, h_end):
+        text = src.text(i)
+        if text in ("(", "[", "{"):
+            depth += 1
+        elif text in (")", "]", "}"):
+            depth -= 1
+        elif text == ";" and depth == 0:
+            parts.append(i + 1)
+    if src.text(keyword) == "for":
+        if len(parts) < 3:
+            return LINEAR  # for...of / for...in
+        cond_vars = _js_condition_vars(src, parts[1], parts[2] - 1)
+        updates = [(parts[2], h_end)]
+    else:
+        cond_vars = _js_condition_vars(src, h_start, h_end)
+        updates = []
+
+    # Statements of the body (and the for-update) that assign something
+    assigned_scaled = set()
+    assigned_from: Dict[str, set] = {}
+    for start, end in updates + [body]:
+        i = start
+        while i < end:
+            if src.kind(i) == "id" and src.text(i - 1) != ".":
+                op = src.text(i + 1)
+                if op in _HALVING_OPS and src.text(i + 2) != "=":
+                    assigned_scaled.add(src.text(i))
+                elif op == "=":
+                    stmt_end = src.statement_end(i + 2, end)
+                    target = src.text(i)
+                    if _js_scales(src, i + 2, stmt_end):
+                        assigned_scaled.add(target)
+                    assigned_from.setdefault(target, set()).update(_js_condition_vars(src, i + 2, stmt_end))
+                    if any(src.text(k) in ("left", "right") and src.text(k - 1) == "."
+                           for k in range(i + 2, stmt_end)):
+                        assigned_scaled.add(target)  # walking down a tree
+            i += 1
+
+    if assigned_scaled & cond_vars:
+        return LOGARITHMIC
+    # Binary search: mid is scaled, and the bounds in the condition move to mid
+    for var in cond_vars:
+        if assigned_from.get(var, set()) & assigned_scaled:
+            return LOGARITHMIC
+    return LINEAR
+
+
+def _js_halving_args(src: _JsSource, start: int, end: int) -> bool:
+    for i in range(start, end):
+        text = src.text(i)
+        if text in _SCALING_OPS and src.kind(i + 1) == "num":
+            return True
+        if src.kind(i) == "id" and (text.lower().startswith("mid") or text in ("slice", "substring")):
+            return True
+    return False
+
+
+def _js_walk(src: _JsSource, start: int, end: int, node: LoopNode, skip: Dict[int, int],
+             stats: Dict[str, int], depth: int = 0) -> None:
+    if depth > MAX_LOOP_DEPTH:
+        raise ValueError("Loops are nested too deeply to analyze")
+    i = start
+    while i < end:
+        if i in skip:
+            i = skip[i]
+            continue
+        kind, text = src.tokens[i]
+
+        if kind == "id" and text in ("for", "while") and src.text(i + 1) == "(" and src.text(i - 1) != "." \
+                and i + 1 in src.match:
+            header_end = src.close(i + 1)
+            body_start = header_end + 1
+            if text == "while" and src.text(body_start) == ";":
+                i = body_start + 1  # tail of a do...while, handled below
+                continue
+            if src.text(body_start) == "{":
+                body = (body_start + 1, src.close(body_start))
+                next_i = body[1] + 1
+            else:
+                body = (body_start, src.statement_end(body_start, end))
+                next_i = body[1]
+            child = LoopNode(_js_loop_factor(src, i, (i + 2, header_end), body))
+            if child.factor == LOGARITHMIC:
+                stats["log_loops"] += 1
+            node.children.append(child)
+            _js_walk(src, i + 2, header_end, child, skip, stats, depth + 1)
+            _js_walk(src, body[0], body[1], child, skip, stats, depth + 1)
+            i = next_i
+            continue
+
+        if kind == "id" and text == "do" and src.text(i + 1) == "{":
+            body = (i + 2, src.close(i + 1))
+            cond = body[1] + 2  # "} while ("
+            cond_end = src.close(cond) if src.text(cond) == "(" else cond
+            child = LoopNode(_js_loop_factor(src, body[1] + 1, (cond + 1, cond_end), body))
+            node.children.append(child)
+            _js_walk(src, body[0], body[1], child, skip, stats, depth + 1)
+            i = cond_end + 1
+            continue
+
+        if kind == "id" and src.text(i - 1) == "." and src.text(i + 1) == "(":
+            if text in _JS_LINEAR_METHODS or text in _JS_SORT_METHODS:
+                child = LoopNode(LINEARITHMIC if text in _JS_SORT_METHODS else LINEAR)
+                if text in _JS_SORT_METHODS:
+                    stats["sorts"] += 1
+                node.children.append(child)
+                _js_walk(src, i + 2, src.close(i + 1), child, skip, stats, depth + 1)
+                i = src.close(i + 1) + 1
+                continue
+
+        if kind == "id" and text not in _JS_KEYWORDS and src.text(i + 1) == "(" and \
+                src.text(i - 1) not in (".", "function"):
+            args_end = src.close(i + 1)
+            node.calls.append((text, _js_halving_args(src, i + 2, args_end)))
+            i += 2
+            continue
+
+        i += 1
+
+
+def _summarize_js(src: _JsSource, name: str, start: int, end: int, skip: Dict[int, int]) -> FunctionSummary:
+    body = LoopNode()
+    stats = {"log_loops": 0, "sorts": 0}
+    _js_walk(src, start, end, body, skip, stats)
+    calls, _, _ = _self_calls(body, name)
+    memoized = calls > 0 and any(
+        src.kind(i) == "id" and _MEMO_NAMES.search(src.text(i)) for i in range(start, end)
+    )
+    penalty = 0.1 * min(2, stats["log_loops"]) + 0.05 * min(2, stats["sorts"])
+    if calls:
+        penalty += 0.15 + (0.1 if memoized else 0.0)
+    return FunctionSummary(name, "", body, memoized=memoized, penalty=penalty)
+
+
+def summarize_javascript(code: str, previous: Optional[Dict[str, FunctionSummary]] = None) -> Dict[str, FunctionSummary]:
+    """Per-function summaries of ``code``; unchanged functions found in
+    ``previous`` (matched by fingerprint) are reused as-is."""
+    src = _JsSource(code)
+    reusable = {s.fingerprint: s for s in (previous or {}).values()}
+    functions = _js_functions(src)
+
+    # Nested named functions are summarized separately, so their bodies are
+    # skipped when walking the enclosing code.
+    skip = {body_start: body_end for _, _, body_start, body_end in functions}
+
+    summaries: Dict[str, FunctionSummary] = {}
+    for name, params, body_start, body_end in functions:
+        fingerprint = _fingerprint(name + "\0" + " ".join(t for _, t in src.tokens[params:body_end]))
+        summary = reusable.get(fingerprint)
+        if summary is None:
+            inner_skip = {k: v for k, v in skip.items() if k != body_start}
+            summary = _summarize_js(src, name, body_start, body_end, inner_skip)
+            summary.fingerprint = fingerprint
+        summaries[name] = summary
+
+    module = _summarize_js(src, MODULE, 0, src.end, skip)
+    module.fingerprint = _fingerprint(MODULE)
+    if module.body.children or module.body.calls:
+        summaries[MODULE] = module
+    return summaries
+
+
+# ---------------------------------------------------------------------------
+# Python
+# ---------------------------------------------------------------------------
+
+_PY_LINEAR_CALLS = frozenset((
+    "sum", "min", "max", "list", "set", "dict", "tuple", "reversed", "any", "all", "enumerate",
+    "zip", "map", "filter", "index", "count", "join", "split", "copy", "extend", "insert",
+    "remove", "Counter", "deque", "str",
+))
+_PY_SORT_CALLS = frozenset(("sorted", "sort"))
+_PY_SCALING_OPS = (ast.Mult, ast.Div, ast.FloorDiv, ast.RShift, ast.LShift)
+
+
+def _py_names(node: ast.AST) -> set:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _py_scales(node: ast.AST) -> bool:
+    return any(isinstance(n, ast.BinOp) and isinstance(n.op, _PY_SCALING_OPS) for n in ast.walk(node))
+
+
+def _py_loop_factor(loop: ast.AST) -> Cost:
+    if isinstance(loop, ast.For):
+        return LINEAR
+    cond_vars = _py_names(loop.test)
+    scaled = set()
+    assigned_from: Dict[str, set] = {}
+    for stmt in ast.walk(loop):
+        if isinstance(stmt, ast.AugAssign) and isinstance(stmt.target, ast.Name) and \
+                isinstance(stmt.op, _PY_SCALING_OPS):
+            scaled.add(stmt.target.id)
+        elif isinstance(stmt, ast.Assign):
+            for target in stmt.targets:
+                if isinstance(target, ast.Name):
+                    if _py_scales(stmt.value) or (isinstance(stmt.value, ast.Attribute)
+                                                  and stmt.value.attr in ("left", "right")):
+                        scaled.add(target.id)
+                    assigned_from.setdefault(target.id, set()).update(_py_names(stmt.value))
+    if scaled & cond_vars:
+        return LOGARITHMIC
+    if any(assigned_from.get(var, set()) & scaled for var in cond_vars):
+        return LOGARITHMIC
+    return LINEAR
+
+
+def _py_halving_args(call: ast.Call) -> bool:
+    for arg in call.args:
+        for n in ast.walk(arg):
+            if isinstance(n, ast.BinOp) and isinstance(n.op, (ast.Div, ast.FloorDiv, ast.RShift)):
+                return True
+            if isinstance(n, ast.Slice):
+                return True
+            if isinstance(n, ast.Name) and n.id.lower().startswith("mid"):
+                return True
+    return False
+
+
+class _PyWalker(ast.NodeVisitor):
+    def __init__(self, root: LoopNode):
+        self.node = root
+        self.log_loops = 0
+        self.sorts = 0
+
+    def _nest(self, factor: Cost, children: Iterable[ast.AST]) -> None:
+        child = LoopNode(factor)
+        self.node.children.append(child)
+        parent, self.node = self.node, child
+        for item in children:
+            self.visit(item)
+        self.node = parent
+
+    def visit_FunctionDef(self, node):
+        pass  # summarized on its own
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self._nest(LINEAR, [node.target] + node.body + node.orelse)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        factor = _py_loop_factor(node)
+        if factor == LOGARITHMIC:
+            self.log_loops += 1
+        self._nest(factor, [node.test] + node.body + node.orelse)
+
+    def _comprehension(self, node):
+        self._nest(LINEAR, list(ast.iter_child_nodes(node)))
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _comprehension
+
+    def visit_Call(self, node):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name in _PY_SORT_CALLS:
+            self.sorts += 1
+            self._nest(LINEARITHMIC, list(ast.iter_child_nodes(node)))
+            return
+        if name in _PY_LINEAR_CALLS or (name == "pop" and node.args and
+                                        isinstance(node.args[0], ast.Constant) and node.args[0].value == 0):
+            self._nest(LINEAR, list(ast.iter_child_nodes(node)))
+            return
+        if isinstance(func, ast.Name) or (isinstance(func, ast.Attribute) and
+                                          isinstance(func.value, ast.Name) and func.value.id == "self"):
+            self.node.calls.append((name, _py_halving_args(node)))
+        self.generic_visit(node)
+
+
+def _summarize_py(name: str, statements: List[ast.AST], fingerprint: str, decorators=()) -> FunctionSummary:
+    body = LoopNode()
+    walker = _PyWalker(body)
+    for stmt in statements:
+        walker.visit(stmt)
+    memoized = any("cache" in ast.unparse(d) for d in decorators) or any(
+        _MEMO_NAMES.search(n) for stmt in statements for n in _py_names(stmt)
+    )
+    calls, _, _ = _self_calls(body, name)
+    penalty = 0.1 * min(2, walker.log_loops) + 0.05 * min(2, walker.sorts)
+    if calls:
+        penalty += 0.15 + (0.1 if memoized else 0.0)
+    return FunctionSummary(name, fingerprint, body, memoized=memoized and calls > 0, penalty=penalty)
+
+
+def summarize_python(code: str, previous: Optional[Dict[str, FunctionSummary]] = None) -> Dict[str, FunctionSummary]:
+    """Per-function summaries of Python ``code``; raises SyntaxError if it doesn't parse."""
+    tree = ast.parse(code)
+    reusable = {s.fingerprint: s for s in (previous or {}).values()}
+    summaries: Dict[str, FunctionSummary] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            fingerprint = _fingerprint(ast.dump(node))
+            summary = reusable.get(fingerprint)
+            if summary is None:
+                summary = _summarize_py(node.name, node.body, fingerprint, node.decorator_list)
+            summaries[node.name] = summary
+    module_statements = [n for n in tree.body if not isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+    module = _summarize_py(MODULE, module_statements, _fingerprint(MODULE))
+    if module.body.children or module.body.calls:
+        summaries[MODULE] = module
+    return summaries
+
+
+def summarize(code: str, language: str = "javascript",
+              previous: Optional[Dict[str, FunctionSummary]] = None) -> Dict[str, FunctionSummary]:
+    """Per-function summaries of ``code`` in ``language``."""
+    if language.lower() == "python":
+        return summarize_python(code, previous)
+    return summarize_javascript(code, previous)
+
+
+def combine(parts: Iterable[Dict[str, FunctionSummary]]) -> Dict[str, FunctionSummary]:
+    """Summaries of adjacent chunks of top-level code, taken as one program.
+
+    Later definitions of a name win, as they would at runtime, and the
+    module-level code of every chunk is concatenated.
+    """
+    combined: Dict[str, FunctionSummary] = {}
+    module: Optional[FunctionSummary] = None
+    for part in parts:
+        for name, summary in part.items():
+            if name != MODULE:
+                combined[name] = summary
+                continue
+            if module is None:
+                module = FunctionSummary(MODULE, _fingerprint(MODULE), LoopNode())
+            module.body.children.extend(summary.body.children)
+            module.body.calls.extend(summary.body.calls)
+            module.penalty = max(module.penalty, summary.penalty)
+    if module is not None:
+        combined[MODULE] = module
+    return combined
+
+
+def analyze(code: str, language: str = "javascript", previous: Optional[ComplexityEstimate] = None) -> ComplexityEstimate:
+    """Estimate the time complexity of ``code``.
+
+    Pass the previous estimate for the same editor buffer to skip
+    re-summarizing functions that haven't changed. Raises ValueError (or
+    SyntaxError for Python) when the code can't be analyzed.
+    """
+    if len(code) > MAX_SOURCE_CHARS:
+        raise ValueError("Code is too large to analyze structurally")
+    previous_functions = previous.functions if previous is not None else None
+    return estimate(summarize(code, language, previous_functions))
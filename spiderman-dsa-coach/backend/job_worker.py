@@ -0,0 +1,50 @@
+"""Runs queued /jobs submissions outside the API process.
+
+Point it at the same sqlite queue as the API (JOB_QUEUE_DB, read from the
+environment or backend/.env) and start as many as the host has cores for;
+each runs JOB_WORKERS jobs at once with its own Node and Python sandboxes.
+Setting JOB_WORKERS=0 on the API leaves all the running to these workers.
+Only the sandbox side is loaded (sandbox.py), so a worker needs no Gemini
+key and never builds the API app.
+
+Usage:
+  JOB_QUEUE_DB=/var/lib/dsa-coach/jobs.db python job_worker.py
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+
+import sandbox
+
+
+async def run_workers() -> None:
+    workers = sandbox.JOB_WORKERS or 1
+    host = socket.gethostname()
+    print(f"Running up to {workers} jobs at a time from {sandbox.JOB_QUEUE_DB}")
+    await asyncio.gather(*(sandbox.consume_jobs(f"{host}:{os.getpid()}:{i}") for i in range(workers)))
+
+
+def run() -> int:
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)s:     %(name)s: %(message)s")
+    if not sandbox.JOB_QUEUE_DB:
+        print("Set JOB_QUEUE_DB to the API's job queue file", file=sys.stderr)
+        return 2
+    sandbox.problem_registry.load()
+    sandbox.node_pool.start()
+    sandbox.python_runner.start()
+    try:
+        asyncio.run(run_workers())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sandbox.job_queue.close()
+        sandbox.sandbox_executor.shutdown(wait=False)
+        sandbox.node_pool.shutdown()
+        sandbox.python_runner.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,250 @@
+"""Queue of /run-code submissions for the /jobs API.
+
+A job holds a serialized RunCodeRequest and, once a worker has run it, the
+serialized RunCodeResponse. It moves queued -> running -> done (or failed).
+Two backends share one interface, and neither blocks: workers poll
+``claim``, clients poll ``get``.
+
+- ``MemoryJobQueue``: for a single API process, which also runs the jobs.
+- ``SqliteJobQueue``: a sqlite file shared by the API and any number of
+  ``job_worker.py`` processes on the same host. A claimed job carries a
+  lease that its worker ``renew``s while the job runs; if the worker dies,
+  the job is handed out again once the lease runs out, up to
+  ``max_attempts`` times.
+
+Finished jobs are forgotten ``ttl`` seconds after they finish. ``submit``
+raises ``QueueFull`` once ``max_queued`` jobs are waiting, so a burst
+beyond what the workers can absorb is turned away instead of piling up.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+class QueueFull(Exception):
+    """Too many jobs are already waiting."""
+
+
+class Job:
+    """One submission and its outcome. ``owner`` is the client that
+    submitted it; ``ahead`` is the number of jobs queued before it, while
+    it is queued."""
+
+    __slots__ = ("id", "status", "payload", "result", "error", "created_at", "started_at", "finished_at",
+                 "worker", "attempts", "owner", "ahead")
+
+    def __init__(self, id: str, status: str, payload: str, result: Optional[str] = None, error: Optional[str] = None,
+                 created_at: float = 0.0, started_at: Optional[float] = None, finished_at: Optional[float] = None,
+                 worker: Optional[str] = None, attempts: int = 0, owner: Optional[str] = None,
+                 ahead: Optional[int] = None):
+        self.id = id
+        self.status = status
+        self.payload = payload
+        self.result = result
+        self.error = error
+        self.created_at = created_at
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.worker = worker
+        self.attempts = attempts
+        self.owner = owner
+        self.ahead = ahead
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
+
+class MemoryJobQueue:
+    """Thread-safe in-process queue."""
+
+    def __init__(self, max_queued: int = 1000, ttl: float = 600.0):
+        self.max_queued = max(1, max_queued)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._queued: "deque[str]" = deque()
+        # id -> finish time, oldest first, for expiry
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+    def submit(self, payload: str, owner: Optional[str] = None) -> Job:
+        with self._lock:
+            self._expire()
+            if len(self._queued) >= self.max_queued:
+                raise QueueFull(f"{len(self._queued)} jobs are already waiting")
+            job = Job(_new_id(), QUEUED, payload, created_at=time.time(), owner=owner)
+            self._jobs[job.id] = job
+            self._queued.append(job.id)
+            return job
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """The oldest queued job, now running on ``worker``; None if there is none."""
+        with self._lock:
+            if not self._queued:
+                return None
+            job = self._jobs[self._queued.popleft()]
+            job.status, job.worker, job.started_at = RUNNING, worker, time.time()
+            job.attempts += 1
+            return job
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Whether ``worker`` still holds the job; there is no lease to extend."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job is not None and job.status == RUNNING and job.worker == worker
+
+    def complete(self, job_id: str, result: str) -> None:
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.status, job.result, job.error, job.finished_at = status, result, error, time.time()
+            self._finished[job_id] = job.finished_at
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            ahead = self._queued.index(job_id) if job.status == QUEUED else None
+            return Job(job.id, job.status, job.payload, job.result, job.error, job.created_at, job.started_at,
+                       job.finished_at, job.worker, job.attempts, job.owner, ahead)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > cutoff:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {"backend": "memory", **counts}
+
+    def close(self) -> None:
+        pass
+
+
+_COLUMNS = "id, status, payload, result, error, created_at, started_at, finished_at, worker, attempts, owner"
+
+
+class SqliteJobQueue:
+    """Queue in a sqlite file that several processes can share.
+
+    ``lease`` is how long a worker may hold a job before it is presumed
+    dead and the job is handed out again.
+    """
+
+    def __init__(self, path: str, max_queued: int = 1000, ttl: float = 600.0, lease: float = 120.0,
+                 max_attempts: int = 3):
+        self.path = path
+        self.max_queued = max(1, max_queued)
+        self.ttl = ttl
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        # Autocommit: every statement below is atomic on its own
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL,"
+            " result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, worker TEXT,"
+            " lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, owner TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+
+    def submit(self, payload: str, owner: Optional[str] = None) -> Job:
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*FINISHED, now - self.ttl))
+            (waiting,) = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+            if waiting >= self.max_queued:
+                raise QueueFull(f"{waiting} jobs are already waiting")
+            job = Job(_new_id(), QUEUED, payload, created_at=now, owner=owner)
+            self._db.execute("INSERT INTO jobs (id, status, payload, created_at, owner) VALUES (?, ?, ?, ?, ?)",
+                             (job.id, QUEUED, payload, now, owner))
+            return job
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            # Jobs whose workers keep dying on them are given up on
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL"
+                " WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "Worker lost", now, RUNNING, now, self.max_attempts),
+            )
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, lease_until = ?, attempts = attempts + 1"
+                " WHERE id = (SELECT id FROM jobs WHERE status = ?"
+                " OR (status = ? AND lease_until < ? AND attempts < ?) ORDER BY created_at LIMIT 1)"
+                f" RETURNING {_COLUMNS}",
+                (RUNNING, worker, now, now + self.lease, QUEUED, RUNNING, now, self.max_attempts),
+            ).fetchone()
+        return Job(*row) if row is not None else None
+
+    def renew(self, job_id: str, worker: str) -> bool:
+        """Extend the lease on a job ``worker`` is running. False once the job
+        is no longer its own: handed to another worker, or given up on."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND worker = ?",
+                (time.time() + self.lease, job_id, RUNNING, worker),
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, job_id: str, result: str) -> None:
+        self._finish(job_id, DONE, result, None)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, FAILED, None, error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL"
+                " WHERE id = ? AND status = ?",
+                (status, result, error, time.time(), job_id, RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = Job(*row)
+            if job.status == QUEUED:
+                (job.ahead,) = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job.created_at)
+                ).fetchone()
+            return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {"backend": "sqlite", **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
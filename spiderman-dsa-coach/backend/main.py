@@ -1,19 +1,56 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 import os
-import re
+import socket
 import ast
-import subprocess
-import tempfile
+import asyncio
+import hmac
 import json
-from typing import List, Dict, Any
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import aclosing
+from typing import List, Dict, Any, Literal, Optional
 from dotenv import load_dotenv
 from google import genai
 
+import admission
+import analyzer
+import complexity
+import metrics
+import sampler
+import suites
+import tts
+from admission import RateLimiter, SchedulerFull
+from breaker import CircuitBreaker, CircuitOpen
+from cache import LRUTTLCache, SingleFlight, content_key
+from comparators import Expected
+from jobs import QueueFull
+from node_pool import WorkerTimeout
+from problems import TestCaseSpec
+from sandbox import (
+    JOB_POLL_INTERVAL, JOB_WORKERS, JOBS, RUN_CODE_MAX_PARALLEL, SANDBOX_BATCH_RUNNERS, SANDBOX_EXECUTORS,
+    RunCodeRequest, RunCodeResponse, TestResult, _comparator_for, _function_name_candidates, _is_cacheable,
+    _run_cache_key, _usage, consume_jobs, get_test_cases_for_problem, job_queue, node_pool, problem_registry,
+    python_runner, run_cache, run_in_sandbox, run_submission, sandbox_executor, sandbox_scheduler,
+)
+from sessions import AnalysisSession, SessionConflict, SessionStore, apply_edits
+from suites import HiddenSuite, SuiteStore
+
 # Load environment variables
 load_dotenv()
 
+# Log records from every backend module at LOG_LEVEL and up go to stderr;
+# uvicorn keeps its own access and error logs. httpx would add a line for
+# every Gemini and ElevenLabs call, so it only reports warnings.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)s:     %(name)s: %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
 GEMINI_ENV_KEYS = ("GOOGLE_API_KEY", "GEMINI_API_KEY", "GENAI_API_KEY")
 api_key = next((os.getenv(key) for key in GEMINI_ENV_KEYS if os.getenv(key)), None)
 
@@ -28,99 +65,356 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latencies per route, for /metrics; requests slower
+# than SLOW_REQUEST_SECONDS are logged with their stage breakdown
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1"))
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+HTTP_LATENCY = metrics.REGISTRY.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending its last byte", ("method", "route")
+)
+HTTP_IN_FLIGHT = metrics.REGISTRY.gauge("http_requests_in_flight", "HTTP requests being handled")
+SLOW_REQUESTS = metrics.REGISTRY.counter(
+    "http_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS", ("method", "route")
+)
+COACHING_REPLIES = metrics.REGISTRY.counter(
+    "coaching_replies_total", "Coaching messages sent, by where they came from (gemini, cache or fallback)",
+    ("endpoint", "source")
+)
+CANCELLED_REQUESTS = metrics.REGISTRY.counter(
+    "cancelled_requests_total",
+    "Requests whose work was cancelled, by endpoint and reason (disconnect, superseded)", ("endpoint", "reason")
+)
+LIVE_SESSIONS = metrics.REGISTRY.gauge("live_sessions_open", "Open /ws/session connections")
+LIVE_UPDATES = metrics.REGISTRY.counter(
+    "live_session_updates_total",
+    "Code updates on /ws/session by outcome (analyzed, completed, superseded, rejected)", ("outcome",)
+)
+
+# Admin endpoints (/admin/...) are only served when ADMIN_TOKEN is set, to
+# callers sending it in X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Request profiling: a request is sampled when it sends the admin token in
+# X-Request-Profile (and is then always kept) or, at random, for the given
+# fraction of requests (kept only if slower than REQUEST_PROFILE_SLOW_SECONDS)
+REQUEST_PROFILE_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILE_SAMPLE_RATE", "0"))
+REQUEST_PROFILE_SLOW_SECONDS = float(os.getenv("REQUEST_PROFILE_SLOW_SECONDS", str(SLOW_REQUEST_SECONDS)))
+stack_sampler = sampler.StackSampler(interval=float(os.getenv("REQUEST_PROFILE_INTERVAL_MS", "5")) / 1000)
+request_profiles = sampler.ProfileStore(
+    directory=os.getenv("REQUEST_PROFILE_DIR") or sampler.DEFAULT_DIR,
+    max_profiles=int(os.getenv("REQUEST_PROFILE_MAX_COUNT", "50")),
+    max_bytes=int(os.getenv("REQUEST_PROFILE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+def _is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def _start_recording(request: Request) -> Optional[sampler.Recording]:
+    """Begin sampling ``request`` if it asked for it or was picked at random"""
+    if request.url.path.startswith("/admin/") or request.url.path == "/metrics":
+        return None
+    if _is_admin(request.headers.get("x-request-profile")):
+        return stack_sampler.begin(forced=True)
+    if REQUEST_PROFILE_SAMPLE_RATE > 0 and random.random() < REQUEST_PROFILE_SAMPLE_RATE:
+        return stack_sampler.begin()
+    return None
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time every request, and tag the slow ones.
+
+    Responses carry a Server-Timing header with the stages timed before
+    the headers went out, and X-Slow-Request when that already took longer
+    than SLOW_REQUEST_SECONDS. The latency histogram and the slow-request
+    log cover the whole response, streamed bodies included. A profiled
+    request is sampled until its body is sent; one that asked to be
+    profiled gets the id of its saved profile in X-Request-Profile-Id.
+    """
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    recording = _start_recording(request)
+    with metrics.track_stages() as stages, sampler.recording_as_current(recording):
+        try:
+            response = await call_next(request)
+        except Exception:
+            HTTP_IN_FLIGHT.dec()
+            _finish_request(request, 500, started, stages, recording)
+            raise
+
+    elapsed = time.perf_counter() - started
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    response.headers["Server-Timing"] = ", ".join(timings + [f"total;dur={elapsed * 1000:.1f}"])
+    if elapsed > SLOW_REQUEST_SECONDS:
+        response.headers["X-Slow-Request"] = "1"
+    if recording is not None and recording.forced:
+        response.headers["X-Request-Profile-Id"] = recording.id
+
+    body = response.body_iterator
+
+    async def finish_after_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _finish_request(request, response.status_code, started, stages, recording)
+
+    response.body_iterator = finish_after_body()
+    return response
+
+def _finish_request(request: Request, status: int, started: float, stages: Dict[str, float],
+                    recording: Optional[sampler.Recording] = None) -> None:
+    elapsed = time.perf_counter() - started
+    # The route template, not the raw path, so labels stay bounded
+    route = request.scope.get("route")
+    route = getattr(route, "path", "unmatched")
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status))
+    HTTP_LATENCY.observe(elapsed, method=request.method, route=route)
+    if elapsed > SLOW_REQUEST_SECONDS:
+        SLOW_REQUESTS.inc(method=request.method, route=route)
+        breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in stages.items()) or "no stages timed"
+        logger.warning("Slow request: %s %s -> %s in %.3fs (%s)", request.method, route, status, elapsed, breakdown)
+    if recording is not None:
+        stack_sampler.end(recording)
+        if recording.forced or elapsed > REQUEST_PROFILE_SLOW_SECONDS:
+            summary = {
+                "id": recording.id,
+                "method": request.method,
+                "route": route,
+                "status": status,
+                "duration": elapsed,
+                "started_at": recording.started_at,
+                "forced": recording.forced,
+                "samples": recording.ticks,
+                "node_profiles": len(recording.node_profiles),
+                "stages": dict(stages),
+            }
+            body = {
+                "python": {"interval_ms": stack_sampler.interval * 1000, "stacks": recording.stacks},
+                "node": recording.node_profiles,
+            }
+            # Written off the event loop; a failed write only loses the profile
+            asyncio.get_running_loop().run_in_executor(None, _save_profile, summary, body)
+
+def _save_profile(summary: Dict[str, Any], body: Dict[str, Any]) -> None:
+    try:
+        request_profiles.save(summary, body)
+    except OSError as e:
+        logger.warning("Could not save request profile %s: %s", summary["id"], e)
+
 # Initialize Gemini client
 if not api_key:
     raise ValueError("Missing Gemini/Google API key. Set GOOGLE_API_KEY or GEMINI_API_KEY in backend/.env")
 
 client = genai.Client(api_key=api_key)
 
+# The sandboxes, their scheduler, the run cache and the job queue live in
+# sandbox.py, which job_worker.py shares without loading the API.
+
+# Code-execution requests (/run-code, /run-code/hidden, POST /jobs) each
+# client may make per minute, and how many it may make at once after a pause
+run_rate_limiter = RateLimiter(
+    rate=float(os.getenv("RUN_RATE_PER_MINUTE", "30")) / 60,
+    burst=float(os.getenv("RUN_RATE_BURST", "10")),
+)
+
+# Longest a GET /jobs/{id}?wait= is held, and the tasks running queued jobs
+# in this process
+JOB_MAX_WAIT_SECONDS = 30.0
+job_consumers: List[asyncio.Task] = []
+
+# Hidden test suites (NDJSON, one file per problem, generated when missing)
+# and the most characters kept of one hidden case's result
+hidden_suites = SuiteStore(os.getenv("HIDDEN_SUITES_DIR") or suites.DEFAULT_DIR)
+HIDDEN_MAX_RESULT = int(os.getenv("HIDDEN_MAX_RESULT", str(4 * 1024 * 1024)))
+
+# Upper bound on in-flight Gemini calls per process
+gemini_semaphore = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+
+# Gemini calls time out after a multiple of their recent p95 latency (within
+# bounds); after repeated failures the circuit opens and coaching falls back
+# to the canned messages at once until a probe call succeeds
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+    min_timeout=float(os.getenv("GEMINI_TIMEOUT_MIN_SECONDS", "2")),
+    max_timeout=float(os.getenv("GEMINI_TIMEOUT_MAX_SECONDS", "15")),
+    timeout_factor=float(os.getenv("GEMINI_TIMEOUT_P95_FACTOR", "1.5")),
+)
+
+# Recent Gemini coaching replies keyed on the prompt, plus coalescing of
+# identical prompts that are in flight at the same time
+coach_cache = LRUTTLCache(
+    max_entries=int(os.getenv("COACH_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.getenv("COACH_CACHE_MAX_BYTES", str(2 * 1024 * 1024))),
+    ttl=float(os.getenv("COACH_CACHE_TTL", "300")),
+)
+coach_flight = SingleFlight()
+
+# Editor buffers that /analyze has seen, so later calls can send just the edits
+analyze_sessions = SessionStore(
+    max_sessions=int(os.getenv("ANALYZE_MAX_SESSIONS", "1000")),
+    max_bytes=int(os.getenv("ANALYZE_SESSIONS_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("ANALYZE_SESSION_TTL", "1800")),
+)
+
+# Spider-Man's voice: ElevenLabs audio streamed through /tts, and every clip
+# kept on disk by (text, voice) since the same line always sounds the same
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
+TTS_VOICE_ID = os.getenv("TTS_VOICE_ID") or tts.DEFAULT_VOICE_ID
+TTS_MAX_CHARS = int(os.getenv("TTS_MAX_CHARS", "1000"))
+elevenlabs = tts.ElevenLabs(
+    ELEVENLABS_API_KEY,
+    api_url=os.getenv("ELEVENLABS_API_URL") or "https://api.elevenlabs.io",
+    timeout=float(os.getenv("TTS_TIMEOUT_SECONDS", "30")),
+)
+tts_cache = tts.AudioCache(
+    directory=os.getenv("TTS_CACHE_DIR") or tts.DEFAULT_DIR,
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+tts_warmup: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def start_node_pool():
+    problem_registry.load()
+    node_pool.start()
+    python_runner.start()
+    host = socket.gethostname()
+    for i in range(JOB_WORKERS):
+        job_consumers.append(asyncio.create_task(consume_jobs(f"{host}:{os.getpid()}:{i}")))
+    if ELEVENLABS_API_KEY:
+        tts_warmup.append(asyncio.create_task(precompute_fallback_audio()))
+
+@app.on_event("shutdown")
+async def stop_node_pool():
+    for consumer in job_consumers:
+        consumer.cancel()
+    job_queue.close()
+    sandbox_executor.shutdown(wait=False)
+    node_pool.shutdown()
+    python_runner.shutdown()
+    hidden_suites.close()
+    for task in tts_warmup:
+        task.cancel()
+    await elevenlabs.close()
+
 # Pydantic models
+class TextEdit(BaseModel):
+    # Offsets count code points, not UTF-16 units
+    start: int
+    end: int
+    text: str = ""
+
 class AnalyzeRequest(BaseModel):
-    code: str
+    code: Optional[str] = None
     problem_id: str
+    language: str = "javascript"
+    # With a session id, send the full code once, then only the edits made
+    # since base_version
+    session_id: Optional[str] = None
+    base_version: Optional[int] = None
+    edits: Optional[List[TextEdit]] = None
 
 class AnalyzeResponse(BaseModel):
     complexity_hint: str
     structures: List[str]
+    complexity_confidence: Optional[float] = None
+    version: Optional[int] = None
 
 class CoachRequest(BaseModel):
     code: str
     analysis: Dict[str, Any]
+    # A newer request with the same session id cancels this one
+    session_id: Optional[str] = None
 
 class CoachResponse(BaseModel):
     message: str
 
-class TestCase(BaseModel):
-    input: str
-    expected: str
-    description: str
-
-class RunCodeRequest(BaseModel):
+class HiddenRunRequest(BaseModel):
     code: str
     language: str
     problem_id: str
-    test_cases: List[TestCase]
+    # fail_fast stops at the first failing case and answers with a summary;
+    # full runs every case and streams each result as it finishes
+    mode: Literal["fail_fast", "full"] = "fail_fast"
+    session_id: Optional[str] = None
 
-class TestResult(BaseModel):
-    test_case: int
-    input: str
-    expected: str
-    actual: str
+class HiddenCaseResult(BaseModel):
+    # Inputs and outputs of hidden cases are never sent back
+    case: int
     passed: bool
-    error: str = None
+    error: Optional[str] = None
+    execution_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    peak_rss_kb: Optional[int] = None
+
+class HiddenSuiteResult(BaseModel):
+    problem_id: str
+    total: int
+    run: int = 0
+    passed: int = 0
+    failed: int = 0
+    overall_passed: bool = False
+    stopped_early: bool = False
+    # Set when the code could not be loaded or the sandbox failed
+    error: Optional[str] = None
+    first_failure: Optional[HiddenCaseResult] = None
+    execution_time: float = 0.0
+
+class LiveUpdate(BaseModel):
+    """One message from a /ws/session client: the full code, or the edits
+    made since ``base_version``, and what to do with it besides analyzing"""
+    problem_id: str
+    language: str = "javascript"
+    code: Optional[str] = None
+    base_version: Optional[int] = None
+    edits: Optional[List[TextEdit]] = None
+    coach: bool = False
+    run: bool = False
+
+class TTSRequest(BaseModel):
+    text: str
+    voice_id: Optional[str] = None
 
-class RunCodeResponse(BaseModel):
-    results: List[TestResult]
-    overall_passed: bool
-    execution_time: float
+class JobSubmitted(BaseModel):
+    id: str
+    status: str
+
+class JobStatus(BaseModel):
+    id: str
+    status: Literal["queued", "running", "done", "failed"]
+    # Jobs queued before this one, while it waits
+    ahead: Optional[int] = None
+    result: Optional[RunCodeResponse] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 # Code analysis functions
 def detect_data_structures(code: str) -> List[str]:
     """Detect data structures and algorithms used in the code"""
-    structures = []
-    
-    # Convert to lowercase for case-insensitive matching
-    code_lower = code.lower()
-    
-    # Data structures
-    if re.search(r'\barray\b|\b\[\]|\bpush\b|\bpop\b|\bshift\b|\bunshift\b', code_lower):
-        structures.append("array")
-    
-    if re.search(r'\bmap\b|\bobject\b|\bdict\b|\bhash\b|\b{}\b', code_lower):
-        structures.append("hashmap")
-    
-    if re.search(r'\bstack\b|\bpush\b.*\bpop\b', code_lower):
-        structures.append("stack")
-    
-    if re.search(r'\bqueue\b|\benqueue\b|\bdequeue\b', code_lower):
-        structures.append("queue")
-    
-    if re.search(r'\btree\b|\bnode\b.*\bleft\b.*\bright\b', code_lower):
-        structures.append("tree")
-    
-    if re.search(r'\bgraph\b|\badjacency\b', code_lower):
-        structures.append("graph")
-    
-    # Algorithms
-    if re.search(r'\brecursion\b|\brecursive\b', code_lower):
-        structures.append("recursion")
-    
-    # Loops
-    if re.search(r'\bfor\s*\(.*\)|\bwhile\s*\(.*\)', code_lower):
-        structures.append("loop")
-    
-    # Nested loops
-    nested_loop_pattern = r'for\s*\([^)]*\)\s*{[^}]*for\s*\([^)]*\)'
-    if re.search(nested_loop_pattern, code_lower, re.DOTALL):
-        structures.append("nested_loop")
-    
-    # Sorting
-    if re.search(r'\bsort\b|\bquicksort\b|\bmergesort\b|\bheapsort\b', code_lower):
-        structures.append("sorting")
-    
-    return structures
+    return analyzer.detect_structures(code)
+
+def estimate_complexity(code: str, structures: List[str], language: str = "javascript") -> str:
+    """Estimate time complexity from the structure of the code"""
+    return _complexity_estimate(code, structures, language).bound
+
+def _complexity_estimate(code: str, structures: List[str], language: str) -> complexity.ComplexityEstimate:
+    try:
+        return complexity.analyze(code, language)
+    except (SyntaxError, ValueError, RecursionError):
+        # Code that doesn't parse yet (mid-edit Python) falls back to the flags
+        return _fallback_estimate(structures)
+
+def _fallback_estimate(structures: List[str]) -> complexity.ComplexityEstimate:
+    bound = _complexity_from_structures(structures)
+    return complexity.ComplexityEstimate(bound, complexity.CONSTANT, 0.4, {})
 
-def estimate_complexity(code: str, structures: List[str]) -> str:
+def _complexity_from_structures(structures: List[str]) -> str:
     """Estimate time complexity based on detected structures"""
     if "nested_loop" in structures:
         return "O(n²)"
@@ -135,191 +429,132 @@ def estimate_complexity(code: str, structures: List[str]) -> str:
     else:
         return "O(1)"
 
-# Code execution functions
-def get_test_cases_for_problem(problem_id: str) -> List[TestCase]:
-    """Get test cases for a specific problem"""
-    test_cases_map = {
-        "two-sum": [
-            TestCase(input="[2, 7, 11, 15], 9", expected="[0,1]", description="Basic two sum"),
-            TestCase(input="[3, 2, 4], 6", expected="[1,2]", description="Different indices"),
-            TestCase(input="[3, 3], 6", expected="[0,1]", description="Same values"),
-        ],
-        "reverse-string": [
-            TestCase(input='"hello"', expected='"olleh"', description="Basic reverse"),
-            TestCase(input='"world"', expected='"dlrow"', description="Another string"),
-        ],
-        "valid-parentheses": [
-            TestCase(input='"()"', expected="true", description="Simple parentheses"),
-            TestCase(input='"(())"', expected="true", description="Nested parentheses"),
-            TestCase(input='"([)]"', expected="false", description="Invalid nesting"),
-        ],
-        "merge-sorted-arrays": [
-            TestCase(input='[1, 2, 3], [2, 5, 6]', expected='[1,2,2,3,5,6]', description="Merge basic arrays"),
-            TestCase(input='[], [1]', expected='[1]', description="One array empty"),
-        ],
-        "max-subarray": [
-            TestCase(input='[-2, 1, -3, 4, -1, 2, 1, -5, 4]', expected='6', description="Classic example"),
-            TestCase(input='[1]', expected='1', description="Single element"),
-        ],
-        "climbing-stairs": [
-            TestCase(input='3', expected='3', description="Three steps"),
-            TestCase(input='5', expected='8', description="Five steps"),
-        ],
-        "best-time-stock": [
-            TestCase(input='[7, 1, 5, 3, 6, 4]', expected='5', description="Profit available"),
-            TestCase(input='[7, 6, 4, 3, 1]', expected='0', description="No profit"),
-        ],
-        "single-number": [
-            TestCase(input='[4, 1, 2, 1, 2]', expected='4', description="Lonely number"),
-            TestCase(input='[2, 2, 1]', expected='1', description="Single at end"),
-        ],
-        "majority-element": [
-            TestCase(input='[3, 2, 3]', expected='3', description="Simple majority"),
-            TestCase(input='[2, 2, 1, 1, 1, 2, 2]', expected='2', description="Mixed values"),
-        ],
-        "happy-number": [
-            TestCase(input='19', expected='true', description="Happy number"),
-            TestCase(input='2', expected='false', description="Not a happy number"),
-        ],
-    }
-    return test_cases_map.get(problem_id, [
-        TestCase(input="[1, 2, 3]", expected="[0, 1]", description="Sample test case")
-    ])
-
-def _function_name_candidates(problem_id: str) -> List[str]:
-    tokens = re.split(r'[-_\s]+', problem_id)
-    tokens = [token for token in tokens if token]
-    if not tokens:
-        return [problem_id]
-
-    sanitized = ''.join(tokens)
-    camel = tokens[0].lower() + ''.join(token.capitalize() for token in tokens[1:])
-    pascal = ''.join(token.capitalize() for token in tokens)
-    snake = '_'.join(tokens)
-
-    candidates = [
-        sanitized,
-        camel,
-        pascal,
-        snake,
-        problem_id.replace('-', ''),
-        problem_id,
-    ]
-
-    # Preserve order but remove duplicates
-    seen = set()
-    unique_candidates = []
-    for name in candidates:
-        if name and name not in seen:
-            seen.add(name)
-            unique_candidates.append(name)
-    return unique_candidates
-
-
-def execute_javascript_code(code: str, test_case: TestCase, problem_id: str) -> TestResult:
-    """Execute JavaScript code with a test case"""
+def run_hidden_suite(run_batches, code: str, problem_id: str, suite: HiddenSuite, fail_fast: bool,
+                     emit=None, stop: Optional[threading.Event] = None) -> HiddenSuiteResult:
+    """Stream a hidden suite through the sandbox a batch at a time.
+
+    Only the batch in flight is held in memory: its inputs are read from the
+    suite file as the sandbox asks for them, and each case's output is
+    compared and dropped as soon as its batch comes back. ``emit`` is called
+    with every HiddenCaseResult; setting ``stop`` ends the run after the
+    current batch.
+    """
+    started = time.perf_counter()
+    result = HiddenSuiteResult(problem_id=problem_id, total=len(suite))
+    comparator = _comparator_for(problem_id)
+    in_flight = []
+
+    def batches():
+        # Smaller batches when failing fast, so less runs past a failure
+        for batch in suite.batches(max_cases=16 if fail_fast else 64):
+            if stop is not None and stop.is_set():
+                return
+            in_flight[:] = batch
+            yield [test_input for _, test_input, _, _ in batch]
+
+    # Exact comparisons only need the digest of a large output
+    max_output = HIDDEN_MAX_RESULT if comparator.needs_value else None
+    replies = run_batches(code, _function_name_candidates(problem_id), batches(), max_output)
     try:
-        function_candidates = _function_name_candidates(problem_id)
-        function_candidates_literal = json.dumps(function_candidates)
-
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
-            # Wrap the code in a test function
-            test_code = f"""
-{code}
-
-// Test execution
-try {{
-    const functionCandidates = {function_candidates_literal};
-    let fn = null;
-    for (const name of functionCandidates) {{
-        if (!name) continue;
-        try {{
-            const candidate = eval(name);
-            if (typeof candidate === 'function') {{
-                fn = candidate;
-                break;
-            }}
-        }} catch (err) {{
-            // Ignore invalid identifiers
-        }}
-    }}
-
-    if (typeof fn !== 'function') {{
-        throw new Error('Function not found. Expected one of: ' + functionCandidates.join(', '));
-    }}
-
-    let args;
-    try {{
-        args = eval('[{test_case.input}]');
-    }} catch (parseError) {{
-        throw new Error('Failed to parse inputs: ' + parseError.message);
-    }}
-
-    const result = fn(...(Array.isArray(args) ? args : [args]));
-    if (typeof result === 'undefined') {{
-        console.log('');
-    }} else {{
-        console.log(JSON.stringify(result));
-    }}
-}} catch (error) {{
-    console.error("Error:", error.message);
-    process.exit(1);
-}}
-"""
-            f.write(test_code)
-            temp_file = f.name
-        
-        # Execute the code
-        result = subprocess.run(['node', temp_file], 
-                              capture_output=True, text=True, timeout=5)
-        
-        # Clean up
-        os.unlink(temp_file)
-        
-        if result.returncode == 0:
-            actual_output = result.stdout.strip()
-            expected_output = test_case.expected.strip()
-
-            actual_clean = actual_output.replace(' ', '').replace('\n', '')
-            expected_clean = expected_output.replace(' ', '').replace('\n', '')
-            passed = actual_clean == expected_clean
-
-            return TestResult(
-                test_case=1,
-                input=test_case.input,
-                expected=test_case.expected,
-                actual=actual_output,
-                passed=passed
-            )
-        else:
-            error_message = result.stderr.strip() or 'Execution failed'
-            return TestResult(
-                test_case=1,
-                input=test_case.input,
-                expected=test_case.expected,
-                actual="",
-                passed=False,
-                error=error_message
-            )
-    except subprocess.TimeoutExpired:
-        return TestResult(
-            test_case=1,
-            input=test_case.input,
-            expected=test_case.expected,
-            actual="",
-            passed=False,
-            error="Execution timeout"
-        )
+        for reply in replies:
+            if not reply.get("ok"):
+                result.error = reply.get("error") or "Execution failed"
+                break
+            for (index, test_input, expected, expected_digest), outcome in zip(in_flight, reply["results"]):
+                if outcome.get("ok"):
+                    passed = comparator.matches(outcome.get("output", ""), Expected(expected, expected_digest),
+                                                outcome.get("output_digest"), test_input)
+                    error = None if passed else "Wrong answer"
+                else:
+                    passed, error = False, outcome.get("error") or "Execution failed"
+                case = HiddenCaseResult(case=index + 1, passed=passed, error=error, **_usage(outcome))
+                result.run += 1
+                if passed:
+                    result.passed += 1
+                else:
+                    result.failed += 1
+                    result.first_failure = result.first_failure or case
+                if emit is not None:
+                    emit(case)
+                if fail_fast and not passed:
+                    break
+            if fail_fast and result.failed:
+                break
+    except WorkerTimeout:
+        result.error = "Execution timeout"
     except Exception as e:
-        return TestResult(
-            test_case=1,
-            input=test_case.input,
-            expected=test_case.expected,
-            actual="",
-            passed=False,
-            error=str(e)
-        )
+        result.error = str(e)
+    finally:
+        replies.close()
+
+    result.stopped_early = result.run < result.total
+    result.overall_passed = result.error is None and result.failed == 0 and not result.stopped_early
+    result.execution_time = time.perf_counter() - started
+    return result
+
+async def limit_code_runs(request: Request) -> str:
+    """Turn the client away with 429 if it is over its rate limit, else
+    charge the request's sandbox runs to it. Returns the client key."""
+    client = admission.client_key(request.headers.get("authorization"), request.client.host if request.client else None)
+    wait = run_rate_limiter.acquire(client)
+    if wait > 0:
+        admission.SHED.inc(reason="rate_limit")
+        raise HTTPException(status_code=429, detail="Too many code runs, slow down",
+                            headers={"Retry-After": str(math.ceil(wait))})
+    # Set for the rest of this request's task, which the endpoint runs in
+    admission.set_client(client)
+    return client
+
+async def admit_code_run(client: str = Depends(limit_code_runs)) -> str:
+    """Also shed the request up front if its runs could not be queued"""
+    sandbox_scheduler.check(client)
+    return client
+
+@app.exception_handler(SchedulerFull)
+async def shed_sandbox_run(request: Request, exc: SchedulerFull):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Sandboxes are busy: {exc}"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+# (endpoint, session id) -> the task handling that session's latest request
+_latest_requests: Dict[tuple, asyncio.Task] = {}
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has been read, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def run_cancellable(request: Request, endpoint: str, session_id: Optional[str], work):
+    """Await ``work`` as a task of its own, cancelled if the client goes away
+    or a newer request for the same endpoint and session arrives (which
+    gets this one a 409). Sandbox runs it started are killed with it."""
+    task = asyncio.ensure_future(work)
+    key = (endpoint, session_id)
+    if session_id is not None:
+        previous = _latest_requests.get(key)
+        if previous is not None and not previous.done():
+            CANCELLED_REQUESTS.inc(endpoint=endpoint, reason="superseded")
+            previous.cancel()
+        _latest_requests[key] = task
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait((task, disconnected), return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            CANCELLED_REQUESTS.inc(endpoint=endpoint, reason="disconnect")
+            task.cancel()
+            # Nobody is left to read this
+            raise HTTPException(status_code=499, detail="Client closed the request")
+        if task.cancelled():
+            raise HTTPException(status_code=409, detail="Superseded by a newer request")
+        return task.result()
+    finally:
+        disconnected.cancel()
+        if not task.done():
+            task.cancel()
+        if _latest_requests.get(key) is task:
+            del _latest_requests[key]
 
 # Spider-Man coaching system prompt
 SPIDERMAN_SYSTEM_PROMPT = """You are Spider-Man (Peter Parker), acting as a witty and encouraging coding mentor for data structures and algorithms.
@@ -354,6 +589,30 @@ Example responses:
 
 Always be encouraging and help them learn through guided discovery, not direct answers."""
 
+DEFAULT_COACHING_MESSAGE = " Great work, hero! Keep coding and you'll master this!"
+
+async def _generate_coaching(prompt: str) -> str:
+    """Ask Gemini for a coaching message; raises if the upstream call fails,
+    times out, or the circuit is open"""
+    async with gemini_semaphore:
+        with metrics.stage("gemini"):
+            response = await gemini_breaker.call(lambda: client.aio.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=prompt
+            ))
+    
+    # Handle Gemini response format - use the new API
+    coaching_message = ""
+    
+    try:
+        # With the new google-genai SDK, we can directly access response.text
+        coaching_message = response.text.strip()
+    except Exception as text_error:
+        logger.warning("Error accessing response text: %s", text_error)
+    
+    # Fallback if we still don't have a message
+    return coaching_message or DEFAULT_COACHING_MESSAGE
+
 @app.get("/")
 async def root():
     return {"message": " Spider-Man DSA Coach API is running! With great power comes great responsibility!"}
@@ -361,131 +620,651 @@ async def root():
 @app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_code(request: AnalyzeRequest):
     """Analyze code to detect data structures and estimate complexity"""
+    if request.code is None and (request.session_id is None or request.edits is None):
+        raise HTTPException(status_code=422, detail="Send either the code or a session id with edits")
+    version = None
     try:
-        structures = detect_data_structures(request.code)
-        complexity = estimate_complexity(request.code, structures)
+        with metrics.stage("analysis"):
+            if request.session_id is None:
+                structures = detect_data_structures(request.code)
+                estimate = _complexity_estimate(request.code, structures, request.language)
+            else:
+                session, source = _session_source(request)
+                structures, estimate = session.update(source)
+                estimate = estimate or _fallback_estimate(structures)
+                version = session.version
+                analyze_sessions.evict()
+        if estimate.recursive and "recursion" not in structures:
+            structures.append("recursion")
         
         return AnalyzeResponse(
-            complexity_hint=complexity,
-            structures=structures
+            complexity_hint=estimate.bound,
+            structures=structures,
+            complexity_confidence=estimate.confidence,
+            version=version
         )
+    except SessionConflict as e:
+        # The client resyncs by sending the full code again
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing code: {str(e)}")
 
-@app.post("/coach", response_model=CoachResponse)
-async def get_spiderman_coaching(request: CoachRequest):
-    """Get Spider-Man's coaching feedback based on code analysis"""
-    try:
-        # Prepare the context for Spider-Man
-        structures_text = ", ".join(request.analysis.get("structures", [])) if request.analysis.get("structures") else "basic programming constructs"
-        complexity = request.analysis.get("complexity_hint", "unknown")
-        
-        user_message = f"""A student wrote this code: {request.code[:200]}
+def _session_source(request: AnalyzeRequest):
+    """The session for an /analyze call and its new source"""
+    if request.code is not None:
+        return analyze_sessions.open(request.session_id, request.language), request.code
+    session = analyze_sessions.get(request.session_id)
+    if session is None:
+        raise SessionConflict("Unknown or expired session")
+    if session.language != request.language:
+        raise SessionConflict("Session was opened for another language")
+    if request.base_version != session.version:
+        raise SessionConflict(f"Session is at version {session.version}, not {request.base_version}")
+    return session, apply_edits(session.source, [(e.start, e.end, e.text) for e in request.edits])
+
+def _coaching_prompt(request: CoachRequest) -> str:
+    """Build the Gemini prompt for a coaching request"""
+    # Prepare the context for Spider-Man
+    structures_text = ", ".join(request.analysis.get("structures", [])) if request.analysis.get("structures") else "basic programming constructs"
+    complexity = request.analysis.get("complexity_hint", "unknown")
+    
+    user_message = f"""A student wrote this code: {request.code[:200]}
 
 Detected: {structures_text}
 Complexity: {complexity}
 
 Give Spider-Man coaching in 2 sentences. Start with """
 
-        print("About to call Gemini API...")  # Debug logging
-        
-        # Create a simpler prompt for Gemini
-        simple_prompt = f"""You are Spider-Man giving coding advice. Be friendly and use superhero references. {user_message}"""
-        
-        print(f"Prompt: {simple_prompt[:100]}...")  # Debug logging
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=simple_prompt
-        )
-        
-        # Handle Gemini response format - use the new API
-        coaching_message = ""
-        
-        try:
-            # With the new google-genai SDK, we can directly access response.text
-            coaching_message = response.text.strip()
-            print(f"Extracted text length: {len(coaching_message)}")  # Debug
-        except Exception as text_error:
-            print(f"Error accessing response text: {text_error}")
-            coaching_message = " Great work, hero! Keep coding and you'll master this!"
-        
-        # Fallback if we still don't have a message
-        if not coaching_message:
-            coaching_message = " Great work, hero! Keep coding and you'll master this!"
+    # Create a simpler prompt for Gemini
+    return f"""You are Spider-Man giving coding advice. Be friendly and use superhero references. {user_message}"""
+
+# Canned coaching used when Gemini is unavailable, keyed on the pattern it answers
+FALLBACK_MESSAGES = {
+    "nested_loop": " That nested loop looks stickier than my web! What happens if you had 10,000 villains instead of 10? Can you think of a faster way to catch them?",
+    "loop_hashmap": " Great use of a hashmap, hero! But remember, with great power comes great responsibility - are you sure you need all that extra space?",
+    "loop": " Nice loop work! But what if your array was as big as New York City? How would you make it more efficient?",
+    "recursion": " Recursion, huh? That's like calling yourself for backup! But what if you're dealing with a really deep problem? Any ideas to prevent stack overflow?",
+    "quadratic": " O(n²)? That's slower than the Green Goblin's escape plan! Can you think of a way to catch those villains faster?",
+    "array": " Good start with arrays, hero! But what if you needed to find something quickly? What data structure would be better for that?",
+    "default": " Keep coding, hero! Every great superhero started somewhere. What's your next move to solve this problem?",
+}
+
+def fallback_coaching_message(analysis: Dict[str, Any]) -> str:
+    """Pick a canned Spider-Man response based on the detected patterns"""
+    structures = analysis.get("structures", [])
+    complexity = analysis.get("complexity_hint", "unknown")
+    
+    if "nested_loop" in structures:
+        return FALLBACK_MESSAGES["nested_loop"]
+    elif "loop" in structures and "hashmap" in structures:
+        return FALLBACK_MESSAGES["loop_hashmap"]
+    elif "loop" in structures:
+        return FALLBACK_MESSAGES["loop"]
+    elif "recursion" in structures:
+        return FALLBACK_MESSAGES["recursion"]
+    elif complexity == "O(n²)":
+        return FALLBACK_MESSAGES["quadratic"]
+    elif "array" in structures:
+        return FALLBACK_MESSAGES["array"]
+    else:
+        return FALLBACK_MESSAGES["default"]
+
+@app.post("/coach", response_model=CoachResponse)
+async def get_spiderman_coaching(request: CoachRequest, http_request: Request):
+    """Get Spider-Man's coaching feedback based on code analysis"""
+    return await run_cancellable(http_request, "coach", request.session_id, _coaching_reply(request))
+
+async def _coaching_reply(request: CoachRequest) -> CoachResponse:
+    try:
+        simple_prompt = _coaching_prompt(request)
+        cache_key = content_key(simple_prompt)
+        coaching_message = coach_cache.get(cache_key)
+        source = "cache"
+        if coaching_message is None:
+            coaching_message = await coach_flight.do(cache_key, lambda: _generate_coaching(simple_prompt))
+            source = "gemini"
+            if coaching_message != DEFAULT_COACHING_MESSAGE:
+                coach_cache.set(cache_key, coaching_message)
         
+        COACHING_REPLIES.inc(endpoint="coach", source=source)
         return CoachResponse(message=coaching_message)
+
+    except (CircuitOpen, asyncio.TimeoutError) as e:
+        # Expected while Gemini is down or slow; no traceback
+        logger.warning("Gemini unavailable, using fallback: %s: %s", type(e).__name__, e)
+        COACHING_REPLIES.inc(endpoint="coach", source="fallback")
+        return CoachResponse(message=fallback_coaching_message(request.analysis))
         
     except Exception as e:
-        print(f"Gemini API Error: {str(e)}")  # Debug logging
-        import traceback
-        traceback.print_exc()
+        logger.exception("Gemini API Error: %s: %s", type(e).__name__, e)
         
         # Fallback responses based on code analysis
-        structures = request.analysis.get("structures", [])
-        complexity = request.analysis.get("complexity_hint", "unknown")
-        
-        # Generate Spider-Man responses based on detected patterns
-        if "nested_loop" in structures:
-            fallback_message = " That nested loop looks stickier than my web! What happens if you had 10,000 villains instead of 10? Can you think of a faster way to catch them?"
-        elif "loop" in structures and "hashmap" in structures:
-            fallback_message = " Great use of a hashmap, hero! But remember, with great power comes great responsibility - are you sure you need all that extra space?"
-        elif "loop" in structures:
-            fallback_message = " Nice loop work! But what if your array was as big as New York City? How would you make it more efficient?"
-        elif "recursion" in structures:
-            fallback_message = " Recursion, huh? That's like calling yourself for backup! But what if you're dealing with a really deep problem? Any ideas to prevent stack overflow?"
-        elif complexity == "O(n²)":
-            fallback_message = " O(n²)? That's slower than the Green Goblin's escape plan! Can you think of a way to catch those villains faster?"
-        elif "array" in structures:
-            fallback_message = " Good start with arrays, hero! But what if you needed to find something quickly? What data structure would be better for that?"
-        else:
-            fallback_message = " Keep coding, hero! Every great superhero started somewhere. What's your next move to solve this problem?"
-        
-        return CoachResponse(message=fallback_message)
+        COACHING_REPLIES.inc(endpoint="coach", source="fallback")
+        return CoachResponse(message=fallback_coaching_message(request.analysis))
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _coaching_events(request: CoachRequest):
+    """Server-Sent Events for /coach/stream"""
+    async with aclosing(_coaching_updates(request, "coach_stream")) as updates:
+        async for event, data in updates:
+            yield _sse(event, data)
+
+async def _coaching_updates(request: CoachRequest, endpoint: str):
+    """Coaching for a streamed reply, as (event, data) pairs.
+
+    ``token`` events come as Gemini produces text, then a single ``done``
+    event carrying the full message. If the upstream call fails, possibly
+    after some tokens were already sent, a ``fallback`` event replaces them
+    with the canned response before ``done``.
+    """
+    prompt = _coaching_prompt(request)
+    cache_key = content_key(prompt)
+
+    cached = coach_cache.get(cache_key)
+    if cached is not None:
+        COACHING_REPLIES.inc(endpoint=endpoint, source="cache")
+        yield "token", {"text": cached}
+        yield "done", {"message": cached, "cached": True}
+        return
+
+    parts: List[str] = []
+    requested = time.perf_counter()
+    try:
+        async with gemini_semaphore:
+            # Time to first token and to the end of the stream; the time
+            # spent handing tokens to the client is included in the latter
+            # Closed explicitly so a client going away frees the breaker's probe at once
+            with metrics.stage("gemini"):
+                async with aclosing(gemini_breaker.stream(lambda: client.aio.models.generate_content_stream(
+                    model="gemini-2.5-flash",
+                    contents=prompt
+                ))) as stream:
+                    async for chunk in stream:
+                        text = chunk.text
+                        if text:
+                            if not parts:
+                                metrics.observe_stage("gemini_first_token", time.perf_counter() - requested)
+                            parts.append(text)
+                            yield "token", {"text": text}
+    except Exception as e:
+        logger.warning("Gemini streaming error: %s: %s", type(e).__name__, e)
+        COACHING_REPLIES.inc(endpoint=endpoint, source="fallback")
+        message = fallback_coaching_message(request.analysis)
+        yield "fallback", {"message": message}
+        yield "done", {"message": message, "fallback": True}
+        return
+
+    COACHING_REPLIES.inc(endpoint=endpoint, source="gemini")
+    message = "".join(parts).strip()
+    if message:
+        coach_cache.set(cache_key, message)
+    else:
+        message = DEFAULT_COACHING_MESSAGE
+        yield "token", {"text": message}
+    yield "done", {"message": message}
+
+@app.post("/coach/stream")
+async def stream_spiderman_coaching(request: CoachRequest):
+    """Stream Spider-Man's coaching feedback token by token over SSE"""
+    return StreamingResponse(
+        _coaching_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _hidden_suite_events(run_batches, request: HiddenRunRequest, suite: HiddenSuite):
+    """Server-Sent Events for /run-code/hidden in full mode: one ``case``
+    event per finished case, then ``done`` with the summary. A client that
+    disconnects stops the run after the batch in flight."""
+    loop = asyncio.get_running_loop()
+    cases: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def emit(case: HiddenCaseResult):
+        loop.call_soon_threadsafe(cases.put_nowait, case)
+
+    run = asyncio.ensure_future(run_in_sandbox(
+        run_hidden_suite, run_batches, request.code, request.problem_id, suite, False, emit, stop
+    ))
+    run.add_done_callback(lambda _: cases.put_nowait(None))
+    try:
+        while True:
+            case = await cases.get()
+            if case is None:
+                break
+            yield _sse("case", case.model_dump())
+        result = await run
+        yield _sse("done", result.model_dump())
+    finally:
+        stop.set()
+        # Kills the batch in flight too
+        run.cancel()
+
+@app.post("/run-code/hidden", dependencies=[Depends(admit_code_run)])
+async def run_hidden_tests(request: HiddenRunRequest, http_request: Request):
+    """Run code against the problem's hidden test suite.
+
+    ``fail_fast`` returns a HiddenSuiteResult as soon as a case fails;
+    ``full`` streams every case result over SSE.
+    """
+    run_batches = SANDBOX_BATCH_RUNNERS.get(request.language.lower())
+    if run_batches is None:
+        raise HTTPException(status_code=400, detail=f"Language {request.language} execution not implemented yet")
+    if not hidden_suites.has_suite(request.problem_id):
+        raise HTTPException(status_code=404, detail=f"No hidden tests for {request.problem_id}")
+    # Opening may have to generate the suite file first
+    suite = await asyncio.get_running_loop().run_in_executor(None, hidden_suites.get, request.problem_id)
+    if suite is None:
+        raise HTTPException(status_code=404, detail=f"No hidden tests for {request.problem_id}")
+
+    if request.mode == "fail_fast":
+        return await run_cancellable(http_request, "run_code_hidden", request.session_id, run_in_sandbox(
+            run_hidden_suite, run_batches, request.code, request.problem_id, suite, True
+        ))
+    return StreamingResponse(
+        _hidden_suite_events(run_batches, request, suite),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/analyze/sessions")
+async def analyze_session_stats():
+    """Number and total source size of open /analyze sessions"""
+    return analyze_sessions.stats()
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix is ignored"""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+@app.get("/problems")
+async def list_problems(request: Request, category: Optional[str] = None):
+    """The problem catalog, or the problems in one category.
+
+    Responses carry an ETag; send it back as If-None-Match to get a 304
+    while the catalog is unchanged.
+    """
+    found = problem_registry.catalog.body(category)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Unknown category: {category}")
+    body, etag = found
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _speech(text: str, voice_id: Optional[str], if_none_match: str = "") -> Response:
+    """The clip for ``text`` from the cache, or streamed from ElevenLabs as
+    it is synthesized (and cached once complete)"""
+    text = text.strip()
+    voice_id = voice_id or TTS_VOICE_ID
+    if not text:
+        raise HTTPException(status_code=422, detail="Nothing to say")
+    if len(text) > TTS_MAX_CHARS:
+        raise HTTPException(status_code=422, detail=f"Text is longer than {TTS_MAX_CHARS} characters")
+    if not tts.VOICE_ID.match(voice_id):
+        raise HTTPException(status_code=422, detail="Invalid voice id")
+
+    key = tts.audio_key(text, voice_id)
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{key}"'}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    audio = await asyncio.to_thread(tts_cache.get, key)
+    if audio is not None:
+        tts.TTS_REQUESTS.inc(source="cache")
+        return Response(content=audio, media_type="audio/mpeg", headers={**headers, "X-TTS-Cache": "hit"})
+
+    if not ELEVENLABS_API_KEY:
+        raise HTTPException(status_code=503, detail="Text-to-speech is not configured")
+    try:
+        upstream = await elevenlabs.open(text, voice_id)
+    except tts.UpstreamError as e:
+        raise HTTPException(status_code=502, detail=f"TTS failed: {str(e)}")
+    tts.TTS_REQUESTS.inc(source="upstream")
+    return StreamingResponse(tts.tee(upstream, tts_cache.writer(key)), media_type="audio/mpeg",
+                             headers={**headers, "X-TTS-Cache": "miss"})
 
-@app.post("/run-code", response_model=RunCodeResponse)
-async def run_code(request: RunCodeRequest):
+@app.post("/tts")
+async def text_to_speech(request: TTSRequest):
+    """Speak a coaching message; the MP3 is streamed while it is synthesized"""
+    return await _speech(request.text, request.voice_id)
+
+@app.get("/tts")
+async def text_to_speech_source(request: Request, text: str, voice_id: Optional[str] = None):
+    """Same as POST /tts, usable as an <audio> src so playback starts with
+    the first chunk and the browser caches the clip"""
+    return await _speech(text, voice_id, request.headers.get("if-none-match", ""))
+
+@app.get("/tts/cache")
+async def tts_cache_stats():
+    """Clips in the audio cache and how often it answered"""
+    return tts_cache.stats()
+
+async def precompute_fallback_audio():
+    """Synthesize the canned coaching lines at startup, so the replies sent
+    when Gemini is down don't wait on ElevenLabs either"""
+    for text in dict.fromkeys([*FALLBACK_MESSAGES.values(), DEFAULT_COACHING_MESSAGE]):
+        text = text.strip()
+        key = tts.audio_key(text, TTS_VOICE_ID)
+        if key in tts_cache:
+            continue
+        try:
+            upstream = await elevenlabs.open(text, TTS_VOICE_ID)
+            async for _ in tts.tee(upstream, tts_cache.writer(key)):
+                pass
+        except tts.UpstreamError as e:
+            logger.warning("Could not precompute speech for a fallback message: %s", e)
+
+@app.get("/coach/circuit")
+async def coach_circuit_stats():
+    """State of the Gemini circuit breaker and its current timeout"""
+    return gemini_breaker.stats()
+
+@app.get("/run-code/queue")
+async def sandbox_queue_stats():
+    """Sandbox slots in use and runs waiting for one"""
+    return sandbox_scheduler.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request, stage and coaching counters in the Prometheus text format"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+def _require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _is_admin(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def _saved_profile(request: Request, profile_id: str) -> Dict[str, Any]:
+    _require_admin(request)
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}")
+    return profile
+
+@app.get("/admin/profiles")
+async def list_request_profiles(request: Request):
+    """Summaries of the saved request profiles, newest first"""
+    _require_admin(request)
+    return {"profiles": request_profiles.summaries()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_request_profile(request: Request, profile_id: str):
+    """One saved profile: summary, Python stacks and Node CPU profiles"""
+    return _saved_profile(request, profile_id)
+
+@app.get("/admin/profiles/{profile_id}/folded")
+async def get_request_profile_folded(request: Request, profile_id: str):
+    """The Python stacks as collapsed-stack text, for flamegraph.pl or speedscope"""
+    profile = _saved_profile(request, profile_id)
+    return Response(content=sampler.folded(profile["python"]["stacks"]), media_type="text/plain")
+
+@app.get("/admin/profiles/{profile_id}/node/{index}")
+async def get_request_profile_node(request: Request, profile_id: str, index: int):
+    """One Node CPU profile, to open in Chrome DevTools or speedscope"""
+    profile = _saved_profile(request, profile_id)
+    if not 0 <= index < len(profile["node"]):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} has no Node profile {index}")
+    return Response(
+        content=json.dumps(profile["node"][index]["profile"]),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}-{index}.cpuprofile"'},
+    )
+
+@app.get("/run-code/cache")
+async def run_code_cache_stats():
+    """Hit/miss counters and size of the /run-code result cache"""
+    return run_cache.stats()
+
+@app.get("/coach/cache")
+async def coach_cache_stats():
+    """Hit/miss counters of the coaching cache and coalesced Gemini calls"""
+    return {**coach_cache.stats(), "coalesced": coach_flight.coalesced}
+
+@app.post("/run-code", response_model=RunCodeResponse, dependencies=[Depends(admit_code_run)])
+async def run_code(request: RunCodeRequest, http_request: Request):
     """Execute code and run test cases"""
     try:
-        import time
-        start_time = time.time()
-        
-        # Get test cases for the problem
-        test_cases = get_test_cases_for_problem(request.problem_id)
-        
-        results = []
-        overall_passed = True
-        
-        for i, test_case in enumerate(test_cases):
-            if request.language.lower() == "javascript":
-                result = execute_javascript_code(request.code, test_case, request.problem_id)
-                result.test_case = i + 1
-                results.append(result)
-                if not result.passed:
-                    overall_passed = False
-            else:
-                # For other languages, return a placeholder result
-                results.append(TestResult(
-                    test_case=i + 1,
-                    input=test_case.input,
-                    expected=test_case.expected,
-                    actual="Language not yet supported",
-                    passed=False,
-                    error=f"Language {request.language} execution not implemented yet"
-                ))
-                overall_passed = False
-        
-        execution_time = time.time() - start_time
-        
-        return RunCodeResponse(
-            results=results,
-            overall_passed=overall_passed,
-            execution_time=execution_time
-        )
-        
+        return await run_cancellable(http_request, "run_code", request.session_id, run_submission(request))
+    except (SchedulerFull, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Code execution failed: {str(e)}")
 
+def _job_status(job) -> JobStatus:
+    return JobStatus(
+        id=job.id,
+        status=job.status,
+        ahead=job.ahead,
+        result=RunCodeResponse.model_validate_json(job.result) if job.result else None,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+@app.post("/jobs", response_model=JobSubmitted, status_code=202)
+async def submit_job(request: RunCodeRequest, client: str = Depends(limit_code_runs)):
+    """Queue a /run-code submission. Poll GET /jobs/{id}, or watch
+    /jobs/{id}/ws, for its result."""
+    try:
+        job = await asyncio.to_thread(job_queue.submit, request.model_dump_json(), client)
+    except QueueFull as e:
+        JOBS.inc(outcome="rejected")
+        raise HTTPException(status_code=503, detail=f"Too many queued jobs: {e}", headers={"Retry-After": "5"})
+    JOBS.inc(outcome="submitted")
+    return JobSubmitted(id=job.id, status=job.status)
+
+@app.get("/jobs")
+async def job_queue_stats():
+    """Number of jobs in each state"""
+    return await asyncio.to_thread(job_queue.stats)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, wait: float = 0):
+    """A job's status, with its RunCodeResponse once done. With ``wait``,
+    the reply is held up to that many seconds (at most 30) for the job to
+    finish."""
+    deadline = time.monotonic() + min(max(wait, 0.0), JOB_MAX_WAIT_SECONDS)
+    while True:
+        job = await asyncio.to_thread(job_queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+        if job.finished or time.monotonic() >= deadline:
+            return _job_status(job)
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+@app.websocket("/jobs/{job_id}/ws")
+async def watch_job(websocket: WebSocket, job_id: str):
+    """Push the job's status whenever it changes; closes after it finishes"""
+    await websocket.accept()
+    last = None
+    try:
+        while True:
+            job = await asyncio.to_thread(job_queue.get, job_id)
+            if job is None:
+                await websocket.send_json({"id": job_id, "error": "Unknown job"})
+                await websocket.close(code=4404)
+                return
+            if (job.status, job.ahead) != last:
+                last = (job.status, job.ahead)
+                await websocket.send_text(_job_status(job).model_dump_json())
+            if job.finished:
+                await websocket.close()
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    except WebSocketDisconnect:
+        pass
+
+
+def _live_source(session: Optional[AnalysisSession], update: LiveUpdate):
+    """The analysis session for a /ws/session update and its new source"""
+    if update.code is not None:
+        if session is None or session.language != update.language:
+            session = AnalysisSession(update.language)
+        return session, update.code
+    if update.edits is None:
+        raise SessionConflict("Send either the code or edits")
+    if session is None:
+        raise SessionConflict("Send the full code first")
+    if session.language != update.language:
+        raise SessionConflict("Session was opened for another language")
+    if update.base_version != session.version:
+        raise SessionConflict(f"Session is at version {session.version}, not {update.base_version}")
+    return session, apply_edits(session.source, [(e.start, e.end, e.text) for e in update.edits])
+
+async def _live_coaching(code: str, analysis: AnalyzeResponse, send) -> None:
+    request = CoachRequest(code=code, analysis=analysis.model_dump())
+    async with aclosing(_coaching_updates(request, "session")) as updates:
+        async for event, data in updates:
+            send(f"coach_{event}", data)
+
+async def _live_run(update: LiveUpdate, code: str, send) -> None:
+    """Run the visible test cases, sending each result as it finishes and
+    then the whole RunCodeResponse"""
+    execute = SANDBOX_EXECUTORS.get(update.language.lower())
+    if execute is None:
+        send("error", {"status": 400, "detail": f"Language {update.language} execution not implemented yet"})
+        return
+    wait = run_rate_limiter.acquire(admission.current_client())
+    if wait > 0:
+        admission.SHED.inc(reason="rate_limit")
+        send("error", {"status": 429, "detail": "Too many code runs, slow down", "retry_after": math.ceil(wait)})
+        return
+
+    started = time.time()
+    request = RunCodeRequest(code=code, language=update.language, problem_id=update.problem_id, test_cases=[])
+    test_cases = get_test_cases_for_problem(update.problem_id)
+    cache_key = _run_cache_key(request)
+    cached = await run_cache.aget(cache_key)
+    if cached is not None:
+        response = RunCodeResponse.model_validate_json(cached)
+        response.cached = True
+        for result in response.results:
+            send("test", result.model_dump())
+        send("run", response.model_dump())
+        return
+
+    # One sandbox run per case, so results go out one by one
+    results: List[Optional[TestResult]] = [None] * len(test_cases)
+    lanes = asyncio.Semaphore(max(1, RUN_CODE_MAX_PARALLEL))
+
+    async def run_case(i: int, test_case: TestCaseSpec) -> None:
+        async with lanes:
+            [result] = await run_in_sandbox(execute, code, [test_case], update.problem_id)
+        result.test_case = i + 1
+        results[i] = result
+        send("test", result.model_dump())
+
+    runs = [asyncio.create_task(run_case(i, test_case)) for i, test_case in enumerate(test_cases)]
+    try:
+        await asyncio.gather(*runs)
+    except SchedulerFull as e:
+        send("error", {"status": 429, "detail": f"Sandboxes are busy: {e}", "retry_after": math.ceil(e.retry_after)})
+        return
+    finally:
+        for run in runs:
+            run.cancel()
+
+    response = RunCodeResponse(
+        results=results,
+        overall_passed=all(result.passed for result in results),
+        execution_time=time.time() - started,
+    )
+    if _is_cacheable(results):
+        await run_cache.aset(cache_key, response.model_dump_json())
+    send("run", response.model_dump())
+
+async def _live_work(update: LiveUpdate, code: str, analysis: AnalyzeResponse, send) -> None:
+    work = []
+    if update.coach:
+        work.append(_live_coaching(code, analysis, send))
+    if update.run:
+        work.append(_live_run(update, code, send))
+    await asyncio.gather(*work)
+    LIVE_UPDATES.inc(outcome="completed")
+
+@app.websocket("/ws/session")
+async def live_session(websocket: WebSocket):
+    """One editor's live session: analysis, coaching and test results for
+    each code update, pushed as they are ready.
+
+    Every update is analyzed at once; ``coach`` and ``run`` ask for more.
+    Replies carry the version of the code they are about, and work still
+    going for an older version is cancelled when a newer update arrives.
+    The bearer token the rate limiter keys on comes in the Authorization
+    header or, as browsers can't set headers on a WebSocket, as the
+    subprotocols ``bearer, <token>``; never in the URL, which ends up in
+    access logs.
+    """
+    authorization = websocket.headers.get("authorization")
+    subprotocols = websocket.scope.get("subprotocols") or []
+    if not authorization and len(subprotocols) == 2 and subprotocols[0] == "bearer":
+        authorization = f"Bearer {subprotocols[1]}"
+    await websocket.accept(subprotocol="bearer" if "bearer" in subprotocols else None)
+    client_id = admission.client_key(authorization, websocket.client.host if websocket.client else None)
+    # Replies from concurrent work are queued and sent by one task
+    outbox: asyncio.Queue = asyncio.Queue()
+
+    async def send_replies():
+        while True:
+            await websocket.send_json(await outbox.get())
+
+    def sender(version: Optional[int]):
+        return lambda kind, data: outbox.put_nowait({"type": kind, "version": version, **data})
+
+    replies = asyncio.create_task(send_replies())
+    session: Optional[AnalysisSession] = None
+    work: Optional[asyncio.Task] = None
+    LIVE_SESSIONS.inc()
+    try:
+        with admission.acting_as(client_id):
+            while True:
+                try:
+                    update = LiveUpdate.model_validate(await websocket.receive_json())
+                except ValueError as e:
+                    # Also covers ValidationError and malformed JSON
+                    LIVE_UPDATES.inc(outcome="rejected")
+                    sender(None)("error", {"status": 422, "detail": str(e)})
+                    continue
+                try:
+                    session, code = _live_source(session, update)
+                except SessionConflict as e:
+                    # The client resyncs by sending the full code again
+                    LIVE_UPDATES.inc(outcome="rejected")
+                    sender(None)("error", {
+                        "status": 409, "detail": str(e), "session_version": session.version if session else 0,
+                    })
+                    continue
+                if work is not None and not work.done():
+                    work.cancel()
+                    LIVE_UPDATES.inc(outcome="superseded")
+                with metrics.stage("analysis"):
+                    structures, estimate = session.update(code)
+                estimate = estimate or _fallback_estimate(structures)
+                if estimate.recursive and "recursion" not in structures:
+                    structures.append("recursion")
+                analysis = AnalyzeResponse(
+                    complexity_hint=estimate.bound,
+                    structures=structures,
+                    complexity_confidence=estimate.confidence,
+                    version=session.version,
+                )
+                send = sender(session.version)
+                send("analysis", analysis.model_dump(exclude={"version"}))
+                LIVE_UPDATES.inc(outcome="analyzed")
+                work = asyncio.create_task(_live_work(update, code, analysis, send)) if update.coach or update.run else None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        LIVE_SESSIONS.dec()
+        if work is not None:
+            work.cancel()
+        replies.cancel()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,383 @@
+"""Pool of warm Node.js workers used by /run-code.
+
+Each worker is a ``node node_worker.js`` process, spawned ahead of time so a
+submission doesn't wait for Node to start. A submission leases a worker,
+loads its code into a fresh ``vm`` context, runs test inputs against it and
+hands the worker back. After ``max_runs_per_worker`` submissions (one by
+default) the worker is killed and a replacement spawned in the background.
+
+One is the safe setting: ``vm`` is not a security boundary (user code can
+reach the real ``process``), so a submission can leave timers, patched
+built-ins or forged replies behind for whatever the process runs next. The
+price is a cold ``node`` start (tens of milliseconds) per submission, which
+the background respawn hides until every worker is busy; under sustained
+load each lease waits for one. Raising the count keeps workers warm across
+submissions, for trusted deployments (e.g. a load test) only. The CPU limit
+is per process, so it then covers all of a worker's submissions together.
+
+Jobs go to the worker as newline-delimited JSON on stdin and replies come
+back on a pipe of their own, not stdout; whatever the worker writes to
+stdout or stderr is logged (a few lines at most). A reply for any job but
+the one asked about means the worker can't be trusted, and it is killed.
+
+Each worker's address space and CPU time are capped with rlimits (where the
+platform allows setting them on another process) and its V8 heap with
+``--max-old-space-size``. The ``vm`` timeout only measures wall-clock time
+of synchronous code, so the CPU limit is what stops work user code
+schedules outside it.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import cancellation
+import metrics
+import sampler
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "node_worker.js")
+
+# Extra wall-clock allowance on top of the in-sandbox timeout before the pool
+# gives up on a worker and kills it.
+TIMEOUT_GRACE_SECONDS = 1.0
+
+# Most lines of a worker's own stdout/stderr that are logged
+MAX_LOGGED_LINES = 20
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(Exception):
+    """The worker process died or returned something unusable."""
+
+
+class WorkerTimeout(WorkerError):
+    """The worker did not answer within the allowed time."""
+
+
+class WorkerMemoryLimit(WorkerError):
+    """The worker was killed for running out of memory."""
+
+
+class WorkerCancelled(WorkerError):
+    """The worker was killed because the run's result was no longer wanted."""
+
+
+def _limit_resources(pid: int, memory_limit_mb: int, cpu_limit_seconds: int) -> None:
+    try:
+        import resource
+    except ImportError:
+        return
+    if not hasattr(resource, "prlimit"):
+        return
+    limits = []
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        limits.append((resource.RLIMIT_AS, (limit, limit)))
+    if cpu_limit_seconds:
+        # SIGXCPU at the soft limit, SIGKILL a second later
+        limits.append((resource.RLIMIT_CPU, (cpu_limit_seconds, cpu_limit_seconds + 1)))
+    for kind, limit in limits:
+        try:
+            resource.prlimit(pid, kind, limit)
+        except (OSError, ValueError):
+            pass
+
+
+class NodeWorker:
+    """A single ``node`` process running the sandbox worker script."""
+
+    def __init__(self, node_binary: str = "node", memory_limit_mb: int = 0, max_heap_mb: int = 0,
+                 cpu_limit_seconds: int = 0):
+        self.broken = False
+        self.cancelled = False
+        # Submissions leased to this worker so far
+        self.runs = 0
+        self._ids = itertools.count(1)
+        self._replies: "queue.Queue[Optional[str]]" = queue.Queue()
+        heap = [f"--max-old-space-size={max_heap_mb}"] if max_heap_mb else []
+        reply_read, reply_write = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [node_binary, *heap, WORKER_SCRIPT, str(reply_write)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                pass_fds=(reply_write,),
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+            )
+        except OSError:
+            os.close(reply_read)
+            raise
+        finally:
+            os.close(reply_write)
+        _limit_resources(self.process.pid, memory_limit_mb, cpu_limit_seconds)
+        self._reply_stream = os.fdopen(reply_read, "r", encoding="utf-8")
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+        threading.Thread(target=self._log_output, daemon=True).start()
+
+    def _read_replies(self) -> None:
+        for line in self._reply_stream:
+            self._replies.put(line)
+        self._replies.put(None)
+
+    def _log_output(self) -> None:
+        logged = 0
+        for line in self.process.stdout:
+            if logged < MAX_LOGGED_LINES:
+                logger.info("node worker %d: %s", self.process.pid, line.rstrip()[:500])
+                logged += 1
+
+    def request(self, op: str, timeout: float, **payload: Any) -> Dict[str, Any]:
+        """Send one job and wait for its reply."""
+        if self.broken:
+            raise WorkerError("Worker is no longer usable")
+
+        # A request being profiled gets a V8 CPU profile of each op it runs
+        recording = sampler.current()
+        if recording is not None:
+            payload["cpu_profile"] = True
+
+        cancel = cancellation.current()
+        if cancel is None:
+            return self._send(op, timeout, recording, payload)
+        if cancel.cancelled:
+            raise WorkerCancelled("Cancelled")
+        started = time.monotonic()
+
+        def stop():
+            # Called from the event loop; the reader thread sees the exit
+            self.cancelled = True
+            cancellation.record_cancelled_run("node", timeout - (time.monotonic() - started))
+            self.process.kill()
+
+        with cancel.on_cancel(stop):
+            return self._send(op, timeout, recording, payload)
+
+    def _send(self, op: str, timeout: float, recording: Optional[sampler.Recording],
+              payload: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = next(self._ids)
+        try:
+            self.process.stdin.write(json.dumps({"id": job_id, "op": op, **payload}) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as exc:
+            self.broken = True
+            if self.cancelled:
+                raise WorkerCancelled("Cancelled")
+            raise WorkerError(f"Worker stdin closed: {exc}")
+
+        try:
+            line = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            self.broken = True
+            raise WorkerTimeout("Execution timeout")
+        if line is None:
+            self.broken = True
+            if self.cancelled:
+                raise WorkerCancelled("Cancelled")
+            code = self._exit_code()
+            if code in (-signal.SIGXCPU, -signal.SIGKILL):
+                raise WorkerTimeout("CPU time limit exceeded")
+            if code in (-signal.SIGABRT, -signal.SIGTRAP, 134):
+                # How V8 dies when its heap is exhausted
+                raise WorkerMemoryLimit("Memory limit exceeded")
+            raise WorkerError("Worker exited unexpectedly")
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            self.broken = True
+            raise WorkerError("Worker sent malformed output")
+        if not isinstance(reply, dict) or reply.get("id") != job_id:
+            self.broken = True
+            raise WorkerError("Worker answered out of turn")
+        profile = reply.pop("cpu_profile", None)
+        if profile is not None and recording is not None:
+            recording.add_node_profile(op, profile)
+        return reply
+
+    def _exit_code(self) -> Optional[int]:
+        try:
+            return self.process.wait(timeout=TIMEOUT_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def kill(self) -> None:
+        self.broken = True
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (self.process.stdin, self._reply_stream):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class NodeWorkerPool:
+    """Fixed-size pool of :class:`NodeWorker` processes.
+
+    ``size`` is the number of concurrent workers and ``run_timeout`` the
+    per-execution timeout in seconds enforced inside the sandbox.
+    ``memory_limit_mb`` caps each worker's address space, ``max_heap_mb`` its
+    V8 heap and ``cpu_limit_seconds`` its CPU time (0 for no limit);
+    ``max_output`` bounds the captured console output and the result of each
+    case, in characters. ``max_runs_per_worker`` is how many submissions a
+    worker runs before it is replaced (see the module docstring).
+    """
+
+    def __init__(self, size: int = 2, run_timeout: float = 5.0, node_binary: str = "node",
+                 memory_limit_mb: int = 0, max_heap_mb: int = 0, cpu_limit_seconds: int = 60,
+                 max_output: int = 65536, max_runs_per_worker: int = 1):
+        self.size = max(1, size)
+        self.max_runs_per_worker = max(1, max_runs_per_worker)
+        self.run_timeout = run_timeout
+        self.node_binary = node_binary
+        self.memory_limit_mb = memory_limit_mb
+        self.max_heap_mb = max_heap_mb
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.max_output = max_output
+        self._idle: "queue.LifoQueue[Optional[NodeWorker]]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        """Spawn the workers up front so the first request doesn't pay for it."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    worker.kill()
+
+    def _new_worker(self) -> NodeWorker:
+        with metrics.stage("worker_spawn"):
+            return NodeWorker(self.node_binary, self.memory_limit_mb, self.max_heap_mb, self.cpu_limit_seconds)
+
+    def _spawn(self) -> Optional[NodeWorker]:
+        try:
+            return self._new_worker()
+        except OSError:
+            # Leave an empty slot; the next lease will retry the spawn.
+            return None
+
+    @contextmanager
+    def lease(self):
+        """Borrow a worker for the duration of one submission."""
+        self.start()
+        with metrics.stage("worker_lease"):
+            worker = self._idle.get()
+        try:
+            if worker is None or worker.broken or worker.process.poll() is not None:
+                if worker is not None:
+                    worker.kill()
+                worker = self._new_worker()
+            worker.runs += 1
+            yield worker
+        finally:
+            self._release(worker)
+
+    def _release(self, worker: Optional[NodeWorker]) -> None:
+        if (worker is not None and not worker.broken and worker.runs < self.max_runs_per_worker
+                and worker.process.poll() is None):
+            self._idle.put(worker)
+            return
+        if worker is not None:
+            worker.kill()
+        threading.Thread(target=self._replace, daemon=True).start()
+
+    def _replace(self) -> None:
+        self._idle.put(self._spawn() if self._started else None)
+
+    def run(self, code: str, candidates: List[str], inputs: List[str]) -> Dict[str, Any]:
+        """Load ``code`` into a fresh context and run each input against it.
+
+        Returns the worker's reply: ``{"ok": False, "error": ...}`` when the
+        code could not be loaded, otherwise ``{"ok": True, "results": [...]}``
+        with one ``{"ok", "output" | "error", "time_ms", "cpu_ms",
+        "peak_rss_kb", "stdout"}`` entry per input.
+        """
+        timeout_ms = int(self.run_timeout * 1000)
+        with self.lease() as worker:
+            with metrics.stage("code_load"):
+                loaded = worker.request("load", timeout=self.run_timeout + TIMEOUT_GRACE_SECONDS,
+                                        code=code, candidates=candidates, timeout_ms=timeout_ms,
+                                        max_output=self.max_output)
+            if not loaded.get("ok"):
+                return loaded
+            budget = self.run_timeout * max(1, len(inputs)) + TIMEOUT_GRACE_SECONDS
+            with metrics.stage("execute"):
+                return worker.request("run", timeout=budget, inputs=inputs, timeout_ms=timeout_ms)
+
+    def run_batches(self, code: str, candidates: List[str], batches: Iterable[List[str]],
+                    max_output: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Like ``run``, for suites too large to send in one request.
+
+        The code is loaded once and each batch of inputs is run in turn on
+        the same worker, yielding the worker's reply per batch; a load
+        failure is yielded on its own. Closing the generator early hands
+        the worker back. ``max_output`` overrides the pool's cap on
+        captured output and results, for suites with large answers.
+        """
+        timeout_ms = int(self.run_timeout * 1000)
+        with self.lease() as worker:
+            with metrics.stage("code_load"):
+                loaded = worker.request("load", timeout=self.run_timeout + TIMEOUT_GRACE_SECONDS,
+                                        code=code, candidates=candidates, timeout_ms=timeout_ms,
+                                        max_output=max_output or self.max_output)
+            if not loaded.get("ok"):
+                yield loaded
+                return
+            for inputs in batches:
+                budget = self.run_timeout * max(1, len(inputs)) + TIMEOUT_GRACE_SECONDS
+                with metrics.stage("execute"):
+                    reply = worker.request("run", timeout=budget, inputs=inputs, timeout_ms=timeout_ms)
+                yield reply
+
+    def profile(self, code: str, candidates: List[str], generator: str, sizes: List[int],
+                budget: float, size_budget: float, min_time: float) -> Dict[str, Any]:
+        """Time the loaded function on generated inputs of each size in turn.
+
+        Inputs are built inside the sandbox by the named ``generator``. Each
+        size is repeated until its runs add up to ``min_time`` seconds and
+        the best run is kept; profiling stops after a size slower than
+        ``size_budget`` or once ``budget`` seconds are used up. Returns
+        ``{"ok": True, "points": [{"size", "time_ms", "reps"}], "cut_off",
+        "error"}``, or the load error.
+        """
+        timeout_ms = int(self.run_timeout * 1000)
+        with self.lease() as worker:
+            with metrics.stage("code_load"):
+                loaded = worker.request("load", timeout=self.run_timeout + TIMEOUT_GRACE_SECONDS,
+                                        code=code, candidates=candidates, timeout_ms=timeout_ms,
+                                        max_output=self.max_output)
+            if not loaded.get("ok"):
+                return loaded
+            with metrics.stage("profile"):
+                return worker.request("profile", timeout=budget + self.run_timeout + TIMEOUT_GRACE_SECONDS,
+                                      generator=generator, sizes=sizes, timeout_ms=timeout_ms,
+                                      budget_ms=int(budget * 1000), size_budget_ms=size_budget * 1000,
+                                      min_time_ms=min_time * 1000)
@@ -0,0 +1,331 @@
+// Sandbox worker for the /run-code Node pool (see node_pool.py). Reads
+// newline-delimited JSON jobs on stdin and answers each one with a single
+// JSON line on the reply pipe whose fd is the first argument. Each
+// submission gets a fresh vm context, and by default the worker is killed
+// after one (NODE_WORKER_MAX_RUNS): the context keeps user code away from the
+// worker's globals by accident, not by design (it can still reach the real
+// process), so only then can nothing it does outlive its submission.
+const crypto = require('crypto');
+const fs = require('fs');
+const inspector = require('inspector');
+const util = require('util');
+const vm = require('vm');
+const readline = require('readline');
+
+const replyFd = Number(process.argv[2]);
+let context = null;
+let entryName = null;
+let maxOutput = 65536;
+// console output of the case being run, capped at maxOutput characters
+let captured = '';
+let truncated = false;
+
+function send(message) {
+  const data = Buffer.from(JSON.stringify(message) + '\n');
+  for (let offset = 0; offset < data.length;) {
+    offset += fs.writeSync(replyFd, data, offset);
+  }
+}
+
+function errorText(error) {
+  if (error && typeof error.message === 'string') {
+    return error.message;
+  }
+  return String(error);
+}
+
+function isTimeout(error) {
+  return Boolean(error) && error.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT';
+}
+
+function capture(...args) {
+  if (truncated) return;
+  const line = util.format(...args) + '\n';
+  if (captured.length + line.length > maxOutput) {
+    captured += line.slice(0, maxOutput - captured.length);
+    truncated = true;
+  } else {
+    captured += line;
+  }
+}
+
+function takeOutput() {
+  const output = truncated ? captured + '\n... output truncated' : captured;
+  captured = '';
+  truncated = false;
+  return output;
+}
+
+function truncate(text) {
+  return text.length > maxOutput ? text.slice(0, maxOutput) + '... output truncated' : text;
+}
+
+// A result too long to send whole goes out truncated, with the SHA-256 of
+// the full JSON so the backend can still check it against the expected one.
+function outputFields(output) {
+  if (output.length <= maxOutput) return { output };
+  return { output: truncate(output), output_digest: crypto.createHash('sha256').update(output).digest('hex') };
+}
+
+// Peak resident set size since the last reset, in KB. Linux only; elsewhere
+// this is the worker's lifetime peak.
+let canResetPeak = true;
+
+function resetPeakRss() {
+  if (!canResetPeak) return;
+  try {
+    fs.writeFileSync('/proc/self/clear_refs', '5');
+  } catch (err) {
+    canResetPeak = false;
+  }
+}
+
+function peakRssKb() {
+  if (canResetPeak) {
+    try {
+      const match = /VmHWM:\s+(\d+)/.exec(fs.readFileSync('/proc/self/status', 'utf8'));
+      if (match) return Number(match[1]);
+    } catch (err) {
+      canResetPeak = false;
+    }
+  }
+  return process.resourceUsage().maxRSS;
+}
+
+function createContext() {
+  // console.* calls from user code are captured (up to maxOutput) instead of
+  // written out, so they cannot corrupt the protocol stream on stdout.
+  // Microtasks run inside each evaluation so the timeout also covers promise
+  // chains.
+  const sandboxConsole = { log: capture, error: capture, warn: capture, info: capture, debug: capture };
+  return vm.createContext({ console: sandboxConsole }, { microtaskMode: 'afterEvaluate' });
+}
+
+function load(job) {
+  context = createContext();
+  entryName = null;
+  if (job.max_output) maxOutput = job.max_output;
+
+  try {
+    new vm.Script(job.code, { filename: 'solution.js' }).runInContext(context, { timeout: job.timeout_ms });
+  } catch (error) {
+    context = null;
+    return { ok: false, error: isTimeout(error) ? 'Execution timeout' : 'Error: ' + errorText(error) };
+  }
+
+  for (const name of job.candidates) {
+    if (!name) continue;
+    try {
+      if (typeof vm.runInContext(name, context) === 'function') {
+        entryName = name;
+        break;
+      }
+    } catch (err) {
+      // Ignore invalid identifiers
+    }
+  }
+
+  if (entryName === null) {
+    context = null;
+    return { ok: false, error: 'Error: Function not found. Expected one of: ' + job.candidates.join(', ') };
+  }
+  return { ok: true };
+}
+
+function runCase(input, timeoutMs) {
+  takeOutput();
+  resetPeakRss();
+  const started = process.hrtime.bigint();
+  const cpuStarted = process.cpuUsage();
+  const usage = () => {
+    const cpu = process.cpuUsage(cpuStarted);
+    return {
+      time_ms: Number(process.hrtime.bigint() - started) / 1e6,
+      cpu_ms: (cpu.user + cpu.system) / 1000,
+      peak_rss_kb: peakRssKb(),
+      stdout: takeOutput(),
+    };
+  };
+
+  let args;
+  try {
+    args = vm.runInContext('[' + input + ']', context, { timeout: timeoutMs });
+  } catch (parseError) {
+    return { ok: false, error: 'Error: Failed to parse inputs: ' + errorText(parseError), ...usage() };
+  }
+
+  try {
+    context.__args = args;
+    const result = vm.runInContext(entryName + '(...__args)', context, { timeout: timeoutMs });
+    const output = typeof result === 'undefined' ? '' : JSON.stringify(result);
+    return { ok: true, ...outputFields(output === undefined ? '' : output), ...usage() };
+  } catch (error) {
+    return { ok: false, error: isTimeout(error) ? 'Execution timeout' : truncate('Error: ' + errorText(error)), ...usage() };
+  } finally {
+    delete context.__args;
+  }
+}
+
+// Input generators for profile mode, keyed by problem id. Evaluated inside
+// the submission's context so the arrays belong to its realm; each returns
+// the argument list for size n.
+function profileGenerators() {
+  const random = (seed) => {
+    let state = seed >>> 0;
+    return () => (state = (Math.imul(state, 1664525) + 1013904223) >>> 0) / 4294967296;
+  };
+  const range = (n, f) => Array.from({ length: n }, (_, i) => f(i));
+  return {
+    'two-sum': (n) => [range(n, (i) => i), 2 * n - 3],
+    'reverse-string': (n) => ['ab'.repeat(Math.ceil(n / 2)).slice(0, n)],
+    'valid-parentheses': (n) => ['('.repeat(n >> 1) + ')'.repeat(n >> 1)],
+    'merge-sorted-arrays': (n) => [range(n >> 1, (i) => 2 * i), range(n - (n >> 1), (i) => 2 * i + 1)],
+    'max-subarray': (n) => { const r = random(n); return [range(n, () => Math.floor(r() * 201) - 100)]; },
+    'best-time-stock': (n) => { const r = random(n); return [range(n, () => Math.floor(r() * 10000))]; },
+    'single-number': (n) => [range(n | 1, (i) => (i === (n | 1) - 1 ? -1 : i >> 1))],
+    'majority-element': (n) => [range(n, (i) => (i % 3 === 0 ? i : 7))],
+    'climbing-stairs': (n) => [n],
+    'happy-number': (n) => [n],
+  };
+}
+
+// Time for size n extrapolated from the growth between the last two points
+function predictedMs(points, n) {
+  if (points.length < 2) return 0;
+  const [a, b] = points.slice(-2);
+  const growth = Math.log(b.time_ms / a.time_ms) / Math.log(b.size / a.size);
+  return growth > 0 ? b.time_ms * Math.pow(n / b.size, growth) : b.time_ms;
+}
+
+function profile(job) {
+  if (context === null) {
+    return { ok: false, error: 'No submission loaded' };
+  }
+  const generators = vm.runInContext('(' + profileGenerators.toString() + ')()', context);
+  const generate = generators[job.generator];
+  if (typeof generate !== 'function') {
+    return { ok: false, error: 'No input generator for ' + job.generator };
+  }
+
+  // Calls are batched inside one evaluation so the per-evaluation timeout
+  // watchdog doesn't swamp fast runs.
+  const batch = new vm.Script('for (let __i = 0; __i < __batch.length; __i++) ' + entryName + '(...__batch[__i])');
+  const deadline = Date.now() + job.budget_ms;
+  // An untimed warm-up batch at the smallest size lets the JIT settle first;
+  // any error it hits shows up again in the timed runs below.
+  try {
+    context.__batch = Array.from({ length: 16 }, () => generate(job.sizes[0]));
+    batch.runInContext(context, { timeout: job.timeout_ms });
+  } catch (err) {
+    // reported by the timed runs
+  } finally {
+    delete context.__batch;
+  }
+  const points = [];
+  let cutOff = false;
+  let error = null;
+  for (const size of job.sizes) {
+    // Keep timing batches (growing them while they're short) until they add
+    // up to min_time_ms, and keep the best per-call time.
+    let best = Infinity;
+    let total = 0;
+    let reps = 0;
+    let batchSize = 1;
+    for (let round = 0; round === 0 || (total < job.min_time_ms && round < 20); round++) {
+      const remaining = deadline - Date.now();
+      if (remaining <= 0) {
+        cutOff = true;
+        break;
+      }
+      context.__batch = Array.from({ length: batchSize }, () => generate(size));
+      const started = process.hrtime.bigint();
+      try {
+        batch.runInContext(context, { timeout: Math.min(job.timeout_ms, remaining) });
+      } catch (err) {
+        cutOff = true;
+        if (!isTimeout(err)) error = truncate('Error: ' + errorText(err));
+        break;
+      } finally {
+        delete context.__batch;
+      }
+      const elapsed = Number(process.hrtime.bigint() - started) / 1e6;
+      best = Math.min(best, elapsed / batchSize);
+      total += elapsed;
+      reps += batchSize;
+      if (elapsed < job.min_time_ms / 4) batchSize = Math.min(batchSize * 4, 1024);
+    }
+    if (reps > 0) points.push({ size, time_ms: best, reps });
+    if (cutOff) break;
+    const next = job.sizes[job.sizes.indexOf(size) + 1];
+    if (next !== undefined && (best > job.size_budget_ms || predictedMs(points, next) > deadline - Date.now())) {
+      cutOff = true;
+      break;
+    }
+  }
+  takeOutput();
+  return { ok: true, points, cut_off: cutOff, error };
+}
+
+function run(job) {
+  if (context === null) {
+    return { ok: false, error: 'No submission loaded' };
+  }
+  return { ok: true, results: job.inputs.map((input) => runCase(input, job.timeout_ms)) };
+}
+
+// V8 CPU profile (the .cpuprofile format) of running fn. Messages to an
+// in-thread inspector session are answered synchronously.
+let inspectorSession = null;
+
+function withCpuProfile(fn) {
+  if (inspectorSession === null) {
+    inspectorSession = new inspector.Session();
+    inspectorSession.connect();
+    inspectorSession.post('Profiler.enable');
+    inspectorSession.post('Profiler.setSamplingInterval', { interval: 500 });
+  }
+  let profile = null;
+  inspectorSession.post('Profiler.start');
+  try {
+    fn();
+  } finally {
+    inspectorSession.post('Profiler.stop', (err, result) => {
+      if (!err) profile = result.profile;
+    });
+  }
+  return profile;
+}
+
+const handlers = {
+  load,
+  run,
+  profile,
+  ping() {
+    return { ok: true };
+  },
+};
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+
+rl.on('line', (line) => {
+  if (!line.trim()) return;
+  let job;
+  try {
+    job = JSON.parse(line);
+  } catch (err) {
+    send({ id: null, ok: false, error: 'Malformed job' });
+    return;
+  }
+  const handler = handlers[job.op];
+  let reply;
+  if (handler && job.cpu_profile) {
+    const profile = withCpuProfile(() => { reply = handler(job); });
+    if (profile) reply.cpu_profile = profile;
+  } else {
+    reply = handler ? handler(job) : { ok: false, error: 'Unknown op: ' + job.op };
+  }
+  reply.id = job.id;
+  send(reply);
+});
+
+rl.on('close', () => process.exit(0));
@@ -0,0 +1,188 @@
+"""Problem catalog shared with the frontend.
+
+``problems.json`` at the project root is the one copy of every problem:
+its statement, starter templates and the test cases /run-code grades
+against. The frontend bundles the same file, and /problems serves it with
+an ETag. It is loaded once into immutable records indexed by id and
+category; ``ProblemRegistry.catalog`` re-reads the file when it changes on
+disk and keeps serving the previous catalog if the new one doesn't parse.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from comparators import Comparator, Expected
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "problems.json")
+
+logger = logging.getLogger(__name__)
+
+
+class _Frozen:
+    """Attributes are set once in ``__init__`` and never again."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _set(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+
+class TestCaseSpec(_Frozen):
+    """One graded input with its expected output (same fields as TestCase).
+    ``expected_output`` keeps the parsed form once a comparison needed it."""
+
+    __slots__ = ("input", "expected", "description", "expected_output")
+
+    def __init__(self, input: str, expected: str, description: str = ""):
+        self._set(input=input, expected=expected, description=description, expected_output=Expected(expected))
+
+
+class Problem(_Frozen):
+    """A catalog entry. ``suite_version`` fingerprints the test cases so
+    cached results for an edited suite are not reused, and ``comparator``
+    is the rule outputs are checked with."""
+
+    __slots__ = ("id", "title", "difficulty", "categories", "available", "test_cases", "suite_version",
+                 "comparator")
+
+    def __init__(self, id: str, title: str, difficulty: str, categories: Tuple[str, ...], available: bool,
+                 test_cases: Tuple[TestCaseSpec, ...], comparator: Comparator):
+        digest = hashlib.sha256()
+        for case in test_cases:
+            digest.update(f"{case.input}\0{case.expected}\0".encode("utf-8"))
+        self._set(id=id, title=title, difficulty=difficulty, categories=categories, available=available,
+                  test_cases=test_cases, suite_version=digest.hexdigest(), comparator=comparator)
+
+
+class Catalog(_Frozen):
+    """One parsed version of the catalog file.
+
+    ``bodies`` holds the compact JSON /problems sends, with its ETag, for the
+    whole catalog (key None) and for each category.
+    """
+
+    __slots__ = ("problems", "by_category", "bodies")
+
+    def __init__(self, problems: Dict[str, Problem], by_category: Dict[str, Tuple[Problem, ...]],
+                 bodies: Dict[Optional[str], Tuple[bytes, str]]):
+        self._set(problems=problems, by_category=by_category, bodies=bodies)
+
+    def get(self, problem_id: str) -> Optional[Problem]:
+        return self.problems.get(problem_id)
+
+    def body(self, category: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """``(json, etag)`` for the whole catalog or one category, None if unknown."""
+        return self.bodies.get(category)
+
+
+def _body(entries: List[Dict[str, Any]]) -> Tuple[bytes, str]:
+    body = json.dumps({"problems": entries}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def parse_catalog(data: Dict[str, Any]) -> Catalog:
+    """Build a Catalog from the decoded file; raises ValueError if it is malformed."""
+    entries = data.get("problems") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError('expected an object with a "problems" list')
+
+    problems: Dict[str, Problem] = {}
+    by_category: Dict[str, list] = {}
+    category_entries: Dict[str, list] = {}
+    for entry in entries:
+        try:
+            problem = Problem(
+                id=entry["id"],
+                title=entry["title"],
+                difficulty=entry["difficulty"],
+                categories=tuple(entry.get("categories", ())),
+                available=bool(entry.get("available", True)),
+                test_cases=tuple(
+                    TestCaseSpec(case["input"], case["expected"], case.get("description", ""))
+                    for case in entry.get("testCases", ())
+                ),
+                comparator=Comparator.from_spec(entry.get("compare")),
+            )
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"bad problem entry {entry!r:.80}: {exc}")
+        if problem.id in problems:
+            raise ValueError(f"duplicate problem id {problem.id!r}")
+        problems[problem.id] = problem
+        for category in problem.categories:
+            by_category.setdefault(category, []).append(problem)
+            category_entries.setdefault(category, []).append(entry)
+
+    bodies = {category: _body(items) for category, items in category_entries.items()}
+    bodies[None] = _body(entries)
+    return Catalog(problems, {category: tuple(items) for category, items in by_category.items()}, bodies)
+
+
+class ProblemRegistry:
+    """The current Catalog for ``path``, reloaded when the file changes.
+
+    The file's mtime and size are checked at most every ``check_interval``
+    seconds, on access, so there is no watcher thread to manage.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._catalog: Optional[Catalog] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def load(self) -> Catalog:
+        """Read the file now. Raises OSError/ValueError if it can't be used."""
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> Catalog:
+        stat = os.stat(self.path)
+        with open(self.path, "r", encoding="utf-8") as handle:
+            catalog = parse_catalog(json.load(handle))
+        self._catalog = catalog
+        self._stamp = (stat.st_mtime_ns, stat.st_size)
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+        return catalog
+
+    @property
+    def catalog(self) -> Catalog:
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return catalog
+        with self._lock:
+            if self._catalog is None:
+                return self._load()
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except OSError as exc:
+                logger.warning("Problem catalog %s unavailable, keeping the loaded one: %s", self.path, exc)
+                return self._catalog
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp != self._stamp:
+                try:
+                    self._load()
+                except (OSError, ValueError) as exc:
+                    # Half-written or broken edit: keep serving what we had,
+                    # and don't retry until the file changes again
+                    self._stamp = stamp
+                    logger.warning("Problem catalog reload failed, keeping the loaded one: %s", exc)
+            return self._catalog
+
+    def get(self, problem_id: str) -> Optional[Problem]:
+        return self.catalog.get(problem_id)
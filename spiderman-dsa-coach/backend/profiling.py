@@ -0,0 +1,105 @@
+"""Empirical complexity for /run-code's profile mode.
+
+The sandbox builds inputs of growing size itself (see the generators in
+node_worker.js and python_zygote.py, keyed by problem id) and times the
+submitted function at each size with in-process timers, stopping early once
+a size blows its budget. This module holds the size schedules and fits the
+measured times against the usual growth curves.
+
+O(n) and O(n log n) are hard to tell apart over these sizes, and cache
+misses on the largest inputs can tip linear code towards O(n log n).
+"""
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+ARRAY_SIZES = (100, 300, 1_000, 3_000, 10_000, 30_000, 100_000, 300_000, 1_000_000)
+
+# Problem id -> input sizes to try, smallest first
+PROFILE_SIZES: Dict[str, Tuple[int, ...]] = {
+    "two-sum": ARRAY_SIZES,
+    "reverse-string": ARRAY_SIZES,
+    "valid-parentheses": ARRAY_SIZES,
+    "merge-sorted-arrays": ARRAY_SIZES,
+    "max-subarray": ARRAY_SIZES,
+    "best-time-stock": ARRAY_SIZES,
+    "single-number": ARRAY_SIZES,
+    "majority-element": ARRAY_SIZES,
+    # Small steps first so exponential solutions still produce a few points
+    "climbing-stairs": (5, 10, 15, 20, 25, 30, 35, 100, 1_000, 10_000, 100_000),
+    "happy-number": tuple(10 ** k for k in range(1, 16)),
+}
+
+# Growth curves in order of preference when several fit about equally well.
+# Each maps n to log(f(n)), so exponentials don't overflow. Exponential
+# growth is tried with a few bases (naive Fibonacci grows like 1.618ⁿ) and
+# reported as O(2ⁿ) either way.
+_MODELS: List[Tuple[str, List[Callable[[float], float]]]] = [
+    ("O(1)", [lambda n: 0.0]),
+    ("O(log n)", [lambda n: math.log(math.log2(n) + 1)]),
+    ("O(n)", [lambda n: math.log(n)]),
+    ("O(n log n)", [lambda n: math.log(n) + math.log(math.log2(n) + 1)]),
+    ("O(n²)", [lambda n: 2 * math.log(n)]),
+    ("O(n³)", [lambda n: 3 * math.log(n)]),
+    ("O(2ⁿ)", [lambda n, base=base: n * math.log(base) for base in (1.5, 1.618, 2, 3)]),
+]
+
+# A simpler curve wins unless a more complex one fits this much better
+_PREFER_SIMPLER = 1.5
+
+# Times below this are mostly timer and call overhead
+MIN_SIGNIFICANT_MS = 0.005
+
+
+def has_profile(problem_id: str) -> bool:
+    return problem_id in PROFILE_SIZES
+
+
+def fit_complexity(points: Sequence[Tuple[int, float]]) -> Optional[str]:
+    """Best-fitting big-O for ``(size, milliseconds)`` measurements.
+
+    Each curve is fitted as ``t = a + c * f(n)`` (``a`` absorbs call
+    overhead) and scored by its relative error. Returns None with fewer
+    than three usable points, or when every run was too fast to tell.
+    """
+    points = [(n, t) for n, t in points if n > 0 and t > 0]
+    if len(points) < 3 or max(t for _, t in points) < MIN_SIGNIFICANT_MS * 4:
+        return None
+
+    scores = []
+    for bound, curves in _MODELS:
+        errors = [_relative_error(points, [log_f(n) for n, _ in points]) for log_f in curves]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            scores.append((bound, min(errors)))
+
+    best = min(error for _, error in scores)
+    for bound, error in scores:
+        if error <= best * _PREFER_SIMPLER + 1e-3:
+            return bound
+    return None
+
+
+def _relative_error(points: Sequence[Tuple[int, float]], log_f: Sequence[float]) -> Optional[float]:
+    """Mean squared relative error of the least-squares ``a + c * f(n)`` fit."""
+    top = max(log_f)
+    if top == 0.0:
+        mean = sum(t for _, t in points) / len(points)
+        return sum(((t - mean) / t) ** 2 for _, t in points) / len(points)
+    # Scale f so the largest value is 1; keeps 2ⁿ within float range
+    fs = [math.exp(value - top) for value in log_f]
+    ts = [t for _, t in points]
+    # Weighted least squares with weights 1/t², i.e. minimizing relative error
+    w = [1 / (t * t) for t in ts]
+    sw = sum(w)
+    sf = sum(wi * f for wi, f in zip(w, fs))
+    st = sum(wi * t for wi, t in zip(w, ts))
+    sff = sum(wi * f * f for wi, f in zip(w, fs))
+    sft = sum(wi * f * t for wi, f, t in zip(w, fs, ts))
+    det = sw * sff - sf * sf
+    if det <= 0:
+        return None
+    c = (sw * sft - sf * st) / det
+    if c <= 0:
+        return None
+    a = max(0.0, (st - c * sf) / sw)
+    return sum(((t - a - c * f) / t) ** 2 for f, t in zip(fs, ts)) / len(ts)
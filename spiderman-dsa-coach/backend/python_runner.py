@@ -0,0 +1,228 @@
+"""Python execution for /run-code, backed by a forking zygote.
+
+One long-lived ``python python_zygote.py`` process is started with the
+harness already imported. Each submission is sent to it as one
+newline-delimited JSON job; the zygote forks a child that runs under CPU,
+memory and process-count limits and answers with the same reply shape as
+the Node worker pool. Many jobs can be in flight at once, since replies
+carry the job id. If the zygote dies, or stops answering within a job's
+backstop timeout, it is killed along with its children and restarted on the
+next run.
+"""
+import itertools
+import json
+import math
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cancellation
+import metrics
+from node_pool import TIMEOUT_GRACE_SECONDS, WorkerCancelled, WorkerError, WorkerTimeout
+
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_zygote.py")
+
+
+class PythonRunner:
+    """Client for the zygote process.
+
+    ``run_timeout`` is the per-case timeout in seconds, enforced inside the
+    child, ``memory_limit_mb`` caps the child's address space (0 to leave it
+    unlimited), and ``max_output`` bounds the captured output and the result
+    of each case, in characters.
+    """
+
+    def __init__(self, run_timeout: float = 5.0, memory_limit_mb: int = 256,
+                 python_binary: str = sys.executable, max_output: int = 65536):
+        self.run_timeout = run_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_output = max_output
+        self.python_binary = python_binary
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # job id -> (zygote the job was sent to, queue its reply arrives on)
+        self._pending: Dict[int, Tuple[subprocess.Popen, "queue.Queue[Optional[Dict[str, Any]]]"]] = {}
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        """Start the zygote now so the first submission doesn't wait for it."""
+        with self._lock:
+            self._ensure_started()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            _stop(process)
+
+    def _ensure_started(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            with metrics.stage("zygote_spawn"):
+                self._process = subprocess.Popen(
+                    [self.python_binary, ZYGOTE_SCRIPT],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    bufsize=0,
+                    # Its own process group, so killing it takes the children too
+                    start_new_session=True,
+                )
+            threading.Thread(target=self._read_replies, args=(self._process,), daemon=True).start()
+        return self._process
+
+    def _read_replies(self, process: subprocess.Popen) -> None:
+        for line in process.stdout:
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            pending = self._pending.get(reply.get("id"))
+            if pending is not None:
+                pending[1].put(reply)
+        # The zygote is gone; wake everyone still waiting on it
+        with self._lock:
+            if self._process is process:
+                self._process = None
+            for sent_to, waiter in list(self._pending.values()):
+                if sent_to is process:
+                    waiter.put(None)
+
+    def run(self, code: str, candidates: List[str], inputs: List[str]) -> Dict[str, Any]:
+        """Run ``code`` against each input in a fresh forked child.
+
+        Returns ``{"ok": False, "error": ...}`` when the code could not be
+        loaded, otherwise ``{"ok": True, "results": [...]}`` with one
+        ``{"ok", "output" | "error", "time_ms", "cpu_ms", "peak_rss_kb",
+        "stdout"}`` entry per input.
+        """
+        job = {
+            "code": code,
+            "candidates": candidates,
+            "inputs": inputs,
+            "timeout_ms": int(self.run_timeout * 1000),
+            "cpu_seconds": math.ceil(self.run_timeout * (len(inputs) + 1)),
+        }
+        return self._submit(job, self.run_timeout * (len(inputs) + 1))
+
+    def run_batches(self, code: str, candidates: List[str], batches: Iterable[List[str]],
+                    max_output: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Same contract as ``NodeWorkerPool.run_batches``. Each batch is a
+        job of its own, so every batch starts from a freshly forked child."""
+        for inputs in batches:
+            job = {
+                "code": code,
+                "candidates": candidates,
+                "inputs": inputs,
+                "timeout_ms": int(self.run_timeout * 1000),
+                "cpu_seconds": math.ceil(self.run_timeout * (len(inputs) + 1)),
+            }
+            if max_output:
+                job["max_output"] = max_output
+            reply = self._submit(job, self.run_timeout * (len(inputs) + 1))
+            yield reply
+            if not reply.get("ok"):
+                return
+
+    def profile(self, code: str, candidates: List[str], generator: str, sizes: List[int],
+                budget: float, size_budget: float, min_time: float) -> Dict[str, Any]:
+        """Time ``code`` on generated inputs of growing size in one child.
+
+        Same arguments and reply as ``NodeWorkerPool.profile``.
+        """
+        job = {
+            "mode": "profile",
+            "code": code,
+            "candidates": candidates,
+            "generator": generator,
+            "sizes": sizes,
+            "timeout_ms": int(self.run_timeout * 1000),
+            "budget_ms": int(budget * 1000),
+            "size_budget_ms": size_budget * 1000,
+            "min_time_ms": min_time * 1000,
+            "cpu_seconds": math.ceil(budget + self.run_timeout) + 1,
+        }
+        return self._submit(job, budget + self.run_timeout)
+
+    def _submit(self, job: Dict[str, Any], budget: float) -> Dict[str, Any]:
+        """Send one job to the zygote and wait up to ``budget`` seconds
+        (plus grace) for its reply. If the run is cancelled meanwhile, the
+        zygote is told to kill the child."""
+        cancel = cancellation.current()
+        if cancel is not None and cancel.cancelled:
+            raise WorkerCancelled("Cancelled")
+        job_id = next(self._ids)
+        job.update(id=job_id, memory_bytes=self.memory_limit_mb * 1024 * 1024)
+        job.setdefault("max_output", self.max_output)
+        waiter: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        try:
+            with self._lock:
+                process = self._ensure_started()
+                self._pending[job_id] = (process, waiter)
+                try:
+                    process.stdin.write((json.dumps(job) + "\n").encode("utf-8"))
+                except (BrokenPipeError, OSError) as exc:
+                    raise WorkerError(f"Worker stdin closed: {exc}")
+
+            # The zygote kills the child at its own deadline; this is a backstop.
+            # Forking, loading and running all happen in the child, so they
+            # are timed as one stage
+            started = time.monotonic()
+            watch = cancel.on_cancel(lambda: self._cancel(job_id, budget - (time.monotonic() - started))) \
+                if cancel is not None else nullcontext()
+            try:
+                with watch, metrics.stage("profile" if job.get("mode") == "profile" else "execute"):
+                    reply = waiter.get(timeout=budget + 2 * TIMEOUT_GRACE_SECONDS)
+            except queue.Empty:
+                # The zygote should have answered at the job's deadline; one
+                # that didn't can't be trusted with the next job either
+                self._restart(process)
+                raise WorkerTimeout("Execution timeout")
+            if reply is None:
+                raise WorkerError("Worker exited unexpectedly")
+            if cancel is not None and cancel.cancelled:
+                raise WorkerCancelled("Cancelled")
+            return reply
+        finally:
+            self._pending.pop(job_id, None)
+
+    def _restart(self, process: subprocess.Popen) -> None:
+        """Kill ``process`` if it is still the zygote; the next run starts a new one."""
+        with self._lock:
+            if self._process is not process:
+                return
+            self._process = None
+        _kill(process)
+
+    def _cancel(self, job_id: int, budget_left: float) -> None:
+        """Have the zygote kill job ``job_id``'s child; its reply still comes."""
+        with self._lock:
+            process = self._process
+            if process is None or job_id not in self._pending:
+                return
+            try:
+                process.stdin.write((json.dumps({"op": "cancel", "id": job_id}) + "\n").encode("utf-8"))
+            except (BrokenPipeError, OSError):
+                return
+        cancellation.record_cancelled_run("python", budget_left)
+
+
+def _kill(process: subprocess.Popen) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        process.kill()
+    process.wait()
+
+
+def _stop(process: subprocess.Popen) -> None:
+    try:
+        process.stdin.close()
+        process.wait(timeout=TIMEOUT_GRACE_SECONDS)
+    except (OSError, subprocess.TimeoutExpired):
+        _kill(process)
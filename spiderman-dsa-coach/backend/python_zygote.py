@@ -0,0 +1,501 @@
+"""Zygote process for the /run-code Python runner (see python_runner.py).
+
+Started once with the harness and the modules submissions usually import
+already loaded. It reads newline-delimited JSON jobs on stdin and forks one
+child per job, so a submission starts from a warm interpreter instead of a
+cold ``python``. The child drops to the configured resource limits (CPU
+seconds, address space, file size, no new processes), runs the code in a
+fresh namespace, and streams one JSON line per test case back over a pipe,
+with the case's CPU time, peak RSS and captured output; the zygote relays
+them as a single reply line on stdout.
+
+The zygote itself stays single-threaded, which is what makes forking it safe,
+and never blocks on a child: one that closes its pipe and keeps running is
+polled until it exits, and SIGKILLed at its deadline like any other.
+"""
+import hashlib
+import json
+import os
+import resource
+import selectors
+import signal
+import sys
+import time
+import traceback
+from typing import Optional
+
+# Imported here so forked children get them for free
+import bisect  # noqa: F401
+import collections  # noqa: F401
+import functools  # noqa: F401
+import heapq  # noqa: F401
+import io
+import itertools  # noqa: F401
+import math  # noqa: F401
+import random
+import re  # noqa: F401
+import string  # noqa: F401
+import typing
+
+# Results are written as node_worker.js's JSON.stringify writes them, so
+# outputs and their digests compare the same whichever sandbox ran the code
+from comparators import canonical
+
+# Names LeetCode-style signatures use without importing them
+PRELUDE = {name: getattr(typing, name) for name in ("List", "Dict", "Set", "Tuple", "Optional", "Any")}
+
+
+class CaseTimeout(BaseException):
+    """Raised in the child when one case runs past its time limit.
+
+    Not an Exception subclass, so ``except Exception`` in user code can't
+    swallow it.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def _error_text(error: BaseException) -> str:
+    return f"Error: {type(error).__name__}: {error}" if str(error) else f"Error: {type(error).__name__}"
+
+
+class BoundedOutput(io.TextIOBase):
+    """Stand-in for stdout/stderr that keeps at most ``limit`` characters."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        room = self.limit - self.size
+        if len(text) > room:
+            text = text[:room]
+            self.truncated = True
+        if text:
+            self.parts.append(text)
+            self.size += len(text)
+        return len(text)
+
+    def take(self) -> str:
+        output = "".join(self.parts) + ("\n... output truncated" if self.truncated else "")
+        self.parts, self.size, self.truncated = [], 0, False
+        return output
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text[:limit] + "... output truncated" if len(text) > limit else text
+
+
+def _output_fields(output: str, limit: int) -> dict:
+    """Truncated output plus the SHA-256 of the whole, as node_worker.js sends it."""
+    if len(output) <= limit:
+        return {"output": output}
+    return {"output": _truncate(output, limit), "output_digest": hashlib.sha256(output.encode("utf-8")).hexdigest()}
+
+
+def _reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_kb() -> int:
+    """Peak RSS since the last reset (Linux), else since the child started."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _set_limits(job: dict) -> None:
+    cpu = max(1, int(job["cpu_seconds"]))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    memory = job.get("memory_bytes")
+    if memory:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # Writing past the limit raises OSError instead of killing the child
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (job["max_output"], job["max_output"]))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def _resolve_entry(namespace: dict, candidates):
+    for name in candidates:
+        if name and callable(namespace.get(name)) and not isinstance(namespace[name], type):
+            return namespace[name]
+    solution = namespace.get("Solution")
+    if isinstance(solution, type):
+        instance = solution()
+        for name in candidates:
+            if name and callable(getattr(instance, name, None)):
+                return getattr(instance, name)
+    return None
+
+
+def _random_ints(n: int, low: int, high: int) -> list:
+    return random.Random(n).choices(range(low, high + 1), k=n)
+
+
+# Input generators for profile mode, keyed by problem id; each returns the
+# argument list for size n (the same shapes as node_worker.js builds).
+GENERATORS = {
+    "two-sum": lambda n: [list(range(n)), 2 * n - 3],
+    "reverse-string": lambda n: [("ab" * (n // 2 + 1))[:n]],
+    "valid-parentheses": lambda n: ["(" * (n // 2) + ")" * (n // 2)],
+    "merge-sorted-arrays": lambda n: [list(range(0, n - n % 2, 2)), list(range(1, n + n % 2, 2))],
+    "max-subarray": lambda n: [_random_ints(n, -100, 100)],
+    "best-time-stock": lambda n: [_random_ints(n, 0, 9999)],
+    "single-number": lambda n: [[i // 2 for i in range((n | 1) - 1)] + [-1]],
+    "majority-element": lambda n: [[i if i % 3 == 0 else 7 for i in range(n)]],
+    "climbing-stairs": lambda n: [n],
+    "happy-number": lambda n: [n],
+}
+
+
+def _predicted_ms(points: list, n: int) -> float:
+    """Time for size n extrapolated from the growth between the last two points."""
+    if len(points) < 2:
+        return 0.0
+    a, b = points[-2:]
+    if a["time_ms"] <= 0 or b["time_ms"] <= 0:
+        return b["time_ms"]
+    growth = math.log(b["time_ms"] / a["time_ms"]) / math.log(b["size"] / a["size"])
+    return b["time_ms"] * (n / b["size"]) ** growth if growth > 0 else b["time_ms"]
+
+
+def _profile(job: dict, entry, send) -> None:
+    """Time ``entry`` on generated inputs of each size, streaming one point
+    per size and a final ``done`` message."""
+    generate = GENERATORS.get(job["generator"])
+    if generate is None:
+        send({"done": True, "cut_off": False, "error": "No input generator for " + job["generator"]})
+        return
+    sizes = job["sizes"]
+    timeout = job["timeout_ms"] / 1000
+    min_time = job["min_time_ms"] / 1000
+    deadline = time.monotonic() + job["budget_ms"] / 1000
+
+    def timed_batch(batch, limit):
+        signal.setitimer(signal.ITIMER_REAL, limit)
+        try:
+            started = time.perf_counter()
+            for args in batch:
+                entry(*args)
+            return time.perf_counter() - started
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    try:
+        timed_batch([generate(sizes[0]) for _ in range(16)], timeout)
+    except BaseException:
+        pass  # reported by the timed runs
+
+    points = []
+    cut_off = False
+    error = None
+    for index, size in enumerate(sizes):
+        best = math.inf
+        total = 0.0
+        reps = 0
+        batch_size = 1
+        round_ = 0
+        while round_ == 0 or (total < min_time and round_ < 20):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                cut_off = True
+                break
+            batch = [generate(size) for _ in range(batch_size)]
+            try:
+                elapsed = timed_batch(batch, min(timeout, remaining))
+            except CaseTimeout:
+                cut_off = True
+                break
+            except BaseException as e:
+                cut_off = True
+                error = _truncate(_error_text(e), job["max_output"])
+                break
+            best = min(best, elapsed / batch_size)
+            total += elapsed
+            reps += batch_size
+            round_ += 1
+            if elapsed < min_time / 4:
+                batch_size = min(batch_size * 4, 1024)
+        if reps:
+            points.append({"size": size, "time_ms": best * 1000, "reps": reps})
+            send(points[-1])
+        if cut_off:
+            break
+        if index + 1 < len(sizes) and (best * 1000 > job["size_budget_ms"] or
+                                       _predicted_ms(points, sizes[index + 1]) > (deadline - time.monotonic()) * 1000):
+            cut_off = True
+            break
+    send({"done": True, "cut_off": cut_off, "error": error})
+
+
+def _run_child(job: dict, out) -> None:
+    """Body of the forked child; never returns."""
+    def send(message):
+        out.write(json.dumps(message) + "\n")
+        out.flush()
+
+    signal.signal(signal.SIGALRM, _on_alarm)
+    timeout = job["timeout_ms"] / 1000
+    max_output = job["max_output"]
+    sys.stdout = sys.stderr = captured = BoundedOutput(max_output)
+
+    namespace = {"__name__": "solution", "__builtins__": __builtins__, **PRELUDE}
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        exec(compile(job["code"], "solution.py", "exec"), namespace)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        entry = _resolve_entry(namespace, job["candidates"])
+    except CaseTimeout:
+        send({"ok": False, "error": "Execution timeout"})
+        os._exit(0)
+    except BaseException as e:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        send({"ok": False, "error": _truncate(_error_text(e), max_output)})
+        os._exit(0)
+
+    if entry is None:
+        send({"ok": False, "error": "Error: Function not found. Expected one of: " + ", ".join(job["candidates"])})
+        os._exit(0)
+    send({"ok": True})
+
+    if job.get("mode") == "profile":
+        _profile(job, entry, send)
+        captured.take()
+        os._exit(0)
+
+    for test_input in job["inputs"]:
+        captured.take()
+        _reset_peak_rss()
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+
+        def usage():
+            return {
+                "time_ms": (time.perf_counter() - started) * 1000,
+                "cpu_ms": (time.process_time() - cpu_started) * 1000,
+                "peak_rss_kb": _peak_rss_kb(),
+                "stdout": captured.take(),
+            }
+
+        try:
+            args = json.loads("[" + test_input + "]")
+        except ValueError as e:
+            send({"ok": False, "error": f"Error: Failed to parse inputs: {e}", **usage()})
+            continue
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            result = entry(*args)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            output = "" if result is None else canonical(result)
+            send({"ok": True, **_output_fields(output, max_output), **usage()})
+        except CaseTimeout:
+            send({"ok": False, "error": "Execution timeout", **usage()})
+        except BaseException as e:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            send({"ok": False, "error": _truncate(_error_text(e), max_output), **usage()})
+    os._exit(0)
+
+
+def _fork(job: dict):
+    """Fork a child for ``job``; returns its pid and the read end of its result pipe."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):  # print() from user code goes nowhere
+                os.dup2(devnull, fd)
+            # Don't leak other jobs' pipes (or the zygote's own) into the child
+            os.closerange(3, write_fd)
+            os.closerange(write_fd + 1, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+            _set_limits(job)
+            _run_child(job, os.fdopen(write_fd, "w"))
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(1)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+# How often children that closed their pipe are checked for having exited
+REAP_INTERVAL = 0.005
+
+
+class Job:
+    __slots__ = ("id", "pid", "fd", "deadline", "output", "size", "max_size", "cases", "profile", "killed")
+
+    def __init__(self, job_id, pid, fd, deadline, cases, max_output, profile=False):
+        self.id = job_id
+        self.profile = profile
+        self.pid = pid
+        self.fd = fd
+        self.deadline = deadline
+        self.output = []
+        self.size = 0
+        # Every case's result and console output, JSON-escaped at worst
+        self.max_size = (cases + 1) * (12 * max_output + 1024)
+        self.cases = cases
+        # Set once the zygote has SIGKILLed the child, to the error to report
+        self.killed: Optional[str] = None
+
+
+def _reply(job: Job, status: int) -> dict:
+    """Reply for a reaped child from whatever it managed to send.
+
+    ``job.killed`` is the error to report for the cases the child never
+    finished when the zygote had to kill it.
+    """
+    killed = job.killed
+    messages = []
+    for line in b"".join(job.output).decode("utf-8", "replace").splitlines():
+        try:
+            messages.append(json.loads(line))
+        except ValueError:
+            break
+
+    if killed:
+        missing = killed
+    elif os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+        missing = "Execution timeout"
+    elif os.WIFSIGNALED(status):
+        missing = f"Error: Process killed by signal {os.WTERMSIG(status)}"
+    else:
+        missing = f"Error: Process exited with status {os.WEXITSTATUS(status)}"
+
+    if not messages:
+        return {"id": job.id, "ok": False, "error": missing}
+    loaded, results = messages[0], messages[1:]
+    if not loaded.get("ok"):
+        return {"id": job.id, **loaded}
+    if job.profile:
+        points = [message for message in results if "size" in message]
+        done = next((message for message in results if message.get("done")), None)
+        if done is None:
+            # Killed mid-profile: what was measured still counts
+            done = {"cut_off": True, "error": None if missing == "Execution timeout" else missing}
+        return {"id": job.id, "ok": True, "points": points, "cut_off": done["cut_off"], "error": done["error"]}
+    results += [{"ok": False, "error": missing}] * (job.cases - len(results))
+    return {"id": job.id, "ok": True, "results": results[:job.cases]}
+
+
+def main() -> None:
+    selector = selectors.DefaultSelector()
+    selector.register(sys.stdin, selectors.EVENT_READ, None)
+    jobs = {}
+    buffer = b""
+
+    def send(message):
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+    def reap(job: Job) -> None:
+        """Reply for ``job`` if its child has exited; never waits for it."""
+        try:
+            pid, status = os.waitpid(job.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = job.pid, 0
+        if pid == 0:
+            return
+        del jobs[job.pid]
+        send(_reply(job, status))
+
+    def finish(job: Job, killed: Optional[str] = None):
+        """Stop reading ``job``'s pipe (and kill its child if ``killed``)."""
+        if job.fd is not None:
+            selector.unregister(job.fd)
+            os.close(job.fd)
+            job.fd = None
+        if killed and job.killed is None:
+            job.killed = killed
+            try:
+                os.kill(job.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        reap(job)
+
+    stdin_open = True
+    while stdin_open or jobs:
+        now = time.monotonic()
+        # Past its deadline a killed child only has to be reaped
+        deadline = min((job.deadline for job in jobs.values() if job.killed is None), default=None)
+        timeout = None if deadline is None else max(0.0, deadline - now)
+        if any(job.fd is None for job in jobs.values()):
+            timeout = REAP_INTERVAL if timeout is None else min(timeout, REAP_INTERVAL)
+        for key, _ in selector.select(timeout):
+            if key.data is None:
+                chunk = os.read(sys.stdin.fileno(), 65536)
+                if not chunk:
+                    selector.unregister(sys.stdin)
+                    stdin_open = False
+                    continue
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        send({"id": None, "ok": False, "error": "Malformed job"})
+                        continue
+                    if request.get("op") == "ping":
+                        send({"id": request.get("id"), "ok": True})
+                        continue
+                    if request.get("op") == "cancel":
+                        # Nobody wants the result any more; a job that already
+                        # finished is simply not found
+                        job = next((job for job in jobs.values() if job.id == request.get("id")), None)
+                        if job is not None:
+                            finish(job, "Cancelled")
+                        continue
+                    pid, fd = _fork(request)
+                    profile = request.get("mode") == "profile"
+                    cases = len(request["sizes"] if profile else request["inputs"])
+                    if profile:
+                        budget = request["budget_ms"] / 1000 + request["timeout_ms"] / 1000 + 0.5
+                    else:
+                        budget = request["timeout_ms"] / 1000 * (cases + 1) + 0.5
+                    job = Job(request.get("id"), pid, fd, time.monotonic() + budget, cases,
+                              request["max_output"], profile)
+                    jobs[pid] = job
+                    selector.register(fd, selectors.EVENT_READ, job)
+            else:
+                job = key.data
+                data = os.read(job.fd, 65536)
+                if not data:
+                    finish(job)
+                    continue
+                job.output.append(data)
+                job.size += len(data)
+                if job.size > job.max_size:
+                    finish(job, "Error: Output limit exceeded")
+        now = time.monotonic()
+        for job in list(jobs.values()):
+            if job.killed is None and job.deadline <= now:
+                finish(job, "Execution timeout")
+            elif job.fd is None:
+                reap(job)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Opt-in stack profiles of slow requests.
+
+A request picked for profiling (by header or at random, see main.py) gets a
+``Recording``. While any recording is open, one background thread samples
+the stack of every thread in the process every few milliseconds and adds it
+to each open recording as a collapsed ("folded") stack, rooted at the thread
+name. The event loop is shared, so a recording also sees whatever other
+requests were doing at the time; the sandbox threads are named ``sandbox_N``.
+
+Node workers are asked for a V8 CPU profile of each op they run for a
+recorded request. The profiles come back in the reply, in the same format
+``node --cpu-prof`` writes (``--cpu-prof`` itself only writes on exit,
+which warm workers never do).
+
+Recordings of slow requests are kept in a ``ProfileStore``: a directory of
+JSON files bounded in count and bytes, oldest dropped first.
+"""
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "request_profiles")
+
+# Most Node CPU profiles kept per recording (a hidden suite runs many batches)
+MAX_NODE_PROFILES = 16
+
+_ids = itertools.count(1)
+_ID = re.compile(r"^\d+-\d+-\d+$")
+
+
+def new_id() -> str:
+    """Unique and, as a string, increasing in time (millisecond clock first)."""
+    return f"{int(time.time() * 1000)}-{os.getpid()}-{next(_ids)}"
+
+
+class Recording:
+    """Samples and Node profiles gathered for one request."""
+
+    __slots__ = ("id", "forced", "started_at", "ticks", "stacks", "node_profiles", "_lock")
+
+    def __init__(self, forced: bool = False):
+        self.id = new_id()
+        self.forced = forced
+        self.started_at = time.time()
+        self.ticks = 0
+        self.stacks: Dict[str, int] = {}
+        self.node_profiles: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_samples(self, stacks: List[str]) -> None:
+        self.ticks += 1
+        for stack in stacks:
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def add_node_profile(self, op: str, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.node_profiles) < MAX_NODE_PROFILES:
+                self.node_profiles.append({"op": op, "profile": profile})
+
+
+class StackSampler:
+    """Samples all thread stacks every ``interval`` seconds while at least
+    one recording is open. The thread is started on first use and sleeps
+    while nothing is being recorded."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._open: List[Recording] = []
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+
+    def begin(self, forced: bool = False) -> Recording:
+        recording = Recording(forced)
+        with self._lock:
+            self._open.append(recording)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+        return recording
+
+    def end(self, recording: Recording) -> None:
+        with self._lock:
+            if recording in self._open:
+                self._open.remove(recording)
+            if not self._open:
+                self._wake.clear()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            started = time.perf_counter()
+            stacks = self._sample(me)
+            with self._lock:
+                for recording in self._open:
+                    recording.add_samples(stacks)
+            time.sleep(max(0.0, self.interval - (time.perf_counter() - started)))
+
+    def _sample(self, skip: int) -> List[str]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            stacks.append(";".join(reversed(frames)))
+        return stacks
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            # ';' separates frames in the folded format
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+
+# The recording of the request being handled, if it is profiled. Sandbox
+# threads run in a copy of the request's context, so they see it too.
+_current: ContextVar[Optional[Recording]] = ContextVar("request_recording", default=None)
+
+
+def current() -> Optional[Recording]:
+    return _current.get()
+
+
+@contextmanager
+def recording_as_current(recording: Optional[Recording]) -> Iterator[Optional[Recording]]:
+    token = _current.set(recording)
+    try:
+        yield recording
+    finally:
+        _current.reset(token)
+
+
+def folded(stacks: Dict[str, int]) -> str:
+    """Collapsed-stack text, as read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+class ProfileStore:
+    """Saved recordings, at most ``max_profiles`` files and ``max_bytes`` in
+    total; saving past either limit deletes the oldest.
+
+    Each file holds a summary line and then the profile itself, so listing
+    the store (and rebuilding the index on startup) only reads summaries.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_profiles: int = 50, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_profiles = max(1, max_profiles)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # id -> (summary, file size), oldest first
+        self._index: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._load_index()
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, profile_id + ".json")
+
+    def _load_index(self) -> None:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return
+        for name in names:
+            profile_id = name[:-len(".json")]
+            if not name.endswith(".json") or not _ID.match(profile_id):
+                continue
+            path = self._path(profile_id)
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    summary = json.loads(handle.readline())
+                self._index[profile_id] = (summary, os.path.getsize(path))
+            except (OSError, ValueError):
+                continue
+        self._evict()
+
+    def save(self, summary: Dict[str, Any], body: Dict[str, Any]) -> None:
+        profile_id = summary["id"]
+        data = (json.dumps(summary) + "\n" + json.dumps(body, separators=(",", ":")) + "\n").encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile_id)
+        temp = f"{path}.tmp"
+        with open(temp, "wb") as out:
+            out.write(data)
+        os.replace(temp, path)
+        with self._lock:
+            self._index[profile_id] = (summary, len(data))
+            self._evict()
+
+    def _evict(self) -> None:
+        total = sum(size for _, size in self._index.values())
+        while self._index and (len(self._index) > self.max_profiles or total > self.max_bytes):
+            profile_id, (_, size) = self._index.popitem(last=False)
+            total -= size
+            try:
+                os.remove(self._path(profile_id))
+            except OSError:
+                pass
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Summaries of the saved profiles, newest first."""
+        with self._lock:
+            return [summary for summary, _ in reversed(self._index.values())]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """The saved profile (summary fields plus ``python`` and ``node``), or None."""
+        if not _ID.match(profile_id) or profile_id not in self._index:
+            return None
+        try:
+            with open(self._path(profile_id), "r", encoding="utf-8") as handle:
+                summary = json.loads(handle.readline())
+                return {**summary, **json.loads(handle.readline())}
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,506 @@
+"""Running submissions in the sandboxes, for /run-code and the /jobs queue.
+
+Holds the Node and Python sandboxes, the fair scheduler in front of them,
+the run cache and the job queue, and everything from a RunCodeRequest to
+its RunCodeResponse. main.py serves this over HTTP; job_worker.py imports
+it alone, so a worker needs neither the API nor a Gemini key.
+"""
+import asyncio
+import contextvars
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+import admission
+import cancellation
+import metrics
+import problems
+import profiling
+from admission import FairScheduler, SchedulerFull
+from cache import LRUTTLCache, content_key, normalize_code
+from comparators import EXACT, Comparator
+from jobs import MemoryJobQueue, SqliteJobQueue
+from node_pool import NodeWorkerPool, WorkerMemoryLimit, WorkerTimeout
+from problems import ProblemRegistry, TestCaseSpec
+from python_runner import PythonRunner
+
+load_dotenv()
+
+# Queued submissions by what became of them
+JOBS = metrics.REGISTRY.counter(
+    "jobs_total", "/jobs submissions by outcome (submitted, rejected, done, failed, lost)", ("outcome",)
+)
+
+# Sandbox runs in flight at once. The scheduler's slots, the executor threads
+# that drive the runs and the Node workers are all this many, so a run the
+# scheduler admits never queues again behind a thread or a worker and all the
+# waiting happens (and is measured) in the fair queue.
+SANDBOX_SLOTS = max(1, int(os.getenv("SANDBOX_MAX_PROCS_PER_CORE", "1")) * (os.cpu_count() or 1))
+
+# Node.js workers for /run-code, started ahead of the submissions they run
+node_pool = NodeWorkerPool(
+    size=SANDBOX_SLOTS,
+    run_timeout=float(os.getenv("NODE_RUN_TIMEOUT", "5")),
+    memory_limit_mb=int(os.getenv("NODE_MEMORY_LIMIT_MB", "2048")),
+    max_heap_mb=int(os.getenv("NODE_MAX_HEAP_MB", "256")),
+    cpu_limit_seconds=int(os.getenv("NODE_CPU_LIMIT_SECONDS", "60")),
+    max_output=int(os.getenv("SANDBOX_MAX_OUTPUT", "65536")),
+    max_runs_per_worker=int(os.getenv("NODE_WORKER_MAX_RUNS", "1")),
+)
+
+# Blocking sandbox work runs on this executor so it never stalls the event
+# loop; one thread per slot.
+sandbox_executor = ThreadPoolExecutor(max_workers=SANDBOX_SLOTS, thread_name_prefix="sandbox")
+
+# Global cap on sandbox executions in flight across all requests, shared
+# round-robin between clients, and the most a single submission may fan out
+# its test cases.
+sandbox_scheduler = FairScheduler(
+    slots=SANDBOX_SLOTS,
+    max_queued=int(os.getenv("SANDBOX_MAX_QUEUED", "256")),
+    max_queued_per_client=int(os.getenv("SANDBOX_MAX_QUEUED_PER_CLIENT", "16")),
+)
+RUN_CODE_MAX_PARALLEL = int(os.getenv("RUN_CODE_MAX_PARALLEL", "4"))
+
+# Finished /run-code responses keyed on (normalized code, problem, language, test suite)
+run_cache = LRUTTLCache(
+    max_entries=int(os.getenv("RUN_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RUN_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    ttl=float(os.getenv("RUN_CACHE_TTL", "600")),
+    db_path=os.getenv("RUN_CACHE_DB") or None,
+    max_disk_entries=int(os.getenv("RUN_CACHE_DB_MAX_ENTRIES", "10000")),
+)
+
+# Python submissions run in children forked from a warm zygote process
+python_runner = PythonRunner(
+    run_timeout=float(os.getenv("PYTHON_RUN_TIMEOUT", "5")),
+    memory_limit_mb=int(os.getenv("PYTHON_MEMORY_LIMIT_MB", "256")),
+    max_output=int(os.getenv("SANDBOX_MAX_OUTPUT", "65536")),
+)
+
+# Queue behind POST /jobs: in memory, or in a sqlite file (JOB_QUEUE_DB)
+# shared with job_worker.py processes. JOB_WORKERS is how many jobs this
+# process runs at once (0 leaves them all to separate workers). A worker
+# renews its job's lease a few times per JOB_LEASE_SECONDS while it runs.
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB") or None
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+JOB_TTL = float(os.getenv("JOB_TTL", "600"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+if JOB_QUEUE_DB:
+    job_queue = SqliteJobQueue(JOB_QUEUE_DB, max_queued=JOB_MAX_QUEUED, ttl=JOB_TTL, lease=JOB_LEASE_SECONDS)
+else:
+    job_queue = MemoryJobQueue(max_queued=JOB_MAX_QUEUED, ttl=JOB_TTL)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS") or SANDBOX_SLOTS)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.05"))
+
+# Profile mode: total time for one submission's growth measurements, the
+# slowest single size before stopping, and the least time measured per size
+PROFILE_BUDGET_SECONDS = float(os.getenv("PROFILE_BUDGET_SECONDS", "4"))
+PROFILE_SIZE_BUDGET_SECONDS = float(os.getenv("PROFILE_SIZE_BUDGET_SECONDS", "1"))
+PROFILE_MIN_TIME_SECONDS = float(os.getenv("PROFILE_MIN_TIME_SECONDS", "0.002"))
+
+# Problems and their test cases, from the catalog file shared with the
+# frontend; edits to the file are picked up without a restart
+problem_registry = ProblemRegistry(
+    path=os.getenv("PROBLEMS_FILE") or problems.DEFAULT_PATH,
+    check_interval=float(os.getenv("PROBLEMS_RELOAD_INTERVAL", "2")),
+)
+
+class TestCase(BaseModel):
+    input: str
+    expected: str
+    description: str
+
+class RunCodeRequest(BaseModel):
+    code: str
+    language: str
+    problem_id: str
+    test_cases: List[TestCase]
+    parallel: bool = False
+    max_parallel: Optional[int] = None
+    profile: bool = False
+    # A newer request with the same session id cancels this one
+    session_id: Optional[str] = None
+
+class TestResult(BaseModel):
+    test_case: int
+    input: str
+    expected: str
+    actual: str
+    passed: bool
+    error: Optional[str] = None
+    # Measured in the sandbox: wall and CPU seconds, peak resident set size,
+    # and console output (capped at SANDBOX_MAX_OUTPUT characters)
+    execution_time: Optional[float] = None
+    cpu_time: Optional[float] = None
+    peak_rss_kb: Optional[int] = None
+    stdout: Optional[str] = None
+
+class ProfilePoint(BaseModel):
+    size: int
+    time_ms: float
+    reps: int
+
+class ProfileReport(BaseModel):
+    # Best-fitting growth curve, or None when there was too little signal
+    complexity: Optional[str] = None
+    points: List[ProfilePoint] = []
+    cut_off: bool = False
+    error: Optional[str] = None
+
+class RunCodeResponse(BaseModel):
+    results: List[TestResult]
+    overall_passed: bool
+    execution_time: float
+    cached: bool = False
+    profile: Optional[ProfileReport] = None
+
+# Code execution functions
+DEFAULT_TEST_CASES = (TestCaseSpec(input="[1, 2, 3]", expected="[0, 1]", description="Sample test case"),)
+
+def _comparator_for(problem_id: str) -> Comparator:
+    problem = problem_registry.get(problem_id)
+    return problem.comparator if problem is not None else EXACT
+
+def get_test_cases_for_problem(problem_id: str) -> Sequence[TestCaseSpec]:
+    """Get test cases for a specific problem"""
+    problem = problem_registry.get(problem_id)
+    if problem is None or not problem.test_cases:
+        return DEFAULT_TEST_CASES
+    return problem.test_cases
+
+# Fingerprint of the fallback cases, for problems the catalog has no cases for
+DEFAULT_SUITE_VERSION = content_key(*(f"{tc.input}\0{tc.expected}" for tc in DEFAULT_TEST_CASES))
+
+def _suite_version(problem_id: str) -> str:
+    """Fingerprint of what a submission is graded with (test cases and
+    compare rule), so edits to either miss the cache"""
+    problem = problem_registry.get(problem_id)
+    if problem is None:
+        return content_key(DEFAULT_SUITE_VERSION, EXACT.spec)
+    suite = problem.suite_version if problem.test_cases else DEFAULT_SUITE_VERSION
+    return content_key(suite, problem.comparator.spec)
+
+def _run_cache_key(request: "RunCodeRequest") -> str:
+    language = request.language.lower()
+    parts = [normalize_code(request.code, language), request.problem_id, language, _suite_version(request.problem_id)]
+    if request.profile:
+        parts.append("profile")
+    return content_key(*parts)
+
+def _is_load_dependent(error: Optional[str]) -> bool:
+    return bool(error) and (error == "Execution timeout" or error.startswith("Worker"))
+
+def _is_cacheable(results: List[TestResult], profile: Optional["ProfileReport"] = None) -> bool:
+    """Timeouts and worker failures depend on load, so they are never cached"""
+    if profile is not None and _is_load_dependent(profile.error):
+        return False
+    return not any(_is_load_dependent(result.error) for result in results)
+
+def _function_name_candidates(problem_id: str) -> List[str]:
+    tokens = re.split(r'[-_\s]+', problem_id)
+    tokens = [token for token in tokens if token]
+    if not tokens:
+        return [problem_id]
+
+    sanitized = ''.join(tokens)
+    camel = tokens[0].lower() + ''.join(token.capitalize() for token in tokens[1:])
+    pascal = ''.join(token.capitalize() for token in tokens)
+    snake = '_'.join(tokens)
+
+    candidates = [
+        sanitized,
+        camel,
+        pascal,
+        snake,
+        problem_id.replace('-', ''),
+        problem_id,
+    ]
+
+    # Preserve order but remove duplicates
+    seen = set()
+    unique_candidates = []
+    for name in candidates:
+        if name and name not in seen:
+            seen.add(name)
+            unique_candidates.append(name)
+    return unique_candidates
+
+
+def _usage(outcome: Dict[str, Any]) -> Dict[str, Any]:
+    """Resource usage the sandbox measured for one case"""
+    return {
+        "execution_time": outcome["time_ms"] / 1000 if "time_ms" in outcome else None,
+        "cpu_time": outcome["cpu_ms"] / 1000 if "cpu_ms" in outcome else None,
+        "peak_rss_kb": outcome.get("peak_rss_kb"),
+    }
+
+def _case_result(index: int, test_case: TestCaseSpec, outcome: Dict[str, Any],
+                 comparator: Comparator = EXACT) -> TestResult:
+    """Turn one per-case entry from a sandbox reply into a TestResult"""
+    usage = {**_usage(outcome), "stdout": outcome.get("stdout") or None}
+
+    if outcome.get("ok"):
+        actual_output = outcome.get("output", "").strip()
+        passed = comparator.matches(actual_output, test_case.expected_output, outcome.get("output_digest"),
+                                    test_case.input)
+
+        return TestResult(
+            test_case=index,
+            input=test_case.input,
+            expected=test_case.expected,
+            actual=actual_output,
+            passed=passed,
+            **usage
+        )
+
+    return TestResult(
+        test_case=index,
+        input=test_case.input,
+        expected=test_case.expected,
+        actual="",
+        passed=False,
+        error=outcome.get("error") or 'Execution failed',
+        **usage
+    )
+
+def execute_javascript_tests(code: str, test_cases: Sequence[TestCaseSpec], problem_id: str) -> List[TestResult]:
+    """Execute JavaScript code against all test cases in a single sandbox run.
+
+    The code is loaded once and each input is called against the resolved
+    function, so an error in one case doesn't affect the others.
+    """
+    return _sandbox_results(node_pool.run, code, test_cases, problem_id)
+
+def execute_python_tests(code: str, test_cases: Sequence[TestCaseSpec], problem_id: str) -> List[TestResult]:
+    """Execute Python code against all test cases in one forked child.
+
+    Inputs are parsed as JSON, the entry point is a top-level function or a
+    method of a ``Solution`` class, and results are compared as JSON.
+    """
+    return _sandbox_results(python_runner.run, code, test_cases, problem_id)
+
+def _sandbox_results(run, code: str, test_cases: Sequence[TestCaseSpec], problem_id: str) -> List[TestResult]:
+    try:
+        reply = run(code, _function_name_candidates(problem_id), [tc.input for tc in test_cases])
+        if reply.get("ok"):
+            outcomes = reply["results"]
+        else:
+            # Loading the code failed, so every case fails the same way
+            outcomes = [reply] * len(test_cases)
+    except WorkerTimeout:
+        outcomes = [{"ok": False, "error": "Execution timeout"}] * len(test_cases)
+    except Exception as e:
+        outcomes = [{"ok": False, "error": str(e)}] * len(test_cases)
+
+    comparator = _comparator_for(problem_id)
+    with metrics.stage("compare"):
+        return [
+            _case_result(i + 1, test_case, outcome, comparator)
+            for i, (test_case, outcome) in enumerate(zip(test_cases, outcomes))
+        ]
+
+def profile_solution(profile, code: str, problem_id: str) -> ProfileReport:
+    """Time a solution on generated inputs of growing size and fit its growth"""
+    try:
+        reply = profile(
+            code,
+            _function_name_candidates(problem_id),
+            problem_id,
+            list(profiling.PROFILE_SIZES[problem_id]),
+            PROFILE_BUDGET_SECONDS,
+            PROFILE_SIZE_BUDGET_SECONDS,
+            PROFILE_MIN_TIME_SECONDS,
+        )
+    except (WorkerTimeout, WorkerMemoryLimit) as e:
+        return ProfileReport(cut_off=True, error=str(e))
+    except Exception as e:
+        return ProfileReport(error=str(e))
+    if not reply.get("ok"):
+        return ProfileReport(error=reply.get("error") or "Execution failed")
+
+    points = [ProfilePoint(**point) for point in reply["points"]]
+    return ProfileReport(
+        complexity=profiling.fit_complexity([(point.size, point.time_ms) for point in points]),
+        points=points,
+        cut_off=reply.get("cut_off", False),
+        error=reply.get("error"),
+    )
+
+def execute_javascript_code(code: str, test_case: TestCase, problem_id: str) -> TestResult:
+    """Execute JavaScript code with a single test case"""
+    return execute_javascript_tests(code, [test_case], problem_id)[0]
+
+async def run_in_sandbox(func, *args):
+    """Run a blocking sandbox call on the executor once the scheduler gives
+    the request's client a slot. Cancelling the caller stops the run."""
+    queued = time.perf_counter()
+    async with sandbox_scheduler.slot(admission.current_client()):
+        # The request's context goes along so stages timed in the thread count
+        context = contextvars.copy_context()
+        cancel = cancellation.Cancellation()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                sandbox_executor, context.run, _run_dequeued, queued, cancel, func, *args
+            )
+        except asyncio.CancelledError:
+            cancel.cancel()
+            raise
+
+def _run_dequeued(queued: float, cancel: cancellation.Cancellation, func, *args):
+    metrics.observe_stage("sandbox_queue", time.perf_counter() - queued)
+    with cancellation.cancellation_as_current(cancel):
+        return func(*args)
+
+async def run_tests(execute, code: str, test_cases: Sequence[TestCaseSpec], problem_id: str,
+                    parallelism: int = 1) -> List[TestResult]:
+    """Run a submission's test cases, optionally fanned out over several workers.
+
+    Cases are split into contiguous chunks, one sandbox run per chunk, and the
+    results are stitched back together in the original order.
+    """
+    parallelism = max(1, min(parallelism, len(test_cases)))
+    if parallelism == 1:
+        return await run_in_sandbox(execute, code, test_cases, problem_id)
+
+    chunk_size = -(-len(test_cases) // parallelism)
+    chunks = [test_cases[i:i + chunk_size] for i in range(0, len(test_cases), chunk_size)]
+    chunk_results = await asyncio.gather(*(
+        run_in_sandbox(execute, code, chunk, problem_id) for chunk in chunks
+    ))
+
+    results = [result for chunk in chunk_results for result in chunk]
+    for i, result in enumerate(results):
+        result.test_case = i + 1
+    return results
+
+SANDBOX_EXECUTORS = {
+    "javascript": execute_javascript_tests,
+    "python": execute_python_tests,
+}
+
+SANDBOX_BATCH_RUNNERS = {
+    "javascript": node_pool.run_batches,
+    "python": python_runner.run_batches,
+}
+
+SANDBOX_PROFILERS = {
+    "javascript": node_pool.profile,
+    "python": python_runner.profile,
+}
+
+async def run_submission(request: RunCodeRequest) -> RunCodeResponse:
+    """Run a submission's test cases (and profile it if asked), for /run-code and /jobs"""
+    start_time = time.time()
+
+    # Get test cases for the problem
+    test_cases = get_test_cases_for_problem(request.problem_id)
+
+    cache_key = _run_cache_key(request)
+    cached = await run_cache.aget(cache_key)
+    if cached is not None:
+        response = RunCodeResponse.model_validate_json(cached)
+        response.cached = True
+        return response
+    
+    execute = SANDBOX_EXECUTORS.get(request.language.lower())
+    if execute is not None:
+        parallelism = 1
+        if request.parallel:
+            parallelism = min(request.max_parallel or RUN_CODE_MAX_PARALLEL, RUN_CODE_MAX_PARALLEL)
+        results = await run_tests(execute, request.code, test_cases, request.problem_id, parallelism)
+    else:
+        # For other languages, return a placeholder result
+        results = [
+            TestResult(
+                test_case=i + 1,
+                input=test_case.input,
+                expected=test_case.expected,
+                actual="Language not yet supported",
+                passed=False,
+                error=f"Language {request.language} execution not implemented yet"
+            )
+            for i, test_case in enumerate(test_cases)
+        ]
+
+    overall_passed = all(result.passed for result in results)
+
+    profile = None
+    if request.profile:
+        profiler = SANDBOX_PROFILERS.get(request.language.lower())
+        if profiler is None or not profiling.has_profile(request.problem_id):
+            profile = ProfileReport(error=f"Profiling is not available for {request.problem_id} in {request.language}")
+        elif not overall_passed:
+            # Timing a wrong answer says nothing about the solution
+            profile = ProfileReport(error="Profiling runs once all test cases pass")
+        else:
+            profile = await run_in_sandbox(profile_solution, profiler, request.code, request.problem_id)
+    
+    execution_time = time.time() - start_time
+    
+    response = RunCodeResponse(
+        results=results,
+        overall_passed=overall_passed,
+        execution_time=execution_time,
+        profile=profile,
+    )
+    if _is_cacheable(results, profile):
+        await run_cache.aset(cache_key, response.model_dump_json())
+    return response
+
+class LeaseLost(Exception):
+    """The queue no longer has the job down as running on this worker."""
+
+async def consume_jobs(worker: str) -> None:
+    """Run queued /jobs submissions one at a time until cancelled.
+
+    The job's lease is renewed while it runs, however long it waits for a
+    sandbox. A job that was running when its worker stopped stays claimed;
+    with the sqlite queue it is handed out again when its lease runs out.
+    """
+    while True:
+        job = await asyncio.to_thread(job_queue.claim, worker)
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+        metrics.observe_stage("job_queue_wait", max(0.0, job.started_at - job.created_at))
+        with admission.acting_as(job.owner):
+            run = asyncio.create_task(_run_job(RunCodeRequest.model_validate_json(job.payload)))
+        try:
+            response = await _hold_lease(job.id, worker, run)
+        except LeaseLost:
+            # Another worker has the job now, or it was given up on
+            JOBS.inc(outcome="lost")
+        except Exception as e:
+            JOBS.inc(outcome="failed")
+            await asyncio.to_thread(job_queue.fail, job.id, f"Code execution failed: {str(e)}")
+        else:
+            JOBS.inc(outcome="done")
+            await asyncio.to_thread(job_queue.complete, job.id, response.model_dump_json())
+
+async def _hold_lease(job_id: str, worker: str, run: asyncio.Task):
+    """Await ``run``, renewing the job's lease every third of it; the run
+    is cancelled if the lease turns out to be lost, or if this is."""
+    try:
+        while True:
+            done, _ = await asyncio.wait((run,), timeout=JOB_LEASE_SECONDS / 3)
+            if done:
+                return run.result()
+            if not await asyncio.to_thread(job_queue.renew, job_id, worker):
+                raise LeaseLost(job_id)
+    finally:
+        run.cancel()
+
+async def _run_job(request: RunCodeRequest) -> RunCodeResponse:
+    # A job was already admitted when it was queued, so when the sandbox
+    # queues are full it waits its turn rather than being shed
+    while True:
+        try:
+            return await run_submission(request)
+        except SchedulerFull as e:
+            await asyncio.sleep(e.retry_after)
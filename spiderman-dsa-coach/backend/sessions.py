@@ -0,0 +1,200 @@
+"""Editor sessions for incremental /analyze.
+
+The editor keeps one session per buffer. After the first full upload it
+only sends the edits made since the version it last saw; the server applies
+them to its copy of the source and re-analyzes just the top-level chunks
+whose text changed. Structure flags of the chunks are combined with
+:meth:`analyzer.CodeFeatures.merge` and function summaries with
+:func:`complexity.combine`, so the answer is the same as analyzing the whole
+buffer from scratch.
+"""
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import analyzer
+import complexity
+
+# Chunks start at an unindented declaration. A chunk whose brackets, block
+# comment, template literal or docstring is still open at that point (or that
+# ends in a decorator) is joined with the next one instead.
+_CHUNK_START = re.compile(r"\n(?=@|(?:export\s+)?(?:async\s+)?(?:function|class|const|let|var|def)\b)")
+
+
+class SessionConflict(Exception):
+    """The edits don't apply to the session's current source."""
+
+
+def _is_closed(chunk: str) -> bool:
+    if chunk.count("{") != chunk.count("}") or chunk.count("(") != chunk.count(")") \
+            or chunk.count("[") != chunk.count("]"):
+        return False
+    if chunk.rfind("/*") > chunk.rfind("*/"):
+        return False
+    if chunk.count("`") % 2 or chunk.count('"""') % 2 or chunk.count("'''") % 2:
+        return False
+    return not chunk.rstrip().rsplit("\n", 1)[-1].lstrip().startswith("@")
+
+
+def split_chunks(code: str) -> List[str]:
+    """Split ``code`` into chunks of whole top-level statements."""
+    chunks = []
+    start = 0
+    for match in _CHUNK_START.finditer(code):
+        chunk = code[start:match.start()]
+        if chunk and _is_closed(chunk):
+            chunks.append(chunk)
+            start = match.start()
+    chunks.append(code[start:])
+    return chunks
+
+
+def apply_edits(source: str, edits: Sequence[Tuple[int, int, str]]) -> str:
+    """Apply ``(start, end, text)`` replacements in order, each against the
+    result of the previous one. Offsets count code points (Python string
+    indices), not UTF-16 units."""
+    for start, end, text in edits:
+        if not 0 <= start <= end <= len(source):
+            raise SessionConflict(f"Edit {start}:{end} is outside the {len(source)} character source")
+        source = source[:start] + text + source[end:]
+    return source
+
+
+class ChunkAnalysis:
+    """Analysis of one chunk: structure features and function summaries
+    (or the error that stopped the complexity estimator). Features are only
+    scanned for once asked for, as chunks past analyzer.MAX_SCAN_CHARS
+    never are."""
+
+    __slots__ = ("chunk", "_features", "functions", "error")
+
+    def __init__(self, chunk: str, language: str, previous: Optional[Dict[str, complexity.FunctionSummary]]):
+        self.chunk = chunk
+        self._features: Optional[analyzer.CodeFeatures] = None
+        self.functions: Dict[str, complexity.FunctionSummary] = {}
+        self.error: Optional[Exception] = None
+        try:
+            self.functions = complexity.summarize(chunk, language, previous)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            self.error = e
+
+    @property
+    def features(self) -> analyzer.CodeFeatures:
+        if self._features is None:
+            self._features = analyzer.scan(self.chunk)
+        return self._features
+
+
+class AnalysisSession:
+    """Last source seen for one editor buffer, and its per-chunk analysis."""
+
+    __slots__ = ("source", "version", "language", "chunks", "touched")
+
+    def __init__(self, language: str):
+        self.source = ""
+        self.version = 0
+        self.language = language
+        self.chunks: Dict[str, ChunkAnalysis] = {}
+        self.touched = time.time()
+
+    def update(self, source: str) -> Tuple[List[str], Optional[complexity.ComplexityEstimate]]:
+        """Re-analyze ``source``, reusing chunks that haven't changed.
+
+        Returns the structure flags, and the complexity estimate or None when
+        the code couldn't be analyzed structurally.
+        """
+        previous = self.chunks
+        previous_functions = {
+            summary.fingerprint: summary
+            for entry in previous.values() for summary in entry.functions.values()
+        }
+        chunks: Dict[str, ChunkAnalysis] = {}
+        ordered = []
+        for chunk in split_chunks(source):
+            entry = chunks.get(chunk) or previous.get(chunk)
+            if entry is None:
+                entry = ChunkAnalysis(chunk, self.language, previous_functions)
+            chunks[chunk] = entry
+            ordered.append(entry)
+
+        self.source = source
+        self.version += 1
+        self.chunks = chunks
+        self.touched = time.time()
+
+        structures = functools.reduce(lambda a, b: a.merge(b), _scanned_features(ordered)).structures()
+        if len(source) > complexity.MAX_SOURCE_CHARS or any(entry.error for entry in ordered):
+            return structures, None
+        return structures, complexity.estimate(complexity.combine(entry.functions for entry in ordered))
+
+
+def _scanned_features(ordered: List[ChunkAnalysis]) -> Iterator[analyzer.CodeFeatures]:
+    """Features of the chunks in the first analyzer.MAX_SCAN_CHARS characters,
+    the same part of the source a whole-source scan looks at."""
+    left = analyzer.MAX_SCAN_CHARS
+    for entry in ordered:
+        if len(entry.chunk) > left:
+            # Straddles the end of the scanned part
+            yield analyzer.scan(entry.chunk[:left])
+            return
+        yield entry.features
+        left -= len(entry.chunk)
+        if not left:
+            return
+
+
+class SessionStore:
+    """Thread-safe LRU of sessions, bounded by count, total source size and
+    idle time."""
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 32 * 1024 * 1024, ttl: float = 1800.0):
+        self.max_sessions = max(1, max_sessions)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, AnalysisSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def open(self, session_id: str, language: str) -> AnalysisSession:
+        """The session for ``session_id``, started afresh."""
+        session = AnalysisSession(language)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[AnalysisSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.touched + self.ttl <= time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def evict(self) -> None:
+        """Drop sessions until the store is back within its limits."""
+        now = time.time()
+        with self._lock:
+            total = sum(len(s.source) for s in self._sessions.values())
+            while self._sessions:
+                session_id, oldest = next(iter(self._sessions.items()))
+                if (len(self._sessions) <= self.max_sessions and total <= self.max_bytes
+                        and oldest.touched + self.ttl > now):
+                    break
+                del self._sessions[session_id]
+                total -= len(oldest.source)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(len(s.source) for s in self._sessions.values()),
+            }
@@ -0,0 +1,252 @@
+"""Hidden test suites for /run-code/hidden.
+
+Each problem's suite is a newline-delimited JSON file, one
+``{"input": ..., "expected": ..., "digest": ...}`` case per line, in the
+same string form as the catalog's test cases; ``digest`` is the SHA-256 of
+the canonical expected output, so exact comparisons never parse it. Files
+are memory-mapped and only an array of line offsets is kept in memory;
+cases are decoded a batch at a time as they are streamed into the sandbox.
+
+Suites are generated from reference solutions with a fixed seed, so they
+don't need to be checked in: a missing file is written on first use, or
+ahead of time with ``python suites.py [problem ids]``.
+"""
+import json
+import mmap
+import os
+import random
+import sys
+import threading
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from comparators import canonical, digest
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hidden_tests")
+
+# Cases per generated suite, and the input sizes of its large cases (the
+# rest are small and medium random inputs)
+SUITE_CASES = 300
+LARGE_SIZES = (10_000, 30_000, 50_000, 100_000, 100_000)
+
+
+class HiddenSuite:
+    """Read-only view of one suite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as handle:
+            size = os.fstat(handle.fileno()).st_size
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # Start offset of every line, plus the end of the file
+        self._offsets = array("Q", [0])
+        position = 0
+        while position < size:
+            end = self._map.find(b"\n", position)
+            position = size if end < 0 else end + 1
+            self._offsets.append(position)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def case(self, index: int) -> Tuple[str, str, Optional[str]]:
+        """``(input, expected, digest)`` of case ``index``."""
+        record = json.loads(self._map[self._offsets[index]:self._offsets[index + 1]])
+        return record["input"], record["expected"], record.get("digest")
+
+    def batches(self, max_cases: int = 64,
+                max_bytes: int = 1 << 20) -> Iterator[List[Tuple[int, str, str, Optional[str]]]]:
+        """Consecutive ``(index, input, expected, digest)`` batches of at most
+        ``max_cases`` cases and about ``max_bytes`` of file, and at least one case."""
+        batch: List[Tuple[int, str, str, Optional[str]]] = []
+        size = 0
+        for index in range(len(self)):
+            length = self._offsets[index + 1] - self._offsets[index]
+            if batch and (len(batch) >= max_cases or size + length > max_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append((index, *self.case(index)))
+            size += length
+        if batch:
+            yield batch
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+class SuiteStore:
+    """Open suites by problem id, generating missing files on first use."""
+
+    def __init__(self, directory: str = DEFAULT_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._suites: Dict[str, HiddenSuite] = {}
+
+    def has_suite(self, problem_id: str) -> bool:
+        return problem_id in GENERATORS or os.path.exists(self._path(problem_id))
+
+    def _path(self, problem_id: str) -> str:
+        return os.path.join(self.directory, os.path.basename(problem_id) + ".ndjson")
+
+    def get(self, problem_id: str) -> Optional[HiddenSuite]:
+        with self._lock:
+            suite = self._suites.get(problem_id)
+            if suite is None:
+                path = self._path(problem_id)
+                if not os.path.exists(path):
+                    if problem_id not in GENERATORS:
+                        return None
+                    write_suite(problem_id, path)
+                suite = self._suites[problem_id] = HiddenSuite(path)
+            return suite
+
+    def close(self) -> None:
+        with self._lock:
+            for suite in self._suites.values():
+                suite.close()
+            self._suites.clear()
+
+
+def _args(*args: Any) -> str:
+    return ", ".join(json.dumps(arg, separators=(",", ":")) for arg in args)
+
+
+# Case generators: (random source, size) -> (input, expected), with the
+# expected output worked out by a reference solution
+
+def _two_sum(rng: random.Random, n: int) -> Tuple[str, str]:
+    # Everything else is a multiple of 4 and the pair is 1 and 2 mod 4, so
+    # no other pair can reach the target (3 mod 4)
+    n = max(n, 2)
+    nums = [4 * k for k in rng.sample(range(-5 * n, 5 * n), n)]
+    i, j = sorted(rng.sample(range(n), 2))
+    nums[i] += 1
+    nums[j] += 2
+    return _args(nums, nums[i] + nums[j]), canonical([i, j])
+
+
+def _reverse_string(rng: random.Random, n: int) -> Tuple[str, str]:
+    s = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(max(n, 1)))
+    return _args(s), canonical(s[::-1])
+
+
+def _valid_parentheses(rng: random.Random, n: int) -> Tuple[str, str]:
+    pairs = {"(": ")", "[": "]", "{": "}"}
+    stack, out = [], []
+    for _ in range(max(n // 2, 1)):
+        if stack and rng.random() < 0.5:
+            out.append(pairs[stack.pop()])
+        else:
+            stack.append(rng.choice("([{"))
+            out.append(stack[-1])
+    out.extend(pairs[opening] for opening in reversed(stack))
+    if rng.random() < 0.5:
+        # Break it: swap one bracket for a random one
+        k = rng.randrange(len(out))
+        out[k] = rng.choice("()[]{}")
+    s = "".join(out)
+    stack = []
+    valid = True
+    for ch in s:
+        if ch in pairs:
+            stack.append(pairs[ch])
+        elif not stack or stack.pop() != ch:
+            valid = False
+            break
+    return _args(s), canonical(valid and not stack)
+
+
+def _merge_sorted_arrays(rng: random.Random, n: int) -> Tuple[str, str]:
+    split = rng.randint(0, n)
+    a = sorted(rng.randint(-10 ** 6, 10 ** 6) for _ in range(split))
+    b = sorted(rng.randint(-10 ** 6, 10 ** 6) for _ in range(n - split))
+    return _args(a, b), canonical(sorted(a + b))
+
+
+def _max_subarray(rng: random.Random, n: int) -> Tuple[str, str]:
+    nums = [rng.randint(-10 ** 4, 10 ** 4) for _ in range(max(n, 1))]
+    best = current = nums[0]
+    for x in nums[1:]:
+        current = max(x, current + x)
+        best = max(best, current)
+    return _args(nums), canonical(best)
+
+
+def _climbing_stairs(rng: random.Random, n: int) -> Tuple[str, str]:
+    steps = rng.randint(1, 45)
+    a, b = 1, 1
+    for _ in range(steps - 1):
+        a, b = b, a + b
+    return _args(steps), canonical(b)
+
+
+def _best_time_stock(rng: random.Random, n: int) -> Tuple[str, str]:
+    prices = [rng.randint(0, 10 ** 4) for _ in range(max(n, 1))]
+    low, profit = prices[0], 0
+    for price in prices:
+        low = min(low, price)
+        profit = max(profit, price - low)
+    return _args(prices), canonical(profit)
+
+
+def _single_number(rng: random.Random, n: int) -> Tuple[str, str]:
+    values = rng.sample(range(-3 * 10 ** 4, 3 * 10 ** 4), min(max(n // 2, 0), 3 * 10 ** 4 - 1) + 1)
+    single = values.pop()
+    nums = values + values + [single]
+    rng.shuffle(nums)
+    return _args(nums), canonical(single)
+
+
+def _majority_element(rng: random.Random, n: int) -> Tuple[str, str]:
+    n = max(n, 1)
+    majority = rng.randint(-10 ** 9, 10 ** 9)
+    count = rng.randint(n // 2 + 1, n)
+    nums = [majority] * count + [rng.randint(-10 ** 9, 10 ** 9) for _ in range(n - count)]
+    rng.shuffle(nums)
+    return _args(nums), canonical(majority)
+
+
+def _happy_number(rng: random.Random, n: int) -> Tuple[str, str]:
+    value = rng.randint(1, 2 ** 31 - 1) if rng.random() < 0.5 else rng.randint(1, 1000)
+    seen = set()
+    x = value
+    while x != 1 and x not in seen:
+        seen.add(x)
+        x = sum(int(digit) ** 2 for digit in str(x))
+    return _args(value), canonical(x == 1)
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int], Tuple[str, str]]] = {
+    "two-sum": _two_sum,
+    "reverse-string": _reverse_string,
+    "valid-parentheses": _valid_parentheses,
+    "merge-sorted-arrays": _merge_sorted_arrays,
+    "max-subarray": _max_subarray,
+    "climbing-stairs": _climbing_stairs,
+    "best-time-stock": _best_time_stock,
+    "single-number": _single_number,
+    "majority-element": _majority_element,
+    "happy-number": _happy_number,
+}
+
+
+def write_suite(problem_id: str, path: str, cases: int = SUITE_CASES) -> None:
+    """Generate ``problem_id``'s suite into ``path`` (atomically)."""
+    generate = GENERATORS[problem_id]
+    rng = random.Random(problem_id)
+    sizes = [rng.choice((rng.randint(1, 20), rng.randint(20, 1000))) for _ in range(cases - len(LARGE_SIZES))]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as out:
+        for size in sizes + list(LARGE_SIZES):
+            test_input, expected = generate(rng, size)
+            out.write(json.dumps({"input": test_input, "expected": expected, "digest": digest(expected)}) + "\n")
+    os.replace(temp, path)
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or sorted(GENERATORS):
+        target = os.path.join(DEFAULT_DIR, name + ".ndjson")
+        write_suite(name, target)
+        print(f"{target}: {len(HiddenSuite(target))} cases, {os.path.getsize(target)} bytes")
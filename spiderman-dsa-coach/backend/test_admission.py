@@ -0,0 +1,178 @@
+"""Behavior checks for admission control (run with pytest, or directly)."""
+import asyncio
+
+import admission
+from admission import FairScheduler, RateLimiter, SchedulerFull
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _with_clock(check):
+    clock = _Clock()
+    monotonic = admission.time.monotonic
+    admission.time.monotonic = clock
+    try:
+        check(clock)
+    finally:
+        admission.time.monotonic = monotonic
+
+
+def test_rate_limiter_allows_a_burst_then_waits():
+    def check(clock):
+        limiter = RateLimiter(rate=1.0, burst=2)
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("a") == 1.0
+        # Turned away requests take nothing
+        assert limiter.acquire("a") == 1.0
+        clock.now += 0.5
+        assert limiter.acquire("a") == 0.5
+        clock.now += 0.5
+        assert limiter.acquire("a") == 0
+    _with_clock(check)
+
+
+def test_rate_limiter_keeps_clients_apart():
+    def check(clock):
+        limiter = RateLimiter(rate=1.0, burst=1)
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("a") > 0
+        assert limiter.acquire("b") == 0
+    _with_clock(check)
+
+
+def test_rate_limiter_refills_up_to_the_burst_only():
+    def check(clock):
+        limiter = RateLimiter(rate=1.0, burst=2)
+        limiter.acquire("a")
+        clock.now += 100
+        assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 1.0]
+    _with_clock(check)
+
+
+def test_rate_limiter_forgets_the_least_recent_client():
+    def check(clock):
+        limiter = RateLimiter(rate=1.0, burst=1, max_clients=2)
+        for client in ("a", "b", "c"):
+            limiter.acquire(client)
+        # "a" was dropped, so it starts over with a full bucket
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("c") > 0
+    _with_clock(check)
+
+
+def test_rate_limiter_off_at_zero_rate():
+    limiter = RateLimiter(rate=0, burst=1)
+    assert all(limiter.acquire("a") == 0 for _ in range(10))
+
+
+def test_client_key():
+    assert admission.client_key("Bearer abc", "1.2.3.4") == admission.client_key("bearer  abc", None)
+    assert admission.client_key("Bearer abc", None) != admission.client_key("Bearer abd", None)
+    assert "abc" not in admission.client_key("Bearer abc", None)
+    assert admission.client_key(None, "1.2.3.4") == "ip:1.2.3.4"
+    assert admission.client_key("Basic xyz", "1.2.3.4") == "ip:1.2.3.4"
+
+
+async def _queue(scheduler: FairScheduler, client: str, served: list) -> None:
+    await scheduler.acquire(client)
+    served.append(client)
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_scheduler_serves_waiting_clients_round_robin():
+    async def check():
+        scheduler = FairScheduler(slots=1)
+        await scheduler.acquire("holder")
+        served = []
+        tasks = [asyncio.create_task(_queue(scheduler, client, served))
+                 for client in ("a", "a", "a", "b", "c")]
+        await _settle()
+        assert served == [] and scheduler.stats()["queued"] == 5
+        for _ in tasks:
+            scheduler.release()
+            await _settle()
+        assert served == ["a", "b", "c", "a", "a"]
+        scheduler.release()
+        assert scheduler.stats() == {"slots": 1, "free": 1, "queued": 0, "clients_waiting": 0}
+    asyncio.run(check())
+
+
+def test_scheduler_runs_at_once_while_slots_are_free():
+    async def check():
+        scheduler = FairScheduler(slots=2)
+        await asyncio.wait_for(scheduler.acquire("a"), 1)
+        await asyncio.wait_for(scheduler.acquire("a"), 1)
+        assert scheduler.stats()["free"] == 0
+    asyncio.run(check())
+
+
+def test_scheduler_sheds_past_the_per_client_and_total_queues():
+    async def check():
+        scheduler = FairScheduler(slots=1, max_queued=4, max_queued_per_client=2)
+        await scheduler.acquire("holder")
+        served = []
+        for client in ("a", "a", "b"):
+            asyncio.create_task(_queue(scheduler, client, served))
+        await _settle()
+        try:
+            scheduler.check("a")
+        except SchedulerFull as e:
+            assert "2 of your runs" in str(e) and e.retry_after >= 1
+        else:
+            raise AssertionError("a third run for one client was queued")
+        asyncio.create_task(_queue(scheduler, "c", served))
+        await _settle()
+        try:
+            await scheduler.acquire("d")
+        except SchedulerFull as e:
+            assert "4 sandbox runs" in str(e)
+        else:
+            raise AssertionError("a run past the total queue size was queued")
+    asyncio.run(check())
+
+
+def test_scheduler_cancelled_waiter_gives_up_its_place():
+    async def check():
+        scheduler = FairScheduler(slots=1)
+        await scheduler.acquire("holder")
+        served = []
+        gone = asyncio.create_task(_queue(scheduler, "a", served))
+        asyncio.create_task(_queue(scheduler, "b", served))
+        await _settle()
+        gone.cancel()
+        await _settle()
+        assert scheduler.stats()["queued"] == 1
+        scheduler.release()
+        await _settle()
+        assert served == ["b"]
+    asyncio.run(check())
+
+
+def test_scheduler_slot_is_released_on_error():
+    async def check():
+        scheduler = FairScheduler(slots=1)
+        try:
+            async with scheduler.slot("a"):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert scheduler.stats()["free"] == 1
+    asyncio.run(check())
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
@@ -0,0 +1,88 @@
+"""Regression checks for cache keys and the run cache (run with pytest, or
+directly)."""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from cache import LRUTTLCache, normalize_code
+
+
+def test_regex_literal_with_comment_and_quote():
+    # "//" and "'" inside a regex literal are neither a comment nor a string
+    first = "function f(s){ return /a\\//.test(s) ? 1 : 2 }"
+    second = "function f(s){ return /a\\//.test(s) ? 3 : 4 }"
+    assert normalize_code(first, "javascript") != normalize_code(second, "javascript")
+    quoted = "function f(s){ return /'/.test(s) ? 1 : 2 } // it's"
+    assert normalize_code(quoted, "javascript") != normalize_code(quoted.replace("? 1", "? 5"), "javascript")
+
+
+def test_unterminated_quote_is_kept():
+    for language in ("javascript", "python"):
+        code = "x = 1 ' y = 2"
+        assert normalize_code(code, language) != normalize_code("x = 1 ' y = 3", language)
+
+
+def test_nested_template_whitespace_is_kept():
+    first = "const s = `${'}' + `a  b`}`"
+    assert normalize_code(first, "javascript") != normalize_code(first.replace("a  b", "a b"), "javascript")
+
+
+def test_formatting_and_comments_still_ignored():
+    code = "function f(a, b) {\n  return a + b; // sum\n}\n"
+    same = "function f(a,  b) {\n\n    /* add */ return a + b;\n}"
+    assert normalize_code(code, "javascript") == normalize_code(same, "javascript")
+    assert normalize_code("def f(x):\n    return x  # id\n", "python") == \
+        normalize_code("def f(x):\n    return x\n\n", "python")
+
+
+def _disk_rows(path: str) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def test_disk_tier_survives_restart_and_is_capped():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        cache = LRUTTLCache(max_entries=2, db_path=path, max_disk_entries=3)
+        for i in range(5):
+            cache.set(f"k{i}", f"v{i}")
+            time.sleep(0.001)
+        assert _disk_rows(path) == 3
+        reopened = LRUTTLCache(db_path=path, max_disk_entries=3)
+        assert [reopened.get(f"k{i}") for i in range(5)] == [None, None, "v2", "v3", "v4"]
+        assert reopened.stats()["disk_hits"] == 3
+
+
+def test_disk_tier_drops_expired_rows_on_write():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        cache = LRUTTLCache(ttl=0.01, db_path=path)
+        cache.set("old", "x")
+        time.sleep(0.02)
+        cache.ttl = 60
+        cache.set("new", "y")
+        assert _disk_rows(path) == 1
+
+
+def test_async_access_matches_sync():
+    async def check(cache):
+        await cache.aset("k", "v")
+        assert await cache.aget("k") == "v"
+        assert await cache.aget("missing") is None
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        asyncio.run(check(LRUTTLCache(db_path=path)))
+        reopened = LRUTTLCache(db_path=path)
+        assert asyncio.run(reopened.aget("k")) == "v"
+        assert reopened.stats()["disk_hits"] == 1
+    asyncio.run(check(LRUTTLCache()))
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
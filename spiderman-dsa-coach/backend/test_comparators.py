@@ -0,0 +1,98 @@
+"""Checks for output comparison (run with pytest, or directly)."""
+import hashlib
+
+from comparators import Comparator, Expected, canonical, digest, js_number
+
+UNORDERED = Comparator(mode="unordered")
+TRIPLETS = Comparator(mode="unordered", depth=2)
+FLOAT = Comparator(mode="float", tolerance=1e-6)
+TWO_SUM = Comparator(mode="checker", checker="two-sum-pair")
+
+
+def _sandbox_digest(output: str) -> str:
+    # What both sandboxes send for an output too long to ship whole
+    return hashlib.sha256(output.encode("utf-8")).hexdigest()
+
+
+def test_js_number_matches_json_stringify():
+    # Right-hand sides are what JSON.stringify writes in Node
+    cases = {
+        2.0: "2", -2.0: "-2", -0.0: "0", 0.1 + 0.2: "0.30000000000000004",
+        2.5e-7: "2.5e-7", 1e-6: "0.000001", 1e-5: "0.00001", 1e-7: "1e-7",
+        1e16: "10000000000000000", 1e20: "100000000000000000000", 1e21: "1e+21",
+        1.5e300: "1.5e+300", 5e-324: "5e-324", 123.456: "123.456",
+    }
+    for value, expected in cases.items():
+        assert js_number(value) == expected, value
+
+
+def test_canonical_leaves_strings_alone():
+    assert canonical({"a": [2.0, 2.5e-07, "2.0 1e-07 \" 3.0", 1, True, None]}) == \
+        '{"a":[2,2.5e-7,"2.0 1e-07 \\" 3.0",1,true,null]}'
+
+
+def test_exact_ignores_spacing_and_float_form():
+    expected = Expected("[1, 2.0, 2.5e-07]")
+    assert Comparator().matches("[1,2,2.5e-7]", expected)
+    assert not Comparator().matches("[1,2,2.6e-7]", expected)
+    assert Comparator().matches("true", Expected("true"))
+    assert not Comparator().matches("[1,2]", Expected("[2,1]"))
+
+
+def test_exact_digest_of_a_truncated_output():
+    # Both sandboxes write results in canonical form; the digest of a large
+    # float answer must match the expected one however the catalog spells it
+    value = [i / 2 for i in range(1000)] + [2.5e-7, 1e-5, 1e16]
+    expected = Expected(canonical(value).replace(",", ", "))
+    assert Comparator().matches("[0,0.5,...", expected, _sandbox_digest(canonical(value)))
+    assert not Comparator().matches("[0,0.5,...", expected, _sandbox_digest(canonical(value[:-1] + [1e17])))
+    # Other rules need the whole output
+    assert not UNORDERED.matches("[0,0.5,...", expected, _sandbox_digest(canonical(value)))
+
+
+def test_known_digest_skips_parsing():
+    expected = Expected("not parsed", known_digest=digest("[1,2]"))
+    assert Comparator().matches("[1,2]", expected)
+
+
+def test_unordered():
+    assert UNORDERED.matches("[3,1,2]", Expected("[1, 2, 3]"))
+    assert not UNORDERED.matches("[3,1]", Expected("[1, 2, 3]"))
+    # Only the outer list's order is ignored at depth 1
+    assert not UNORDERED.matches("[[2,1],[3]]", Expected("[[3],[1,2]]"))
+    assert TRIPLETS.matches("[[2,1],[3]]", Expected("[[3],[1,2]]"))
+    # Mixed element types still sort
+    assert UNORDERED.matches('[1,"a",null]', Expected('["a",null,1]'))
+
+
+def test_float():
+    assert FLOAT.matches("0.30000000000000004", Expected("0.3"))
+    assert FLOAT.matches("[1.0000001,2]", Expected("[1, 2.0]"))
+    assert not FLOAT.matches("[1.001,2]", Expected("[1, 2]"))
+    assert not FLOAT.matches("[1]", Expected("[1, 2]"))
+    assert not FLOAT.matches("true", Expected("1"))
+
+
+def test_checker():
+    test_input = "[2, 7, 11, 15], 9"
+    assert TWO_SUM.matches("[1,0]", Expected("[0, 1]"), test_input=test_input)
+    assert not TWO_SUM.matches("[0,0]", Expected("[0, 1]"), test_input=test_input)
+    assert not TWO_SUM.matches("[0,2]", Expected("[0, 1]"), test_input=test_input)
+    assert not TWO_SUM.matches("[0,9]", Expected("[0, 1]"), test_input=test_input)
+
+
+def test_output_that_is_not_json_falls_back_to_text():
+    assert Comparator().matches("hello world\n", Expected("helloworld"))
+    assert not Comparator().matches("hello", Expected("world"))
+
+
+def test_spec_follows_the_rule():
+    assert Comparator().spec != FLOAT.spec
+    assert Comparator.from_spec({"mode": "float", "tolerance": 1e-6}).spec == FLOAT.spec
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
@@ -0,0 +1,199 @@
+"""Checks for the /jobs queue backends and the job consumer (run with
+pytest, or directly)."""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import sandbox
+from jobs import DONE, FAILED, RUNNING, MemoryJobQueue, QueueFull, SqliteJobQueue
+
+
+def _db_path() -> str:
+    return os.path.join(tempfile.mkdtemp(), "jobs.db")
+
+
+def _backends(**kwargs):
+    yield MemoryJobQueue(**kwargs)
+    yield SqliteJobQueue(_db_path(), **kwargs)
+
+
+def test_jobs_run_in_submission_order():
+    for queue in _backends():
+        first, second = queue.submit("a", owner="x"), queue.submit("b")
+        assert queue.get(first.id).ahead == 0 and queue.get(second.id).ahead == 1
+        claimed = queue.claim("w1")
+        assert (claimed.id, claimed.payload, claimed.owner, claimed.attempts) == (first.id, "a", "x", 1)
+        assert queue.get(first.id).status == RUNNING and queue.get(second.id).ahead == 0
+        queue.complete(first.id, "result")
+        assert queue.claim("w2").id == second.id
+        queue.fail(second.id, "boom")
+        assert queue.claim("w1") is None
+        done, failed = queue.get(first.id), queue.get(second.id)
+        assert (done.status, done.result, done.finished) == (DONE, "result", True)
+        assert (failed.status, failed.error) == (FAILED, "boom")
+        assert queue.stats()[DONE] == 1 and queue.stats()[FAILED] == 1
+        assert queue.get("missing") is None
+        queue.close()
+
+
+def test_finished_jobs_stay_finished():
+    for queue in _backends():
+        job = queue.submit("a")
+        queue.claim("w1")
+        queue.complete(job.id, "result")
+        queue.fail(job.id, "late")
+        assert queue.get(job.id).status == DONE
+        queue.close()
+
+
+def test_submit_turns_jobs_away_past_max_queued():
+    for queue in _backends(max_queued=2):
+        queue.submit("a")
+        queue.submit("b")
+        try:
+            queue.submit("c")
+        except QueueFull:
+            pass
+        else:
+            raise AssertionError("a job past max_queued was accepted")
+        # A claimed job no longer counts against the limit
+        queue.claim("w1")
+        queue.submit("c")
+        queue.close()
+
+
+def test_finished_jobs_expire_after_ttl():
+    for queue in _backends(ttl=0.01):
+        job = queue.submit("a")
+        queue.claim("w1")
+        queue.complete(job.id, "result")
+        time.sleep(0.02)
+        queue.submit("b")
+        assert queue.get(job.id) is None
+        queue.close()
+
+
+def test_renew_only_for_the_worker_holding_the_job():
+    for queue in _backends():
+        job = queue.submit("a")
+        assert not queue.renew(job.id, "w1")
+        queue.claim("w1")
+        assert queue.renew(job.id, "w1")
+        assert not queue.renew(job.id, "w2")
+        queue.complete(job.id, "result")
+        assert not queue.renew(job.id, "w1")
+        queue.close()
+
+
+def test_sqlite_job_is_handed_out_again_after_its_lease():
+    queue = SqliteJobQueue(_db_path(), lease=0.05)
+    job = queue.submit("a")
+    queue.claim("w1")
+    assert queue.claim("w2") is None
+    time.sleep(0.1)
+    reclaimed = queue.claim("w2")
+    assert (reclaimed.id, reclaimed.worker, reclaimed.attempts) == (job.id, "w2", 2)
+    # The first worker has lost it and can no longer renew it
+    assert not queue.renew(job.id, "w1")
+    queue.close()
+
+
+def test_sqlite_renewed_lease_is_not_reclaimed():
+    queue = SqliteJobQueue(_db_path(), lease=0.2)
+    job = queue.submit("a")
+    queue.claim("w1")
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.renew(job.id, "w1")
+        assert queue.claim("w2") is None
+    queue.close()
+
+
+def test_sqlite_gives_up_after_max_attempts():
+    queue = SqliteJobQueue(_db_path(), lease=0.05, max_attempts=1)
+    job = queue.submit("a")
+    queue.claim("w1")
+    time.sleep(0.1)
+    assert queue.claim("w2") is None
+    lost = queue.get(job.id)
+    assert (lost.status, lost.error) == (FAILED, "Worker lost")
+    queue.close()
+
+
+def test_sqlite_queue_is_shared_between_processes():
+    path = _db_path()
+    api, worker = SqliteJobQueue(path), SqliteJobQueue(path)
+    job = api.submit("a")
+    assert worker.claim("w1").id == job.id
+    worker.complete(job.id, "result")
+    assert api.get(job.id).result == "result"
+    api.close()
+    worker.close()
+
+
+def _with_queue(queue, lease: float, check) -> None:
+    saved = sandbox.job_queue, sandbox.JOB_LEASE_SECONDS
+    sandbox.job_queue, sandbox.JOB_LEASE_SECONDS = queue, lease
+    try:
+        asyncio.run(check())
+    finally:
+        sandbox.job_queue, sandbox.JOB_LEASE_SECONDS = saved
+        queue.close()
+
+
+def test_lease_is_held_while_the_job_runs():
+    queue = SqliteJobQueue(_db_path(), lease=0.15)
+    job = queue.submit("a")
+    queue.claim("w1")
+
+    async def slow_job():
+        await asyncio.sleep(0.5)
+        return "result"
+
+    async def check():
+        run = asyncio.create_task(slow_job())
+        holding = asyncio.create_task(sandbox._hold_lease(job.id, "w1", run))
+        await asyncio.sleep(0.3)
+        assert await asyncio.to_thread(queue.claim, "w2") is None
+        assert await holding == "result"
+    _with_queue(queue, 0.15, check)
+
+
+def test_job_is_cancelled_when_its_lease_is_lost():
+    queue = MemoryJobQueue()
+    job = queue.submit("a")
+    queue.claim("w1")
+
+    async def check():
+        run = asyncio.create_task(asyncio.sleep(10))
+        holding = asyncio.create_task(sandbox._hold_lease(job.id, "w1", run))
+        await asyncio.sleep(0.02)
+        queue.fail(job.id, "given up")
+        try:
+            await holding
+        except sandbox.LeaseLost:
+            pass
+        else:
+            raise AssertionError("the job kept running without its lease")
+        await asyncio.sleep(0)
+        assert run.cancelled()
+    _with_queue(queue, 0.03, check)
+
+
+def test_worker_runs_without_the_api():
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GOOGLE_API_KEY", "GEMINI_API_KEY", "GENAI_API_KEY")}
+    script = "import sys, job_worker; print('main' in sys.modules, 'fastapi' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=env, capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["False", "False"]
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
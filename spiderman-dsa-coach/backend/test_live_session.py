@@ -0,0 +1,50 @@
+"""Regression checks for /ws/session source tracking (run with pytest, or
+directly)."""
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from main import LiveUpdate, _live_source  # noqa: E402
+from sessions import SessionConflict  # noqa: E402
+from test_sessions import single_edit  # noqa: E402
+
+
+def _edit(session, before: str, after: str) -> LiveUpdate:
+    start, end, text = single_edit(before, after)
+    return LiveUpdate(problem_id="two-sum", base_version=session.version,
+                      edits=[{"start": start, "end": end, "text": text}])
+
+
+def test_edits_after_astral_characters_keep_the_copy_in_sync():
+    versions = [
+        "// 🕷 spider sense\nlet a = 1;\n",
+        "// 🕷 spider sense\nlet a = 10;\n",
+        "// 🕷🕸 spider sense\nlet a = 10;\n",
+        "// 🕷🕸 spider sense\nlet a = 10;\nfor (const x of [a]) {}\n",
+    ]
+    session, code = _live_source(None, LiveUpdate(problem_id="two-sum", code=versions[0]))
+    session.update(code)
+    for before, after in zip(versions, versions[1:]):
+        session, code = _live_source(session, _edit(session, before, after))
+        assert code == after
+        structures, _ = session.update(code)
+    assert structures == ["loop"]
+
+
+def test_stale_base_version_conflicts():
+    session, code = _live_source(None, LiveUpdate(problem_id="two-sum", code="let a = 1;"))
+    session.update(code)
+    stale = LiveUpdate(problem_id="two-sum", base_version=0, edits=[{"start": 0, "end": 0, "text": "x"}])
+    try:
+        _live_source(session, stale)
+    except SessionConflict:
+        pass
+    else:
+        raise AssertionError("edits against an old version were applied")
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
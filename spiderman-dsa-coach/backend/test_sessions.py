@@ -0,0 +1,69 @@
+"""Regression checks for editor sessions (run with pytest, or directly)."""
+import analyzer
+from sessions import AnalysisSession, SessionConflict, apply_edits
+
+
+def single_edit(before: str, after: str):
+    """The edit the frontend's ``singleEdit`` sends: the changed span, with
+    offsets in code points."""
+    start = 0
+    while start < min(len(before), len(after)) and before[start] == after[start]:
+        start += 1
+    end = 0
+    while end < min(len(before), len(after)) - start and before[-1 - end] == after[-1 - end]:
+        end += 1
+    return start, len(before) - end, after[start:len(after) - end]
+
+
+def test_edit_after_astral_character():
+    before = "// 🕷\nlet a = 1;\n"
+    after = "// 🕷\nlet a = 10;\n"
+    assert apply_edits(before, [single_edit(before, after)]) == after
+
+
+def test_edit_inside_astral_characters():
+    before = "const s = '🕷🕸';"
+    for after in ("const s = '🕸🕸';", "const s = '🕷x🕸';", "const s = '';", "const s = '🕷🕸😀';"):
+        assert apply_edits(before, [single_edit(before, after)]) == after
+
+
+def test_edits_apply_in_order():
+    assert apply_edits("a🕷c", [(1, 2, "b"), (0, 0, "😀")]) == "😀abc"
+
+
+def test_edit_past_the_end_conflicts():
+    try:
+        apply_edits("🕷", [(0, 2, "")])
+    except SessionConflict:
+        pass
+    else:
+        raise AssertionError("edit outside the source was applied")
+
+
+def test_incremental_update_matches_full_analysis():
+    before = "// 🕷\nfunction f(a) {\n  return a;\n}\n"
+    after = "// 🕷\nfunction f(a) {\n  for (const x of a) {}\n  return a;\n}\n"
+    session = AnalysisSession("javascript")
+    session.update(before)
+    structures, estimate = session.update(apply_edits(session.source, [single_edit(before, after)]))
+    assert session.source == after
+    full_structures, full_estimate = AnalysisSession("javascript").update(after)
+    assert structures == full_structures
+    assert (estimate.bound, estimate.confidence) == (full_estimate.bound, full_estimate.confidence)
+
+
+def test_source_past_the_scan_limit_matches_a_whole_scan():
+    solution = "function f(a) {\n  for (const x of a) { a.push(x); }\n  return a;\n}\n"
+    late = "function g() {\n  const q = new Queue();\n}\n"
+    for repeats in (1, analyzer.MAX_SCAN_CHARS // len(solution), analyzer.MAX_SCAN_CHARS // len(solution) + 1):
+        source = solution * repeats + late
+        structures, _ = AnalysisSession("javascript").update(source)
+        assert structures == analyzer.detect_structures(source)
+        assert ("queue" in structures) == (len(source) <= analyzer.MAX_SCAN_CHARS)
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
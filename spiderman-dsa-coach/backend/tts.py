@@ -0,0 +1,286 @@
+"""Text-to-speech for /tts: a streaming ElevenLabs client and an audio cache.
+
+Audio is passed through to the client chunk by chunk as ElevenLabs sends it,
+so playback can start before the clip is complete. While it streams, the
+chunks are also kept in memory, and once the whole clip has arrived it is
+written to the cache in one go, off the event loop; a clip cut short
+(upstream error, client gone) is discarded. The same text in the same
+voice always sounds the same, so cached clips never expire. The cache is a
+directory of MP3 files bounded in total bytes, least recently played
+dropped first; file modification times keep the order across restarts.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+import metrics
+from cache import content_key
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tts_cache")
+DEFAULT_VOICE_ID = "kHhWB9Fw3aF6ly7JvltC"
+
+# Partial clips older than this are removed when the cache is loaded
+STALE_TEMP_SECONDS = 3600
+
+_KEY = re.compile(r"^[0-9a-f]{64}$")
+VOICE_ID = re.compile(r"^[A-Za-z0-9]{1,64}$")
+
+TTS_REQUESTS = metrics.REGISTRY.counter(
+    "tts_requests_total", "Text-to-speech requests, by where the audio came from (cache, upstream)", ("source",)
+)
+TTS_UPSTREAM_FAILURES = metrics.REGISTRY.counter(
+    "tts_upstream_failures_total", "ElevenLabs calls that failed or were cut short"
+)
+TTS_CACHE_WRITE_FAILURES = metrics.REGISTRY.counter(
+    "tts_cache_write_failures_total", "Complete clips that could not be written to the cache"
+)
+TTS_CACHE_BYTES = metrics.REGISTRY.gauge("tts_cache_bytes", "Bytes of synthesized audio in the cache")
+
+logger = logging.getLogger(__name__)
+
+
+def audio_key(text: str, voice_id: str) -> str:
+    return content_key(voice_id, text)
+
+
+class UpstreamError(Exception):
+    """ElevenLabs refused the request or could not be reached."""
+
+
+class AudioCache:
+    """Synthesized clips, at most ``max_bytes`` on disk in total."""
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> file size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".mp3")
+
+    def _load_index(self) -> None:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        found = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                # Left behind by a clip that was still streaming at shutdown
+                # (recent ones may belong to another worker process)
+                try:
+                    if os.stat(path).st_mtime < time.time() - STALE_TEMP_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            key = name[:-len(".mp3")]
+            if not name.endswith(".mp3") or not _KEY.match(key):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(found):
+            self._index[key] = size
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached clip, or None. Blocking; call it off the event loop."""
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                audio = handle.read()
+            os.utime(path)
+        except OSError:
+            # Evicted (or deleted) since the lookup
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return audio
+
+    def writer(self, key: str) -> "PendingClip":
+        return PendingClip(self, key)
+
+    def _commit(self, key: str, audio: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temp = os.path.join(self.directory, f"{key}.{os.getpid()}.{time.monotonic_ns()}.tmp")
+        try:
+            with open(temp, "wb") as handle:
+                handle.write(audio)
+            os.replace(temp, self._path(key))
+        except OSError:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._forget(key)
+            self._index[key] = len(audio)
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        self._index.pop(key, None)
+        TTS_CACHE_BYTES.set(sum(self._index.values()))
+
+    def _evict(self) -> None:
+        total = sum(self._index.values())
+        while self._index and total > self.max_bytes:
+            key, size = self._index.popitem(last=False)
+            total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        TTS_CACHE_BYTES.set(total)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clips": len(self._index),
+                "bytes": sum(self._index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class PendingClip:
+    """A clip collected in memory as it streams in. Nothing is cached unless
+    ``commit`` is called; ``discard`` drops what was collected. A clip that
+    outgrows the whole cache stops being collected, as it could never be
+    kept."""
+
+    def __init__(self, cache: AudioCache, key: str):
+        self._cache = cache
+        self._key = key
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+        if self._size > self._cache.max_bytes:
+            self._chunks.clear()
+        else:
+            self._chunks.append(chunk)
+
+    def commit(self) -> None:
+        """Write the clip to the cache. Blocking; call it off the event loop."""
+        if not self._size or self._size > self._cache.max_bytes:
+            return
+        try:
+            self._cache._commit(self._key, b"".join(self._chunks))
+        except OSError as exc:
+            TTS_CACHE_WRITE_FAILURES.inc()
+            logger.warning("Could not cache TTS clip: %s", exc)
+        finally:
+            self.discard()
+
+    def discard(self) -> None:
+        self._chunks.clear()
+        self._size = 0
+
+
+class ElevenLabs:
+    """Streams speech from the ElevenLabs text-to-speech API."""
+
+    def __init__(self, api_key: str, api_url: str = "https://api.elevenlabs.io",
+                 model_id: str = "eleven_monolingual_v1", timeout: float = 30.0):
+        self.api_key = api_key
+        self.api_url = api_url.rstrip("/")
+        self.model_id = model_id
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=5.0))
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def open(self, text: str, voice_id: str) -> httpx.Response:
+        """Start synthesizing; returns once the audio starts to arrive.
+
+        The caller reads the body with ``aiter_bytes`` and must ``aclose``
+        the response. Raises UpstreamError if ElevenLabs answers with an
+        error or can't be reached.
+        """
+        request = self._http().build_request(
+            "POST",
+            f"{self.api_url}/v1/text-to-speech/{voice_id}/stream",
+            params={"optimize_streaming_latency": "4"},
+            headers={"xi-api-key": self.api_key, "Accept": "audio/mpeg"},
+            json={
+                "text": text,
+                "model_id": self.model_id,
+                "voice_settings": {"stability": 0.4, "similarity_boost": 0.7},
+            },
+        )
+        try:
+            with metrics.stage("tts_first_byte"):
+                response = await self._http().send(request, stream=True)
+        except httpx.HTTPError as exc:
+            TTS_UPSTREAM_FAILURES.inc()
+            raise UpstreamError(f"ElevenLabs unreachable: {exc}")
+        if response.status_code != 200:
+            details = (await response.aread()).decode("utf-8", errors="replace")[:500]
+            await response.aclose()
+            TTS_UPSTREAM_FAILURES.inc()
+            raise UpstreamError(f"ElevenLabs returned {response.status_code}: {details}")
+        return response
+
+
+async def tee(response: httpx.Response, clip: PendingClip) -> AsyncIterator[bytes]:
+    """Yield the upstream audio as it arrives while writing it to ``clip``.
+
+    The clip is committed only once the whole body has been read, so
+    neither a failed upstream nor a client that went away leaves a partial
+    clip in the cache.
+    """
+    complete = False
+    try:
+        async for chunk in response.aiter_bytes():
+            clip.write(chunk)
+            yield chunk
+        complete = True
+    except httpx.HTTPError as exc:
+        TTS_UPSTREAM_FAILURES.inc()
+        logger.warning("TTS stream cut short: %s", exc)
+    finally:
+        await response.aclose()
+        if complete:
+            await asyncio.to_thread(clip.commit)
+        else:
+            clip.discard()
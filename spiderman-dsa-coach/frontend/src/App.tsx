@@ -11,7 +11,7 @@ import {
   getSpiderManCoaching,
   runCode,
   RunCodeResponse,
-  textToSpeech,
+  textToSpeechUrl,
 } from './services/api'
 import {
   defaultProblem,
@@ -29,18 +29,10 @@ interface CoachResponse {
   message: string
 }
 
-const audioCache: Record<string, string> = {}
-
 async function createAudioForText(text: string): Promise<HTMLAudioElement> {
-  if (audioCache[text]) {
-    return new Audio(audioCache[text])
-  }
-
-  const audioBuffer = await textToSpeech(text)
-  const blob = new Blob([audioBuffer], { type: 'audio/mpeg' })
-  const url = URL.createObjectURL(blob)
-  audioCache[text] = url
-  return new Audio(url)
+  // Streamed by the backend, so playback starts before the whole clip is
+  // synthesized; repeats come from the browser cache
+  return new Audio(textToSpeechUrl(text))
 }
 
 function App() {
@@ -207,6 +199,12 @@ function App() {
         if (result.error) {
           outputText += `Error: ${result.error}\n`
         }
+        if (result.stdout) {
+          outputText += `Console:\n${result.stdout}`
+        }
+        if (result.cpu_time !== undefined && result.peak_rss_kb !== undefined) {
+          outputText += `CPU: ${(result.cpu_time * 1000).toFixed(1)}ms, Memory: ${(result.peak_rss_kb / 1024).toFixed(1)}MB\n`
+        }
         outputText += '\n'
       })
 
@@ -1,7 +1,6 @@
 import axios from 'axios'
 
 const API_BASE_URL = 'http://localhost:8000'
-const TTS_API_URL = 'http://localhost:3000'
 
 const pythonApi = axios.create({
   baseURL: API_BASE_URL,
@@ -10,13 +9,6 @@ const pythonApi = axios.create({
   },
 })
 
-const ttsApi = axios.create({
-  baseURL: TTS_API_URL,
-  headers: {
-    'Content-Type': 'application/json',
-  },
-})
-
 const withAuthHeader = (token?: string) =>
   token
     ? {
@@ -29,28 +21,76 @@ const withAuthHeader = (token?: string) =>
 export interface CodeAnalysis {
   complexity_hint: string
   structures: string[]
+  complexity_confidence?: number
+  version?: number
 }
 
 export interface CoachResponse {
   message: string
 }
 
+// The backend keeps the last code it analyzed for this editor, so repeat
+// calls only send what changed since then. Coaching and runs send the same
+// id, so a newer request cancels the one still in flight.
+const analyzeSession = {
+  id: `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`,
+  code: null as string | null,
+  version: 0,
+}
+
+// Offsets count code points, as the backend does, not UTF-16 units: an emoji
+// is one character there and two here
+const singleEdit = (beforeText: string, afterText: string) => {
+  const before = Array.from(beforeText)
+  const after = Array.from(afterText)
+  let start = 0
+  while (start < before.length && start < after.length && before[start] === after[start]) {
+    start++
+  }
+  let end = 0
+  while (
+    end < before.length - start &&
+    end < after.length - start &&
+    before[before.length - 1 - end] === after[after.length - 1 - end]
+  ) {
+    end++
+  }
+  return { start, end: before.length - end, text: after.slice(start, after.length - end).join('') }
+}
+
 export const analyzeCode = async (
   code: string,
   problemId: string,
   token?: string,
 ): Promise<CodeAnalysis> => {
-  try {
-    const response = await pythonApi.post(
+  const send = (body: object) =>
+    pythonApi.post(
       '/analyze',
-      {
-        code,
-        problem_id: problemId,
-      },
+      { problem_id: problemId, session_id: analyzeSession.id, ...body },
       withAuthHeader(token),
     )
+  try {
+    let response
+    if (analyzeSession.code === null) {
+      response = await send({ code })
+    } else {
+      try {
+        response = await send({
+          base_version: analyzeSession.version,
+          edits: [singleEdit(analyzeSession.code, code)],
+        })
+      } catch (error) {
+        if (!axios.isAxiosError(error) || error.response?.status !== 409) {
+          throw error
+        }
+        response = await send({ code })
+      }
+    }
+    analyzeSession.code = code
+    analyzeSession.version = response.data.version
     return response.data
   } catch (error) {
+    analyzeSession.code = null
     console.error('Error analyzing code:', error)
     throw error
   }
@@ -67,6 +107,7 @@ export const getSpiderManCoaching = async (
       {
         code,
         analysis,
+        session_id: analyzeSession.id,
       },
       withAuthHeader(token),
     )
@@ -90,12 +131,31 @@ export interface TestResult {
   actual: string
   passed: boolean
   error?: string
+  execution_time?: number
+  cpu_time?: number
+  peak_rss_kb?: number
+  stdout?: string
+}
+
+export interface ProfilePoint {
+  size: number
+  time_ms: number
+  reps: number
+}
+
+export interface ProfileReport {
+  complexity?: string | null
+  points: ProfilePoint[]
+  cut_off: boolean
+  error?: string | null
 }
 
 export interface RunCodeResponse {
   results: TestResult[]
   overall_passed: boolean
   execution_time: number
+  cached?: boolean
+  profile?: ProfileReport | null
 }
 
 export const runCode = async (
@@ -103,6 +163,7 @@ export const runCode = async (
   language: string,
   problemId: string,
   token?: string,
+  profile = false,
 ): Promise<RunCodeResponse> => {
   try {
     const response = await pythonApi.post(
@@ -112,6 +173,8 @@ export const runCode = async (
         language,
         problem_id: problemId,
         test_cases: [],
+        profile,
+        session_id: analyzeSession.id,
       },
       withAuthHeader(token),
     )
@@ -122,11 +185,141 @@ export const runCode = async (
   }
 }
 
-export const textToSpeech = async (text: string): Promise<ArrayBuffer> => {
+export interface HiddenCaseResult {
+  case: number
+  passed: boolean
+  error?: string | null
+  execution_time?: number | null
+  cpu_time?: number | null
+  peak_rss_kb?: number | null
+}
+
+export interface HiddenSuiteResult {
+  problem_id: string
+  total: number
+  run: number
+  passed: number
+  failed: number
+  overall_passed: boolean
+  stopped_early: boolean
+  error?: string | null
+  first_failure?: HiddenCaseResult | null
+  execution_time: number
+}
+
+// Runs the problem's hidden suite, stopping at the first failing case
+export const runHiddenTests = async (
+  code: string,
+  language: string,
+  problemId: string,
+  token?: string,
+): Promise<HiddenSuiteResult> => {
+  try {
+    const response = await pythonApi.post(
+      '/run-code/hidden',
+      {
+        code,
+        language,
+        problem_id: problemId,
+        mode: 'fail_fast',
+        session_id: analyzeSession.id,
+      },
+      withAuthHeader(token),
+    )
+    return response.data
+  } catch (error) {
+    console.error('Error running hidden tests:', error)
+    throw error
+  }
+}
+
+export type LiveMessage =
+  | ({ type: 'analysis'; version: number } & CodeAnalysis)
+  | { type: 'coach_token'; version: number; text: string }
+  | { type: 'coach_fallback'; version: number; message: string }
+  | { type: 'coach_done'; version: number; message: string; cached?: boolean; fallback?: boolean }
+  | ({ type: 'test'; version: number } & TestResult)
+  | ({ type: 'run'; version: number } & RunCodeResponse)
+  | {
+      type: 'error'
+      version: number | null
+      status: number
+      detail: string
+      retry_after?: number
+      session_version?: number
+    }
+
+// One WebSocket for analysis, coaching and test runs of the editor's code.
+// Each update after the first sends only what changed; replies carry the
+// version they are about, and the server drops work for older versions.
+export const openLiveSession = (
+  problemId: string,
+  language: string,
+  onMessage: (message: LiveMessage) => void,
+  token?: string,
+) => {
+  const url = new URL('/ws/session', API_BASE_URL.replace(/^http/, 'ws'))
+  // Browsers can't set headers on a WebSocket; the token rides as a subprotocol
+  const socket = new WebSocket(url, token ? ['bearer', token] : undefined)
+  let sent: string | null = null
+  let version = 0
+  let last: { code: string; coach: boolean; run: boolean } | null = null
+
+  const send = (code: string, coach: boolean, run: boolean) => {
+    const body =
+      sent === null
+        ? { code }
+        : { base_version: version, edits: [singleEdit(sent, code)] }
+    socket.send(JSON.stringify({ problem_id: problemId, language, coach, run, ...body }))
+    sent = code
+    version += 1
+  }
+
+  socket.onmessage = (event) => {
+    const message: LiveMessage = JSON.parse(event.data)
+    if (message.type === 'error' && message.status === 409 && last) {
+      // Out of sync with the server's copy: start over from the full code
+      sent = null
+      version = message.session_version ?? 0
+      send(last.code, last.coach, last.run)
+      return
+    }
+    onMessage(message)
+  }
+
+  // Updates made while connecting are sent once it opens, latest only
+  socket.onopen = () => {
+    if (last) {
+      send(last.code, last.coach, last.run)
+    }
+  }
+
+  return {
+    update: (code: string, { coach = false, run = false } = {}) => {
+      last = { code, coach, run }
+      if (socket.readyState === WebSocket.OPEN) {
+        send(code, coach, run)
+      }
+    },
+    close: () => socket.close(),
+  }
+}
+
+// An <audio> src for the message: the browser starts playing as the first
+// chunks stream in and caches the clip for repeats
+export const textToSpeechUrl = (text: string, voiceId?: string): string => {
+  const params = new URLSearchParams({ text })
+  if (voiceId) {
+    params.set('voice_id', voiceId)
+  }
+  return `${API_BASE_URL}/tts?${params}`
+}
+
+export const textToSpeech = async (text: string, voiceId?: string): Promise<ArrayBuffer> => {
   try {
-    const response = await ttsApi.post(
-      '/api/tts',
-      { text },
+    const response = await pythonApi.post(
+      '/tts',
+      { text, voice_id: voiceId },
       {
         responseType: 'arraybuffer',
       },
@@ -6,11 +6,9 @@ export default defineConfig({
   plugins: [react()],
   server: {
     port: 5173,
-    proxy: {
-      '/api/tts': {
-        target: 'http://localhost:3000',
-        changeOrigin: true,
-      },
+    fs: {
+      // problems.json sits at the project root, next to backend/
+      allow: ['..'],
     },
   },
 })